@@ -0,0 +1,129 @@
+# --- batch_transfer.py ---
+# Empaquetado de los resultados que los procesos del pool regresan a core.
+#
+# Con executor="process" cada proceso parsea un LOTE de objetivos y en vez de
+# regresar las listas de TargetEntry (dicts de ~130 llaves que pickle serializa
+# fila por fila, repitiendo las llaves) regresa un descriptor chico:
+#   - las tuplas de llaves distintas ("esquemas") van una sola vez por lote y
+#     cada registro es (indice_de_esquema, tupla_de_valores);
+#   - todo se serializa con marshal (str/float/int/None, mucho mas barato que
+#     pickle) en un solo bloque de bytes;
+#   - si el bloque es grande se deja en un segmento de
+#     multiprocessing.shared_memory y solo viaja su nombre: el proceso
+#     principal lo lee directo de la memoria compartida y lo libera.
+# Los registros se rearman con dict(zip(llaves, valores)), sin unpickle por fila.
+#
+# Como records.py, este modulo no sabe de CFDI ni importa core: trabaja con las
+# tuplas (name, message, records, skipped) de TargetEntry.
+import marshal
+import os
+import pickle
+from multiprocessing import resource_tracker, shared_memory
+
+# Bloques de hasta este tamanio viajan dentro del descriptor (un segmento de
+# memoria compartida cuesta varias llamadas al sistema).
+INLINE_MAX_BYTES = 64 * 1024
+
+# En Windows un segmento desaparece al cerrar su ultimo handle, es decir en
+# cuanto el proceso del pool termina la tarea: ahi el bloque va en el descriptor.
+USE_SHARED_MEMORY = os.name != "nt"
+
+# Primer byte del bloque: como se serializo.
+_MARSHAL = b"M"
+_PICKLE = b"P"   # respaldo si algun valor no es serializable con marshal
+
+
+def _columnar(batch):
+    """(esquemas, objetivos) con cada registro como (indice_de_esquema, valores)."""
+    schemas = {}
+    targets = []
+    for entries in batch:
+        packed = []
+        for name, message, records, skipped in entries:
+            rows = None
+            if records is not None:
+                rows = []
+                for record in records:
+                    keys = tuple(record)
+                    schema = schemas.get(keys)
+                    if schema is None:
+                        schema = schemas[keys] = len(schemas)
+                    rows.append((schema, tuple(record.values())))
+            packed.append((name, message, rows, skipped))
+        targets.append(packed)
+    return tuple(schemas), targets
+
+
+def pack_batch(batch):
+    """
+    Empaqueta un lote (una lista de TargetEntry por objetivo) y devuelve un
+    descriptor picklable: ("shm", nombre, tamanio) o ("bytes", bloque).
+    """
+    try:
+        payload = _MARSHAL + marshal.dumps(_columnar(batch))
+    except ValueError:
+        payload = _PICKLE + pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL)
+    if not USE_SHARED_MEMORY or len(payload) <= INLINE_MAX_BYTES:
+        return ("bytes", payload)
+    shm = _create_untracked(len(payload))
+    try:
+        shm.buf[:len(payload)] = payload
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return ("shm", shm.name, len(payload))
+
+
+def _create_untracked(size):
+    """
+    Segmento nuevo que el resource_tracker de ESTE proceso no vigila: quien lo
+    libera es el proceso principal (unpack_batch / release_batch). Si no, el
+    tracker del proceso del pool lo borraria (con advertencia) al terminar.
+    """
+    try:
+        return shared_memory.SharedMemory(create=True, size=size, track=False)
+    except TypeError:
+        # Python < 3.13 no tiene track=: se quita el registro a mano.
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def unpack_batch(descriptor):
+    """
+    Inverso de pack_batch: lista (una por objetivo) de listas de tuplas
+    (name, message, records, skipped). Libera el segmento de memoria compartida.
+    """
+    if descriptor[0] == "shm":
+        _, name, size = descriptor
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            payload = bytes(shm.buf[:size])
+        finally:
+            shm.close()
+            shm.unlink()
+    else:
+        payload = descriptor[1]
+
+    if payload[:1] == _PICKLE:
+        return [[tuple(entry) for entry in entries]
+                for entries in pickle.loads(payload[1:])]
+    schemas, targets = marshal.loads(payload[1:])
+    return [
+        [(name, message,
+          None if rows is None else [dict(zip(schemas[schema], values))
+                                     for schema, values in rows],
+          skipped)
+         for name, message, rows, skipped in entries]
+        for entries in targets
+    ]
+
+
+def release_batch(descriptor):
+    """Libera el segmento de un descriptor que ya no se va a leer (corrida interrumpida)."""
+    if descriptor[0] == "shm":
+        shm = shared_memory.SharedMemory(name=descriptor[1])
+        shm.close()
+        shm.unlink()
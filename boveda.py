@@ -0,0 +1,272 @@
+# --- boveda.py ---
+# "Boveda" SQLite de CFDIs (Roadmap paso 2): parsear una vez y guardar.
+#
+# Guarda los registros de un ProcessResult en tres tablas (invoices, nomina y
+# pagos; en pagos una fila por DoctoRelacionado). Cada fila lleva, en columnas
+# propias e indexadas, lo necesario para filtrar (UUID, RFC Emisor/Receptor,
+# fecha de timbrado y anio-mes), y el registro completo como JSON en `data`,
+# con el mismo orden de llaves que produce el parser, para poder regenerar el
+# reporte sin volver a leer XML.
+#
+# El UUID (TimbreFiscalDigital) es la llave natural: re-ingestar el mismo CFDI
+# reemplaza sus filas, asi que ingestar dos veces la misma carpeta no duplica.
+#
+# Como core.py, este modulo NO tiene UI: solo logica + SQLite (stdlib).
+import json
+import sqlite3
+from datetime import datetime
+
+# Direcciones de consulta: con un RFC, Emitidas filtra por RFC Emisor y
+# Recibidas por RFC Receptor (sin direccion: cualquiera de los dos).
+DIRECTIONS = ("Emitidas", "Recibidas")
+
+# Filas por executemany / transaccion durante la ingesta.
+INGEST_BATCH_SIZE = 5000
+
+# Tabla por CFDI_Type y llaves del registro para las columnas indexadas.
+# tabla -> (CFDI_Type, llave UUID, llave RFC Emisor, llave RFC Receptor)
+TABLES = {
+    "invoices": ("Invoice", "UUID", "RFC Emisor", "RFC Receptor"),
+    "nomina": ("Nomina", "UUID", "RFC Emisor", "RFC Receptor"),
+    "pagos": ("Pago", "UUID CFDI", "RFC Emisor CFDI", "RFC Receptor CFDI"),
+}
+TABLE_BY_CFDI_TYPE = {spec[0]: table for table, spec in TABLES.items()}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    uuid TEXT PRIMARY KEY,
+    rfc_emisor TEXT,
+    rfc_receptor TEXT,
+    fecha_timbrado TEXT,
+    year_month TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS nomina (
+    uuid TEXT PRIMARY KEY,
+    rfc_emisor TEXT,
+    rfc_receptor TEXT,
+    fecha_timbrado TEXT,
+    year_month TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pagos (
+    uuid TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    rfc_emisor TEXT,
+    rfc_receptor TEXT,
+    fecha_timbrado TEXT,
+    year_month TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (uuid, row_index)
+);
+"""
+
+# Indices por tabla: RFC + fecha (Emitidas/Recibidas por rango) y anio-mes.
+# En invoices/nomina el UUID ya es PRIMARY KEY; en pagos es el prefijo de la PK.
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_{table}_emisor ON {table} (rfc_emisor, fecha_timbrado);
+CREATE INDEX IF NOT EXISTS idx_{table}_receptor ON {table} (rfc_receptor, fecha_timbrado);
+CREATE INDEX IF NOT EXISTS idx_{table}_year_month ON {table} (year_month);
+"""
+
+
+def normalize_fecha_timbrado(value):
+    """
+    Convierte la Fecha Timbrado del registro ("DD/MM/YYYY HH:MM:SS", o ISO si no
+    se pudo formatear) a ISO "YYYY-MM-DDTHH:MM:SS", que se ordena como texto.
+    Devuelve None si no se reconoce.
+    """
+    if not value:
+        return None
+    for fmt in ("%d/%m/%Y %H:%M:%S", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%dT%H:%M:%S")
+        except ValueError:
+            continue
+    return None
+
+
+def _pago_group_key(record):
+    """Valores de una fila de Pago sin "Archivo XML" (igual en dos copias del CFDI)."""
+    return tuple((key, value) for key, value in record.items() if key != "Archivo XML")
+
+
+class IngestStats:
+    """Contadores de una ingesta (filas escritas por tabla y registros sin UUID)."""
+
+    def __init__(self):
+        self.rows = {table: 0 for table in TABLES}
+        self.skipped = 0
+
+    @property
+    def total(self):
+        return sum(self.rows.values())
+
+
+class Boveda:
+    """
+    Boveda SQLite (modo WAL). Uso:
+        with Boveda(core.BOVEDA_DB_FILE) as boveda:
+            stats = boveda.ingest(result.all_parsed_data)
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        for table in TABLES:
+            self.conn.executescript(_INDEXES.format(table=table))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def _row(self, table, record):
+        """(uuid, rfc_emisor, rfc_receptor, fecha_timbrado, year_month, data) o None."""
+        _, uuid_key, emisor_key, receptor_key = TABLES[table]
+        uuid = (record.get(uuid_key) or "").strip().upper()
+        if not uuid:
+            return None
+        fecha = normalize_fecha_timbrado(record.get("Fecha Timbrado"))
+        return (uuid, record.get(emisor_key) or None, record.get(receptor_key) or None,
+                fecha, fecha[:7] if fecha else None,
+                json.dumps(record, ensure_ascii=False))
+
+    def ingest(self, records):
+        """
+        Guarda los registros (dicts de los parsers, p. ej.
+        ProcessResult.all_parsed_data) y devuelve un IngestStats.
+
+        Idempotente por UUID: invoices/nomina usan INSERT OR REPLACE; en pagos
+        se borran las filas del UUID y se insertan las nuevas (el numero de
+        DoctoRelacionado pudo cambiar). Un CFDI repetido dentro de la misma
+        llamada (p. ej. con --keep-duplicates) queda una sola vez: gana su
+        ultima aparicion. Las escrituras van en lotes de
+        INGEST_BATCH_SIZE con executemany, una transaccion por lote.
+        """
+        stats = IngestStats()
+        batches = {table: [] for table in TABLES}
+        pago_uuids_seen = set()
+        pago_uuid = pago_first = None
+        row_index = 0
+
+        for record in records:
+            table = TABLE_BY_CFDI_TYPE.get(record.get("CFDI_Type"))
+            row = self._row(table, record) if table else None
+            if row is None:
+                stats.skipped += 1
+                continue
+            if table == "pagos":
+                # row_index = posicion del DoctoRelacionado dentro de su CFDI.
+                # Las filas de un CFDI llegan juntas; si se repite su primera
+                # fila (salvo "Archivo XML") es otra copia del mismo Pago.
+                first = _pago_group_key(record)
+                if row[0] != pago_uuid or first == pago_first:
+                    if row[0] in pago_uuids_seen:
+                        # El mismo Pago otra vez en esta llamada: reemplaza a
+                        # su aparicion anterior, como al re-ingestar.
+                        batches[table] = [r for r in batches[table] if r[0] != row[0]]
+                    pago_uuids_seen.add(row[0])
+                    pago_uuid, pago_first, row_index = row[0], first, 0
+                else:
+                    row_index += 1
+                row = (row[0], row_index) + row[1:]
+            batches[table].append(row)
+            if len(batches[table]) >= INGEST_BATCH_SIZE:
+                self._write(table, batches[table], stats)
+                batches[table] = []
+
+        for table, rows in batches.items():
+            if rows:
+                self._write(table, rows, stats)
+        return stats
+
+    def _write(self, table, rows, stats):
+        with self.conn:
+            if table == "pagos":
+                # Solo se borran los UUID que empiezan en este lote (row_index 0);
+                # sus demas DoctoRelacionado pueden venir en lotes siguientes.
+                self.conn.executemany(
+                    "DELETE FROM pagos WHERE uuid = ?",
+                    [(row[0],) for row in rows if row[1] == 0])
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO pagos (uuid, row_index, rfc_emisor, rfc_receptor,"
+                    " fecha_timbrado, year_month, data) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            else:
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO {table} (uuid, rfc_emisor, rfc_receptor,"
+                    " fecha_timbrado, year_month, data) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        stats.rows[table] += len(rows)
+
+    def count(self, table):
+        """Numero de filas en una tabla de la boveda."""
+        if table not in TABLES:
+            raise ValueError(f"Tabla desconocida: {table}")
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def known_uuids(self):
+        """
+        Conjunto con los UUID (en mayusculas) de todos los CFDIs guardados, para
+        core.process_path(known_uuids=...): lo ya ingestado no se vuelve a leer.
+        """
+        return {row[0] for row in self.conn.execute(
+            " UNION ".join(f"SELECT uuid FROM {table}" for table in TABLES))}
+
+    def query(self, cfdi_types=None, rfc=None, direction=None, date_from=None, date_to=None):
+        """
+        Devuelve {CFDI_Type: [registros]} con los registros que cumplen los filtros,
+        ordenados por fecha de timbrado (y UUID / DoctoRelacionado).
+
+            cfdi_types : iterable de "Invoice" / "Nomina" / "Pago" (None = todos)
+            rfc        : RFC a buscar (se compara en mayusculas y sin espacios,
+                         como en cfdi_filters.build_filter)
+            direction  : "Emitidas" (RFC Emisor), "Recibidas" (RFC Receptor) o
+                         None (cualquiera); requiere rfc
+            date_from / date_to : fechas de timbrado "YYYY-MM-DD" (o date),
+                         ambas inclusivas
+
+        Los filtros usan los indices (rfc, fecha_timbrado) y no se lee ningun XML.
+        """
+        if direction is not None and direction not in DIRECTIONS:
+            raise ValueError(f"Direccion desconocida: {direction}")
+        if cfdi_types is None:
+            cfdi_types = list(TABLE_BY_CFDI_TYPE)
+        conditions = []
+        params = []
+        rfc = (rfc or "").strip().upper()
+        if rfc:
+            if direction == "Emitidas":
+                conditions.append("rfc_emisor = ?")
+                params.append(rfc)
+            elif direction == "Recibidas":
+                conditions.append("rfc_receptor = ?")
+                params.append(rfc)
+            else:
+                conditions.append("(rfc_emisor = ? OR rfc_receptor = ?)")
+                params.extend([rfc, rfc])
+        if date_from:
+            conditions.append("fecha_timbrado >= ?")
+            params.append(f"{date_from}")
+        if date_to:
+            # Inclusiva: hasta el ultimo segundo del dia.
+            conditions.append("fecha_timbrado <= ?")
+            params.append(f"{date_to}T23:59:59")
+        where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+
+        results = {}
+        for cfdi_type in cfdi_types:
+            table = TABLE_BY_CFDI_TYPE.get(cfdi_type)
+            if table is None:
+                raise ValueError(f"CFDI_Type desconocido: {cfdi_type}")
+            order = "fecha_timbrado, uuid, row_index" if table == "pagos" else "fecha_timbrado, uuid"
+            rows = self.conn.execute(
+                f"SELECT data FROM {table}{where} ORDER BY {order}", params)
+            results[cfdi_type] = [json.loads(data) for (data,) in rows]
+        return results
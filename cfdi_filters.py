@@ -0,0 +1,79 @@
+# --- cfdi_filters.py ---
+# Filtros de core.process_path que se evaluan ANTES del parseo completo.
+#
+# Cada criterio se compara con datos que se leen barato (ver cfdi_sniffer.py):
+#   - Version y TipoDeComprobante: atributos del nodo raiz;
+#   - RFC Emisor / Receptor: Rfc de cfdi:Emisor y cfdi:Receptor (al inicio);
+#   - rango de fechas: FechaTimbrado del TimbreFiscalDigital (al final; se
+#     busca con una expresion regular, sin construir el arbol).
+# Un archivo que no cumple se descarta sin parsearlo y sin crear registros.
+from collections import namedtuple
+
+# Criterios (None = sin filtro). rfc acepta el RFC como Emisor O como Receptor;
+# date_from / date_to son "AAAA-MM-DD" (ambas inclusivas, sobre FechaTimbrado);
+# tipos y versions son tuplas ordenadas de TipoDeComprobante ("I", "E", "N",
+# "P", "T") y Version ("3.3", "4.0").
+CfdiFilter = namedtuple(
+    "CfdiFilter",
+    ["rfc", "rfc_emisor", "rfc_receptor", "date_from", "date_to", "tipos", "versions"])
+
+
+def build_filter(rfc=None, rfc_emisor=None, rfc_receptor=None, date_from=None,
+                 date_to=None, tipos=None, versions=None):
+    """
+    Arma un CfdiFilter normalizado (RFC en mayusculas, fechas como texto,
+    tipos/versiones como tuplas ordenadas). Devuelve None si no hay criterios.
+    """
+    def upper(value):
+        return value.strip().upper() if value else None
+
+    def text(value):
+        return str(value) if value else None
+
+    def sorted_tuple(values):
+        return tuple(sorted(set(values))) if values else None
+
+    flt = CfdiFilter(upper(rfc), upper(rfc_emisor), upper(rfc_receptor),
+                     text(date_from), text(date_to), sorted_tuple(tipos),
+                     sorted_tuple(versions))
+    return flt if any(value is not None for value in flt) else None
+
+
+def needs_parties(flt):
+    """True si el filtro necesita los RFC de Emisor/Receptor (sniff con parties=True)."""
+    return bool(flt.rfc or flt.rfc_emisor or flt.rfc_receptor)
+
+
+def needs_timbre(flt):
+    """True si el filtro necesita la FechaTimbrado (cfdi_sniffer.sniff_timbre)."""
+    return bool(flt.date_from or flt.date_to)
+
+
+def header_matches(flt, header):
+    """Criterios que se resuelven con el encabezado (Version, Tipo y RFCs)."""
+    if flt.versions and header.version not in flt.versions:
+        return False
+    if flt.tipos and header.tipo not in flt.tipos:
+        return False
+    emisor = (header.rfc_emisor or "").upper()
+    receptor = (header.rfc_receptor or "").upper()
+    if flt.rfc_emisor and emisor != flt.rfc_emisor:
+        return False
+    if flt.rfc_receptor and receptor != flt.rfc_receptor:
+        return False
+    if flt.rfc and flt.rfc not in (emisor, receptor):
+        return False
+    return True
+
+
+def timbre_matches(flt, timbre):
+    """Rango de fechas contra la FechaTimbrado (un CFDI sin timbre no cumple)."""
+    fecha = timbre.fecha_timbrado if timbre is not None else None
+    if not fecha:
+        return False
+    if flt.date_from and fecha < flt.date_from:
+        return False
+    # Inclusiva: hasta el ultimo segundo del dia (como Boveda.query).
+    if flt.date_to and fecha > f"{flt.date_to}T23:59:59":
+        return False
+    return True
@@ -0,0 +1,171 @@
+# --- cfdi_sniffer.py ---
+# Deteccion BARATA de version/tipo de un CFDI sin construir el arbol completo.
+#
+# Para elegir parser basta con los atributos del nodo raiz cfdi:Comprobante
+# (Version, TipoDeComprobante) y sus namespaces. Aqui se leen solo los primeros
+# KB del archivo (o del miembro de un .zip) con un parser incremental y se
+# detiene en cuanto aparece la etiqueta raiz. No es un parser de version: el
+# despacho sigue viviendo en core.py y cada version conserva su propio modulo.
+#
+# Para los filtros de core.process_path tambien se pueden leer, igual de barato,
+# los RFC de cfdi:Emisor / cfdi:Receptor (hijos inmediatos de la raiz) y, con
+# sniff_timbre, el UUID y la FechaTimbrado del TimbreFiscalDigital, que esta al
+# final del documento: se buscan con una expresion regular en los ultimos KB.
+import os
+import re
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+from constants import NAMESPACES_CFDI_33, NAMESPACES_CFDI_40
+
+# Tamano de cada lectura y tope total. El nodo raiz de un CFDI trae Sello y
+# Certificado (~3 KB), asi que 64 KB sobra incluso con namespaces extra.
+SNIFF_CHUNK_SIZE = 4096
+SNIFF_MAX_BYTES = 64 * 1024
+# Bytes del final del archivo donde se busca primero el TimbreFiscalDigital.
+SNIFF_TAIL_BYTES = 8 * 1024
+
+CFDI_ROOT_TAGS = {
+    "{%s}Comprobante" % NAMESPACES_CFDI_33["cfdi"],
+    "{%s}Comprobante" % NAMESPACES_CFDI_40["cfdi"],
+}
+
+# Descriptor minimo del encabezado:
+#   version    -> atributo Version ("3.3", "4.0", ...) o None
+#   tipo       -> atributo TipoDeComprobante ("I", "E", "N", "P", "T") o None
+#   namespaces -> dict {prefijo: uri} declarados hasta el nodo raiz
+#   is_cfdi    -> True si la raiz es cfdi:Comprobante (3.3 o 4.0)
+#   rfc_emisor / rfc_receptor -> Rfc de cfdi:Emisor / cfdi:Receptor; solo se
+#                 leen con sniff_cfdi_header(..., parties=True), si no son None
+CfdiHeader = namedtuple(
+    "CfdiHeader", ["version", "tipo", "namespaces", "is_cfdi", "rfc_emisor", "rfc_receptor"],
+    defaults=(None, None))
+
+# UUID y FechaTimbrado (ISO, tal como vienen en el XML) del TimbreFiscalDigital.
+TimbreInfo = namedtuple("TimbreInfo", ["uuid", "fecha_timbrado"])
+
+_TIMBRE_TAG_RE = re.compile(rb"<(?:[\w.-]+:)?TimbreFiscalDigital\b[^>]*>")
+_TIMBRE_ATTR_RE = {
+    "uuid": re.compile(rb"""\sUUID\s*=\s*["']([^"']*)["']"""),
+    "fecha_timbrado": re.compile(rb"""\sFechaTimbrado\s*=\s*["']([^"']*)["']"""),
+}
+
+
+def _iter_chunks(source, chunk_size):
+    """Produce bloques de bytes de una ruta, de bytes en memoria o de un archivo abierto."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for start in range(0, len(view), chunk_size):
+            yield bytes(view[start:start + chunk_size])
+    elif hasattr(source, "read"):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        with open(source, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+def sniff_cfdi_header(source, max_bytes=SNIFF_MAX_BYTES, parties=False):
+    """
+    Lee solo el inicio de `source` hasta encontrar la etiqueta raiz y devuelve un
+    CfdiHeader. `source` puede ser una ruta, bytes o un archivo binario abierto
+    (p. ej. zipfile.ZipFile.open).
+
+    Con parties=True sigue leyendo hasta cfdi:Emisor y cfdi:Receptor (van antes
+    de cfdi:Conceptos) para llenar rfc_emisor / rfc_receptor.
+
+    Devuelve None si el inicio no es XML valido o si la raiz no aparece dentro
+    de `max_bytes` (en ese caso el archivo no se considera un CFDI).
+    """
+    parser = ET.XMLPullParser(events=("start-ns", "start"))
+    namespaces = {}
+    header = None
+    read = 0
+    try:
+        for chunk in _iter_chunks(source, SNIFF_CHUNK_SIZE):
+            parser.feed(chunk)
+            read += len(chunk)
+            for event, payload in parser.read_events():
+                if event == "start-ns":
+                    prefix, uri = payload
+                    namespaces[prefix] = uri
+                    continue
+                if header is None:
+                    # Primer "start" = nodo raiz: sin parties ya no hace falta seguir.
+                    header = CfdiHeader(
+                        version=payload.get("Version"),
+                        tipo=payload.get("TipoDeComprobante"),
+                        namespaces=namespaces,
+                        is_cfdi=payload.tag in CFDI_ROOT_TAGS,
+                    )
+                    if not parties or not header.is_cfdi:
+                        return header
+                    continue
+                local_name = payload.tag.rpartition("}")[2]
+                if local_name == "Emisor":
+                    header = header._replace(rfc_emisor=payload.get("Rfc"))
+                elif local_name == "Receptor":
+                    header = header._replace(rfc_receptor=payload.get("Rfc"))
+                if local_name == "Conceptos" or (
+                        header.rfc_emisor is not None and header.rfc_receptor is not None):
+                    return header
+            if read >= max_bytes:
+                break
+    except (ET.ParseError, OSError):
+        return None
+    return header
+
+
+def _timbre_from_bytes(data):
+    """TimbreInfo del ultimo TimbreFiscalDigital en `data`, o None."""
+    tag = None
+    for tag in _TIMBRE_TAG_RE.finditer(data):
+        pass
+    if tag is None:
+        return None
+    values = {}
+    for field, attr_re in _TIMBRE_ATTR_RE.items():
+        match = attr_re.search(tag.group(0))
+        values[field] = match.group(1).decode("utf-8", "replace").strip() if match else None
+    return TimbreInfo(**values)
+
+
+def _timbre_from_stream(f, size, tail_bytes):
+    """Busca el timbre en la cola de un archivo abierto y, si no esta, en todo."""
+    if size is not None and size > tail_bytes and f.seekable():
+        f.seek(size - tail_bytes)
+        found = _timbre_from_bytes(f.read())
+        if found is not None:
+            return found
+        f.seek(0)
+    return _timbre_from_bytes(f.read())
+
+
+def sniff_timbre(source, tail_bytes=SNIFF_TAIL_BYTES, size=None):
+    """
+    UUID y FechaTimbrado del TimbreFiscalDigital sin parsear el XML.
+
+    El timbre va en cfdi:Complemento, al final del documento: primero se busca
+    en los ultimos `tail_bytes` y, si no esta ahi (p. ej. una Addenda grande
+    despues del Complemento), en todo el contenido. `source` es una ruta, bytes
+    o un archivo binario abierto; de este ultimo solo se lee la cola si se da su
+    `size` (p. ej. ZipFile.open con ZipInfo.file_size: el miembro no se carga
+    completo en memoria). Devuelve un TimbreInfo o None si no hay timbre.
+    """
+    try:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            data = bytes(source)
+            return _timbre_from_bytes(data[-tail_bytes:]) or _timbre_from_bytes(data)
+        if hasattr(source, "read"):
+            return _timbre_from_stream(source, size, tail_bytes)
+        with open(source, "rb") as f:
+            return _timbre_from_stream(f, os.fstat(f.fileno()).st_size, tail_bytes)
+    except OSError:
+        return None
@@ -3,46 +3,264 @@
 # Pensado para pruebas rapidas (ver test.bat) sin tener que elegir la ruta cada vez.
 #
 # Uso:
-#   python cli.py <carpeta_entrada> [-o salida.xlsx] [--open]
+#   python cli.py <carpeta_entrada> [-o salida.xlsx] [--open] [--workers N]
+#                 [--executor auto|process|thread]
+#                 [--no-cache | --rebuild-cache] [--prune-dirs]
+#                 [--boveda [--skip-known]] [--streaming]
+#                 [--duplicados | --keep-duplicates]
+#                 [--profile full|lean] [--columns "UUID,RFC Emisor,Total"]
+#                 [--rfc RFC [--direction emitidas|recibidas]]
+#                 [--date-from AAAA-MM-DD] [--date-to AAAA-MM-DD]
+#                 [--tipo-comprobante I|E|T|N|P ...] [--cfdi-version 3.3|4.0 ...]
+#   python cli.py --from-boveda [--rfc RFC] [--direction emitidas|recibidas]
+#                 [--date-from AAAA-MM-DD] [--date-to AAAA-MM-DD]
+#                 [--type Invoice|Nomina|Pago ...] [-o salida.xlsx] [--open]
 #
 # Si no se indica -o, el nombre se genera automaticamente en la carpeta Reports.
+# Con una carpeta, --rfc/--direction/--date-*/--tipo-comprobante/--cfdi-version
+# descartan los XML que no cumplen ANTES de parsearlos (ver cfdi_filters.py).
 import os
 import sys
 import argparse
+import contextlib
+import tempfile
+from datetime import datetime
 
 import core
+from boveda import Boveda
+from cfdi_filters import build_filter
+from constants import DEFAULT_EXTRACTION_PROFILE, EXTRACTION_PROFILES, SELECTABLE_COLUMNS
+from parse_cache import ParseCache
+
+
+def _iso_date(value):
+    """Tipo de argparse para fechas AAAA-MM-DD."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha invalida (AAAA-MM-DD): {value}")
+
+
+def _column_list(value):
+    """
+    Tipo de argparse para --columns: nombres separados por coma, todos
+    conocidos (constants.SELECTABLE_COLUMNS); un error de dedo no debe dar hojas
+    con columnas vacias.
+    """
+    columns = [col.strip() for col in value.split(",") if col.strip()]
+    if not columns:
+        raise argparse.ArgumentTypeError("--columns requiere al menos una columna")
+    unknown = [col for col in columns if col not in SELECTABLE_COLUMNS]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            "columna(s) desconocida(s): " + ", ".join(repr(col) for col in unknown))
+    return columns
+
+
+def _folder_filter(args):
+    """CfdiFilter con los filtros de la linea de comandos (None si no hay)."""
+    rfc_emisor = args.rfc if args.direction == "emitidas" else None
+    rfc_receptor = args.rfc if args.direction == "recibidas" else None
+    return build_filter(
+        rfc=args.rfc if not args.direction else None, rfc_emisor=rfc_emisor,
+        rfc_receptor=rfc_receptor, date_from=args.date_from, date_to=args.date_to,
+        tipos=args.tipos, versions=args.versions)
+
+
+def _process_folder(args, spool_dir=None):
+    """
+    Procesa la carpeta (con cache salvo --no-cache). Devuelve ProcessResult o
+    int. Con spool_dir los registros quedan en disco (SpooledResult).
+    """
+    if not os.path.isdir(args.input_folder):
+        print(f"Error: no es una carpeta valida: {args.input_folder}")
+        return 1
+
+    if args.workers < 0:
+        print(f"Error: --workers debe ser 0 o mayor: {args.workers}")
+        return 1
+
+    if args.direction and not args.rfc:
+        print("Error: --direction requiere --rfc")
+        return 1
+    if args.types:
+        print("Error: --type solo aplica con --from-boveda (usa --tipo-comprobante)")
+        return 1
+    if args.skip_known and not args.boveda:
+        print("Error: --skip-known requiere --boveda")
+        return 1
+    if args.boveda and args.columns is not None:
+        # La boveda guarda registros completos: uno proyectado (o "lean")
+        # reemplazaria la fila guardada de su UUID y se perderian las demas
+        # columnas (o Sello, SelloSAT y Certificado).
+        print("Error: --columns no se puede con --boveda (la boveda guarda registros completos)")
+        return 1
+    if args.boveda and EXTRACTION_PROFILES[args.profile]:
+        print(f"Error: --profile {args.profile} no se puede con --boveda "
+              "(la boveda guarda registros completos)")
+        return 1
+    if args.prune_dirs and args.no_cache:
+        print("Error: --prune-dirs requiere el cache (no se puede con --no-cache)")
+        return 1
+
+    filters = _folder_filter(args)
+    known_uuids = None
+    if args.skip_known:
+        with Boveda(core.BOVEDA_DB_FILE) as boveda:
+            known_uuids = boveda.known_uuids()
+        print(f"Boveda: {len(known_uuids)} UUID ya registrados")
+    print(f"Escaneando: {args.input_folder}")
+    if args.no_cache:
+        result = core.process_path(args.input_folder, on_log=print,
+                                   workers=args.workers, executor=args.executor,
+                                   profile=args.profile, columns=args.columns,
+                                   filters=filters,
+                                   known_uuids=known_uuids, dedup=not args.keep_duplicates,
+                                   spool_dir=spool_dir)
+    else:
+        variant = core.extraction_variant(args.profile, args.columns, filters)
+        with ParseCache(core.PARSE_CACHE_FILE, variant=variant) as cache:
+            if args.rebuild_cache:
+                cache.clear()
+            result = core.process_path(args.input_folder, on_log=print,
+                                       workers=args.workers, executor=args.executor,
+                                       cache=cache,
+                                       profile=args.profile, columns=args.columns,
+                                       filters=filters, known_uuids=known_uuids,
+                                       dedup=not args.keep_duplicates,
+                                       prune_dirs=args.prune_dirs, spool_dir=spool_dir)
+    if filters is not None:
+        print(f"Filtrados (no cumplen los filtros): {result.filtered_count}")
+    if known_uuids is not None:
+        print(f"Omitidos (UUID ya en la boveda): {result.known_count}")
+
+    if result.has_data and args.boveda:
+        with Boveda(core.BOVEDA_DB_FILE) as boveda:
+            stats = boveda.ingest(result.iter_all())
+        print(f"Boveda: {stats.total} fila(s) guardadas "
+              f"({stats.skipped} sin UUID) en {core.BOVEDA_DB_FILE}")
+    return result
+
+
+def _query_boveda(args):
+    """Arma el resultado con una consulta a la boveda (sin leer XML)."""
+    if args.direction and not args.rfc:
+        print("Error: --direction requiere --rfc")
+        return 1
+    if args.tipos or args.versions:
+        print("Error: --tipo-comprobante y --cfdi-version solo aplican a una carpeta")
+        return 1
+    direction = args.direction.capitalize() if args.direction else None
+    print(f"Consultando boveda: {core.BOVEDA_DB_FILE}")
+    return core.load_from_boveda(
+        core.BOVEDA_DB_FILE, cfdi_types=args.types, rfc=args.rfc,
+        direction=direction, date_from=args.date_from, date_to=args.date_to)
 
 
 def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Procesa CFDIs de una carpeta y exporta a Excel (sin dialogos).")
-    parser.add_argument("input_folder",
-                        help="Carpeta con archivos XML y/o .zip")
+    parser.add_argument("input_folder", nargs="?",
+                        help="Carpeta con archivos XML y/o .zip "
+                             "(no se usa con --from-boveda)")
     parser.add_argument("-o", "--output",
                         help="Ruta del Excel de salida (.xlsx). "
                              "Por defecto: Reports/<nombre automatico>.")
     parser.add_argument("--open", action="store_true", dest="open_after",
                         help="Abrir el Excel al terminar.")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Escribir el Excel en modo streaming: los registros van a "
+                             "un archivo temporal y de ahi al Excel, sin que la memoria "
+                             "crezca con el numero de filas (recomendado con cientos de "
+                             "miles). Con --from-boveda la consulta si se carga en memoria.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Procesos para parsear en paralelo "
+                             "(1 = en serie, 0 = todos los nucleos). Por defecto: 1.")
+    parser.add_argument("--executor", choices=core.EXECUTORS, default="auto",
+                        help="Pool para --workers > 1: process, thread o auto (hilos si "
+                             "Python corre sin GIL, procesos si no). Por defecto: auto.")
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument("--no-cache", action="store_true",
+                             help="No usar el cache de parseo (re-parsea todo y no lo actualiza).")
+    cache_group.add_argument("--rebuild-cache", action="store_true",
+                             help="Vaciar el cache de parseo y re-parsear todo.")
+    parser.add_argument("--prune-dirs", action="store_true",
+                        help="No volver a listar las carpetas sin cambios desde la corrida "
+                             "anterior (p. ej. meses cerrados de BovedaCFDI); sus CFDIs salen "
+                             "del cache. Un XML editado en su lugar no se detecta: usar "
+                             "--rebuild-cache despues de corregir archivos a mano.")
+    parser.add_argument("--profile", choices=sorted(EXTRACTION_PROFILES),
+                        default=DEFAULT_EXTRACTION_PROFILE,
+                        help="Perfil de extraccion: full (todo) o lean (sin Sello, "
+                             "SelloSAT ni Certificado; menos memoria y Excel mas chico). "
+                             f"Por defecto: {DEFAULT_EXTRACTION_PROFILE}.")
+    parser.add_argument("--columns", type=_column_list,
+                        help="Solo extraer y exportar estas columnas, separadas por coma "
+                             "(p. ej. \"UUID,RFC Emisor,Total\"). Por defecto: todas.")
+    dup_group = parser.add_mutually_exclusive_group()
+    dup_group.add_argument("--duplicados", action="store_true", dest="duplicates_sheet",
+                           help="Agregar la hoja 'Duplicados' con los CFDIs repetidos "
+                                "(mismo UUID) que no se incluyeron en las demas hojas.")
+    dup_group.add_argument("--keep-duplicates", action="store_true",
+                           help="No quitar los CFDIs repetidos (mismo UUID).")
+    parser.add_argument("--boveda", action="store_true",
+                        help="Guardar tambien los CFDIs procesados en la boveda SQLite.")
+    parser.add_argument("--skip-known", action="store_true",
+                        help="Con --boveda: no leer los XML \"<UUID>@<RFC>.xml\" cuyo UUID "
+                             "ya esta en la boveda (sincronizacion incremental).")
+
+    filters = parser.add_argument_group(
+        "Filtros (con una carpeta se evaluan antes de parsear cada XML)")
+    filters.add_argument("--rfc", help="RFC a filtrar (Emisor o Receptor).")
+    filters.add_argument("--direction", choices=["emitidas", "recibidas"],
+                         help="Emitidas (RFC Emisor) o Recibidas (RFC Receptor). Requiere --rfc.")
+    filters.add_argument("--date-from", type=_iso_date,
+                         help="Fecha de timbrado inicial, AAAA-MM-DD (inclusiva).")
+    filters.add_argument("--date-to", type=_iso_date,
+                         help="Fecha de timbrado final, AAAA-MM-DD (inclusiva).")
+    filters.add_argument("--tipo-comprobante", dest="tipos", action="append",
+                         choices=["I", "E", "T", "N", "P"],
+                         help="TipoDeComprobante (repetible; solo carpeta). Por defecto: todos.")
+    filters.add_argument("--cfdi-version", dest="versions", action="append",
+                         choices=["3.3", "4.0"],
+                         help="Version del CFDI (repetible; solo carpeta). Por defecto: todas.")
+
+    query = parser.add_argument_group("Reporte desde la boveda (sin re-parsear XML)")
+    query.add_argument("--from-boveda", action="store_true",
+                       help="Generar el Excel con una consulta a la boveda SQLite.")
+    query.add_argument("--type", dest="types", action="append",
+                       choices=["Invoice", "Nomina", "Pago"],
+                       help="Tipo de CFDI (repetible). Por defecto: todos.")
     args = parser.parse_args(argv)
 
-    core.create_initial_directories()
+    if args.from_boveda == bool(args.input_folder):
+        parser.error("indica una carpeta de entrada o --from-boveda (solo uno)")
 
-    if not os.path.isdir(args.input_folder):
-        print(f"Error: no es una carpeta valida: {args.input_folder}")
-        return 1
+    core.create_initial_directories()
 
-    print(f"Escaneando: {args.input_folder}")
-    result = core.process_path(args.input_folder, on_log=print)
+    with contextlib.ExitStack() as stack:
+        spool_dir = None
+        if args.streaming and not args.from_boveda:
+            # Los registros se guardan en disco y se escriben al Excel desde ahi.
+            spool_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="cfdi_spool_"))
+        result = _query_boveda(args) if args.from_boveda else _process_folder(args, spool_dir)
+        if isinstance(result, int):
+            return result
+        if spool_dir:
+            stack.callback(result.close)
 
-    if not result.has_data:
-        print("No se procesaron archivos XML CFDI validos.")
-        return 2
+        if not result.has_data:
+            print("No se procesaron archivos XML CFDI validos." if not args.from_boveda
+                  else "La consulta a la boveda no devolvio CFDIs.")
+            return 2
 
-    output_path = args.output or os.path.join(
-        core.REPORTS_DIR, core.build_default_filename(result.all_parsed_data))
-    core.export_report(result, output_path)
+        output_path = args.output or os.path.join(
+            core.REPORTS_DIR, core.build_default_filename(result.iter_all()))
+        core.export_report(result, output_path, streaming=args.streaming,
+                           columns=args.columns, duplicates_sheet=args.duplicates_sheet)
 
-    print(f"\nProcesados: {result.processed_count}  |  Errores: {result.error_count}")
+    print(f"\nProcesados: {result.processed_count}  |  Errores: {result.error_count}  |  "
+          f"Duplicados: {result.duplicate_count}")
     print(f"Facturas: {len(result.invoice_data)}  |  "
           f"Nomina: {len(result.nomina_data)}  |  "
           f"Pagos: {len(result.pagos_data)}")
@@ -183,6 +183,7 @@ INVOICE_COLUMN_ORDER = [
     "CURP Dependiente",
     "Nivel Educativo",
     "Nombre Dependiente",
+    "Impuestos No Clasificados",  # Importe de impuestos sin bucket en INVOICE_*_TAX_BUCKETS
 ]
 
 # Define the precise order of columns for the Pagos sheet.
@@ -303,9 +304,39 @@ PAGOS_COLUMN_ORDER = [
     "Ret IVA 6 Importe",  # From pago20:RetencionDR
     "Ret IVA 16 Base",  # From pago20:RetencionDR
     "Ret IVA 16 Importe",  # From pago20:RetencionDR
+    "Impuestos DR No Clasificados",  # ImporteDR sin bucket en PAGO_DR_TAX_FIELDS
 ]
 
 
+# --- EXTRACTION PROFILES ---
+# Base64 signature/certificate fields of Invoice/Nomina records (~2-3 KB per row
+# together). They are not part of INVOICE_COLUMN_ORDER, but they travel in every
+# record and show up in the Nomina sheet.
+HEAVY_FIELDS = ("Sello", "Certificado", "SelloSAT")
+
+# Profile name -> fields the parsers skip. "full" extracts everything; "lean"
+# leaves out HEAVY_FIELDS (the records simply do not carry those keys).
+EXTRACTION_PROFILES = {
+    "full": frozenset(),
+    "lean": frozenset(HEAVY_FIELDS),
+}
+DEFAULT_EXTRACTION_PROFILE = "full"
+
+# Columns of the optional "Duplicados" sheet: one row per CFDI that
+# core.process_path dropped because its TimbreFiscalDigital UUID was already seen.
+DUPLICATES_COLUMN_ORDER = [
+    "UUID",
+    "CFDI_Type",
+    "Archivo",  # Path of the duplicate (file or "paquete.zip/miembro.xml")
+]
+
+# Columns every record keeps under a column selection (cli.py --columns): they
+# route the record (CFDI_Type) and key the bóveda and the report file name.
+PROJECTION_REQUIRED_COLUMNS = frozenset({
+    "CFDI_Type", "UUID", "RFC Emisor", "RFC Receptor",
+    "UUID CFDI", "RFC Emisor CFDI", "RFC Receptor CFDI", "Fecha Timbrado",
+})
+
 # --- XML FIELD EXTRACTION DEFINITIONS ---
 # List of XML tags/attributes to extract for CFDI elements not directly on the Comprobante root.
 # Format: (xpath_to_element, attribute_name_or_None_for_text, default_value, column_name_in_data_dict)
@@ -371,6 +402,23 @@ NOMINA_FIELDS_TO_EXTRACT = [
     ("TotalOtrosPagos", "", "", "TotalOtrosPagos"),
 ]
 
+# Columns the version parsers set on every Comprobante that are not part of
+# INVOICE_COLUMN_ORDER (the Invoices sheet drops them; the Nomina sheet, which
+# has no fixed order, shows them).
+RECORD_EXTRA_COLUMNS = [
+    "Serie", "Folio", "Sello", "NoCertificado", "Certificado", "Exportacion",
+    "RegimenFiscal Emisor", "RfcProvCertif", "SelloSAT", "NoCertificadoSAT",
+    "Conceptos_Importe_Sum",
+]
+
+# Every column name a selection may ask for (cli.py --columns): the Invoices and
+# Pagos sheet orders plus the Nomina columns.
+SELECTABLE_COLUMNS = (
+    frozenset(INVOICE_COLUMN_ORDER) | frozenset(PAGOS_COLUMN_ORDER)
+    | frozenset(field[3] for field in NOMINA_FIELDS_TO_EXTRACT)
+    | frozenset(RECORD_EXTRA_COLUMNS) | PROJECTION_REQUIRED_COLUMNS
+)
+
 # Fields for the main Pago (pago20:Pago)
 PAGO_FIELDS_TO_EXTRACT = [
     # Attributes from pago20:Pagos (main complement)
@@ -496,6 +544,47 @@ PAGO_DR_TAX_FIELDS = {
 }
 
 
+# --- TAX BUCKET TABLES ---
+# SAT codes for c_Impuesto, used to key the tax bucket lookups (tax_buckets.py).
+TAX_CODE_BY_NAME = {"ISR": "001", "IVA": "002", "IEPS": "003"}
+
+# Columns that collect the Importe of tax lines with no matching bucket, so an
+# unknown rate shows up in the report instead of being silently dropped.
+UNCLASSIFIED_TAX_COLUMN = "Impuestos No Clasificados"
+PAGO_DR_UNCLASSIFIED_TAX_COLUMN = "Impuestos DR No Clasificados"
+
+# Per-Concepto taxes of Invoices (CFDI 3.3 & 4.0).
+# Key: (Impuesto, TipoFactor, TasaOCuota) -> columns that receive the Importe.
+# None is a wildcard; lookup tries the exact key first, then the wildcards.
+# An empty tuple means "known tax line, no column" (e.g. IVA 0% / Exento).
+# To support a new rate: add its column to INVOICE_COLUMN_ORDER and an entry here.
+INVOICE_TRASLADO_TAX_BUCKETS = {
+    ("002", "Tasa", "0.160000"): ("IVA 16%",),
+    ("002", "Tasa", "0.080000"): ("IVA 8%",),
+    ("002", "Tasa", "0.000000"): (),
+    ("002", "Exento", None): (),
+    ("003", "Tasa", "0.030000"): ("Total IEPS", "IEPS 3%"),
+    ("003", "Tasa", "0.060000"): ("Total IEPS", "IEPS 6%"),
+    ("003", "Tasa", "0.070000"): ("Total IEPS", "IEPS 7%"),
+    ("003", "Tasa", "0.080000"): ("Total IEPS", "IEPS 8%"),
+    ("003", "Tasa", "0.090000"): ("Total IEPS", "IEPS 9%"),
+    ("003", "Tasa", "0.265000"): ("Total IEPS", "IEPS 26.5%"),
+    ("003", "Tasa", "0.300000"): ("Total IEPS", "IEPS 30%"),
+    ("003", "Tasa", "0.304000"): ("Total IEPS", "IEPS 30.4%"),
+    ("003", "Tasa", "0.530000"): ("Total IEPS", "IEPS 53%"),
+    ("003", "Tasa", "1.600000"): ("Total IEPS", "IEPS 160%"),
+    # Any other IEPS Tasa still adds to the IEPS total, and is also reported
+    # as unclassified so the unknown rate is visible
+    ("003", "Tasa", None): ("Total IEPS", UNCLASSIFIED_TAX_COLUMN),
+}
+
+# Per-Concepto Retenciones of Invoices. TipoFactor is not relevant here.
+INVOICE_RETENCION_TAX_BUCKETS = {
+    ("001", None, None): ("Retenido ISR",),
+    ("002", None, None): ("Retenido IVA",),
+    ("002", None, "0.060000"): ("Retenido IVA", "IVA Ret 6%"),
+}
+
 # Define common ClaveProdServ codes for fuel (from SAT's catalog)
 FUEL_PROD_SERV_CODES = ["15101514", "15101501", "15101502", "15101500"]
 # Define common units for fuel
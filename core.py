@@ -7,20 +7,36 @@
 # print() de UI ni input(): solo logica pura + callbacks opcionales para reportar
 # avance. Esto respeta la regla de aislamiento por version de PROMPT.md: el
 # despacho vive aqui, pero cada version sigue teniendo su propio modulo parser.
+import hashlib
 import os
 import platform
+import queue
+import re
 import subprocess
+import sys
+import threading
+import time
 import zipfile
-import tempfile
-import shutil
 import xml.etree.ElementTree as ET
+from array import array
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
 from datetime import datetime
+from functools import partial
 
 # Parsers aislados por version (NO se fusionan; ver PROMPT.md).
 from xml_parser_33 import parse_cfdi_33_invoice
 from xml_parser_40 import parse_cfdi_40_invoice
 from pagos_parser_20 import parse_cfdi_pago_20
-from excel_exporter import export_to_excel
+from excel_exporter import export_to_excel, export_to_excel_streaming
+from cfdi_sniffer import sniff_cfdi_header, sniff_timbre
+from cfdi_filters import header_matches, needs_parties, needs_timbre, timbre_matches
+from boveda import Boveda
+from constants import (
+    DEFAULT_EXTRACTION_PROFILE, EXTRACTION_PROFILES, PROJECTION_REQUIRED_COLUMNS,
+)
+from records import RecordSpool, RecordTable
+from batch_transfer import pack_batch, release_batch, unpack_batch
 
 # --- Directorios base de la aplicacion -------------------------------------
 # Relativo a una carpeta conceptual "AdminXML" dos niveles por encima del script.
@@ -31,6 +47,10 @@ BASE_APP_DIR = os.path.abspath(os.path.join(
 BOVEDA_XML_DIR = os.path.join(BASE_APP_DIR, "BovedaCFDI")
 REPORTS_DIR = os.path.join(BASE_APP_DIR, "Reports")
 LAST_USED_DIR_FILE = os.path.join(REPORTS_DIR, "last_used_directory.txt")
+# Cache de parseo (ver parse_cache.py); se puede borrar sin perder datos.
+PARSE_CACHE_FILE = os.path.join(BASE_APP_DIR, "parse_cache.sqlite3")
+# Boveda SQLite con los CFDIs ya parseados (ver boveda.py).
+BOVEDA_DB_FILE = os.path.join(BASE_APP_DIR, "boveda.sqlite3")
 
 
 def create_initial_directories():
@@ -66,142 +86,907 @@ def save_last_used_directory(directory):
 
 
 # --- Despacho por version (logica de deteccion) ----------------------------
-def parse_xml_file_by_version(xml_file_path):
+def select_parser(cfdi_version, tipo_comprobante):
+    """
+    Devuelve la funcion parser para (Version, TipoDeComprobante), o None si la
+    combinacion no esta soportada. Es la UNICA tabla de ruteo por version: al
+    salir una version nueva se agrega aqui una rama y su modulo parser.
+    """
+    # Priorizar deteccion de Pagos 2.0
+    if tipo_comprobante == "P" and cfdi_version == "4.0":
+        return parse_cfdi_pago_20
+    elif cfdi_version == "3.3":
+        return parse_cfdi_33_invoice
+    elif cfdi_version == "4.0":
+        return parse_cfdi_40_invoice
+    return None
+
+
+def is_supported_header(header):
+    """True si el encabezado olfateado (CfdiHeader) corresponde a un CFDI con parser."""
+    return (header is not None and header.is_cfdi
+            and select_parser(header.version, header.tipo) is not None)
+
+
+def parse_xml_file_by_version(xml_file_path, xml_bytes=None, header=None,
+                              skip_fields=frozenset(), columns=None):
     """
     Lee el XML para determinar su version CFDI y llama al parser apropiado.
     Detecta tambien si es un CFDI de Pagos 2.0.
 
-    Devuelve un dict (Invoice/Nomina), una lista de dicts (Pagos) o None.
+    El archivo se lee y se tokeniza UNA sola vez: el arbol ya construido se
+    entrega al parser de la version (parametro `root`). Si se pasa `xml_bytes`
+    (p. ej. un miembro de un .zip), se parsea desde memoria y `xml_file_path`
+    solo se usa como nombre. Si se pasa `header` (resultado de
+    cfdi_sniffer.sniff_cfdi_header), los archivos no soportados se descartan
+    sin construir el arbol. `skip_fields` (ver EXTRACTION_PROFILES) y `columns`
+    (ver select_columns) se pasan tal cual al parser.
+
+    Devuelve un dict (Invoice/Nomina), una secuencia de dicts (Pagos; ver
+    pagos_parser_20.PagoRows) o None.
     """
+    if header is not None and not is_supported_header(header):
+        return None
     try:
-        tree = ET.parse(xml_file_path)
-        root = tree.getroot()
-        cfdi_version = root.get("Version")
-        tipo_comprobante = root.get("TipoDeComprobante")
-
-        # Priorizar deteccion de Pagos 2.0
-        if tipo_comprobante == "P" and cfdi_version == "4.0":
-            return parse_cfdi_pago_20(xml_file_path)
-        elif cfdi_version == "3.3":
-            return parse_cfdi_33_invoice(xml_file_path)
-        elif cfdi_version == "4.0":
-            return parse_cfdi_40_invoice(xml_file_path)
+        if xml_bytes is not None:
+            root = ET.fromstring(xml_bytes)
         else:
+            root = ET.parse(xml_file_path).getroot()
+        parser = select_parser(root.get("Version"), root.get("TipoDeComprobante"))
+        if parser is None:
             return None
+        return parser(xml_file_path, root=root, skip_fields=skip_fields, columns=columns)
     except ET.ParseError:
         return None
     except Exception:
         return None
 
 
-def process_zip_file(zip_path):
-    """Extrae los XMLs de un .zip a una carpeta temporal y los procesa."""
-    temp_dir = tempfile.mkdtemp()
-    extracted_data = []
+# Resultado de parsear UN objetivo (.xml o .zip): lista de entradas en orden,
+# una por XML (los .zip producen una por miembro).
+#   name    -> nombre para on_progress ("archivo.xml" o "paquete.zip/miembro.xml")
+#   message -> texto para on_log
+#   records -> secuencia de registros (lista de dicts, o PagoRows de Pagos, que
+#              arma cada fila al leerla); None si la entrada cuenta como error
+#   skipped -> por que se omitio el XML sin parsearlo: SKIPPED_FILTERED (no
+#              cumple los filtros), SKIPPED_KNOWN (UUID ya conocido) o None
+TargetEntry = namedtuple("TargetEntry", ["name", "message", "records", "skipped"],
+                         defaults=(None,))
+SKIPPED_FILTERED = "filtered"
+SKIPPED_KNOWN = "known"
+
+# UUID al inicio del nombre, como en las descargas del SAT: "<UUID>@<RFC>.xml".
+_UUID_NAME_RE = re.compile(
+    r"([0-9A-Fa-f]{8}-(?:[0-9A-Fa-f]{4}-){3}[0-9A-Fa-f]{12})(?=[@._ ]|$)")
+
+
+def _filtered_entry(name):
+    """TargetEntry de un XML que no cumple los filtros (ni registros ni error)."""
+    return TargetEntry(name, f" - Omitiendo {name} (no cumple los filtros)", [],
+                       SKIPPED_FILTERED)
+
+
+def _known_entry(name):
+    """TargetEntry de un XML cuyo UUID ya se conoce (ni registros ni error)."""
+    return TargetEntry(name, f" - Omitiendo {name} (UUID ya registrado)", [], SKIPPED_KNOWN)
+
+
+def uuid_from_name(name):
+    """UUID (en mayusculas) con el que empieza el nombre del archivo, o None."""
+    match = _UUID_NAME_RE.match(os.path.basename(name))
+    return match.group(1).upper() if match else None
+
+
+def _timbre_has_uuid(source, uuid, size=None):
+    """
+    Confirma con el TimbreFiscalDigital (leido de la cola, sin parsear) que el
+    CFDI es el del UUID de su nombre: un archivo mal nombrado SI se procesa.
+    """
+    timbre = sniff_timbre(source, size=size)
+    return timbre is not None and (timbre.uuid or "").upper() == uuid
+
+
+def _sniff_for_filters(source, filters):
+    """Encabezado para rutear y, si hay filtros, con los RFC que estos necesiten."""
+    return sniff_cfdi_header(source, parties=filters is not None and needs_parties(filters))
+
+
+def _passes_timbre_filter(source, filters):
+    """Rango de fechas contra la FechaTimbrado leida sin parsear (True si no aplica)."""
+    return not needs_timbre(filters) or timbre_matches(filters, sniff_timbre(source))
+
+
+def _parsed_entry(name, parsed_data):
+    """TargetEntry para el resultado de parse_xml_file_by_version (None = error)."""
+    if not parsed_data:
+        return TargetEntry(name, f" - Procesando {name}...", None)
+    if isinstance(parsed_data, dict):
+        parsed_data = [parsed_data]
+    return TargetEntry(name, f" - Procesando {name}...", parsed_data)
+
+
+def process_zip_file(zip_path, skip_fields=frozenset(), columns=None, filters=None,
+                     known_names=None):
+    """
+    Procesa los XMLs de un .zip directamente desde memoria (sin carpeta temporal).
+
+    Cada miembro se lee con ZipFile.open: primero solo el encabezado (para
+    descartar lo que no es un CFDI soportado) y despues el contenido completo,
+    que se parsea desde bytes. Nada se escribe a disco.
+
+    Devuelve una lista de TargetEntry: una informativa para el .zip y una por
+    miembro .xml (nombre "archivo.zip/miembro.xml"). Los miembros no soportados
+    o ilegibles y un .zip corrupto cuentan como error. Con `filters`
+    (cfdi_filters.CfdiFilter) los miembros que no cumplen se omiten antes de
+    parsearlos. Los miembros en `known_names` (nombres con un UUID ya conocido;
+    ver process_path(known_uuids=...)) se omiten si su timbre lo confirma.
+    """
+    zip_name = os.path.basename(zip_path)
+    # Entrada solo informativa (sin registros ni error).
+    entries = [TargetEntry(zip_name, f" - Procesando {zip_name} en memoria...", [])]
     try:
         with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            zip_ref.extractall(temp_dir)
-
-        for root_dir, _, files in os.walk(temp_dir):
-            for file in files:
-                if file.lower().endswith(".xml"):
-                    xml_path = os.path.join(root_dir, file)
-                    data = parse_xml_file_by_version(xml_path)
-                    if data:
-                        if isinstance(data, list):
-                            extracted_data.extend(data)
-                        else:
-                            extracted_data.append(data)
-    finally:
-        shutil.rmtree(temp_dir)  # Limpiar archivos temporales
-    return extracted_data
+            for info in zip_ref.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(".xml"):
+                    continue
+                name = f"{zip_name}/{info.filename}"
+                try:
+                    if known_names and info.filename in known_names:
+                        # Solo la cola del miembro (lectura acotada), no su contenido.
+                        with zip_ref.open(info) as member:
+                            known = _timbre_has_uuid(member, uuid_from_name(info.filename),
+                                                     size=info.file_size)
+                        if known:
+                            entries.append(_known_entry(name))
+                            continue
+                    with zip_ref.open(info) as member:
+                        header = _sniff_for_filters(member, filters)
+                    if not is_supported_header(header):
+                        entries.append(TargetEntry(
+                            name, f" - Omitiendo {name} (no es un CFDI soportado)", None))
+                        continue
+                    if filters is not None and not header_matches(filters, header):
+                        entries.append(_filtered_entry(name))
+                        continue
+                    xml_bytes = zip_ref.read(info)
+                except (zipfile.BadZipFile, OSError, RuntimeError) as exc:
+                    entries.append(TargetEntry(name, f" - Error al leer {name}: {exc}", None))
+                    continue
+                if filters is not None and not _passes_timbre_filter(xml_bytes, filters):
+                    entries.append(_filtered_entry(name))
+                    continue
+                entries.append(_parsed_entry(
+                    name, parse_xml_file_by_version(name, xml_bytes=xml_bytes, header=header,
+                                                    skip_fields=skip_fields, columns=columns)))
+    except (zipfile.BadZipFile, OSError) as exc:
+        entries.append(TargetEntry(zip_name, f" - Error al abrir {zip_name}: {exc}", None))
+    return entries
 
 
 # --- Resultado del procesamiento -------------------------------------------
-class ProcessResult:
-    """Contenedor simple con los datos parseados y sus contadores."""
+# Tabla de ProcessResult por CFDI_Type (cualquier otro tipo va a la ultima).
+_RESULT_TABLE_BY_TYPE = {"Invoice": 0, "Nomina": 1, "Pago": 2}
 
-    def __init__(self):
-        self.all_parsed_data = []
-        self.invoice_data = []
-        self.nomina_data = []
-        self.pagos_data = []
+
+class RunStats:
+    """
+    Contadores de una corrida de iter_records (los comparte ProcessResult).
+
+    Con dedup=True un CFDI cuyo UUID del timbre ya se vio (suelto y dentro de
+    un .zip, o en dos descargas) no se entrega: queda en `duplicates` (filas
+    para la hoja "Duplicados").
+    """
+
+    def __init__(self, dedup=False):
         self.processed_count = 0
         self.error_count = 0
+        self.filtered_count = 0
+        self.known_count = 0
+        self._seen_uuids = set() if dedup else None
+        self.duplicates = []      # dicts con DUPLICATES_COLUMN_ORDER
+
+    def is_duplicate(self, records, location):
+        """
+        Revisa los registros de UN CFDI (Pagos: uno por DoctoRelacionado). Con
+        dedup, si su UUID ya se vio lo anota en `duplicates` y devuelve True.
+        """
+        if self._seen_uuids is None or not records:
+            return False
+        first = records[0]
+        uuid = (first.get("UUID") or first.get("UUID CFDI") or "").upper()
+        if uuid in self._seen_uuids:
+            self.duplicates.append({"UUID": uuid, "CFDI_Type": first.get("CFDI_Type"),
+                                    "Archivo": location})
+            return True
+        if uuid:
+            self._seen_uuids.add(uuid)
+        return False
+
+    @property
+    def duplicate_count(self):
+        return len(self.duplicates)
+
+
+class ProcessResult(RunStats):
+    """
+    Contenedor de los datos parseados y sus contadores (ver RunStats).
+
+    Los registros se reparten por CFDI_Type al agregarse (add/extend) en tres
+    RecordTable columnares: invoice_data, nomina_data y pagos_data. Se leen como
+    secuencias de dicts; all_parsed_data los regresa todos en el orden original.
+
+    El Certificado del emisor (base64, ~2 KB) se guarda una sola vez por
+    NoCertificado: los registros con el mismo certificado comparten el str.
+    """
+
+    def __init__(self, dedup=False):
+        super().__init__(dedup)
+        self.invoice_data = RecordTable()
+        self.nomina_data = RecordTable()
+        self.pagos_data = RecordTable()
+        self._other_data = RecordTable()
+        # Tabla de cada registro en orden de llegada (1 byte por registro).
+        self._order = array("B")
+        self._certificados = {}   # NoCertificado -> Certificado compartido
+
+    @property
+    def _tables(self):
+        return (self.invoice_data, self.nomina_data, self.pagos_data, self._other_data)
+
+    def add(self, record):
+        certificado = record.get("Certificado")
+        if certificado:
+            shared = self._certificados.setdefault(record.get("NoCertificado"), certificado)
+            if shared is not certificado and shared == certificado:
+                record["Certificado"] = shared
+        table = _RESULT_TABLE_BY_TYPE.get(record.get("CFDI_Type"), 3)
+        self._tables[table].append(record)
+        self._order.append(table)
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+
+    def iter_all(self):
+        """Genera todos los registros (dicts) en el orden en que se agregaron."""
+        iterators = [iter(table) for table in self._tables]
+        for table in self._order:
+            yield next(iterators[table])
+
+    @property
+    def all_parsed_data(self):
+        return list(self.iter_all())
+
+    @property
+    def record_count(self):
+        """Registros agregados (de todas las tablas)."""
+        return len(self._order)
 
     @property
     def has_data(self):
-        return bool(self.all_parsed_data)
+        return bool(self._order)
+
+
+class SpooledResult(ProcessResult):
+    """
+    ProcessResult con los registros en disco: invoice_data, nomina_data y
+    pagos_data son RecordSpool dentro de spool_dir, asi que en memoria solo
+    quedan los contadores y el orden de llegada (1 byte por registro). Para
+    --streaming con carpetas grandes; close() cierra los archivos.
+    """
 
+    def __init__(self, spool_dir, dedup=False):
+        super().__init__(dedup)
+        self.invoice_data, self.nomina_data, self.pagos_data, self._other_data = (
+            RecordSpool(os.path.join(spool_dir, f"{name}.spool"))
+            for name in ("invoice", "nomina", "pagos", "other"))
 
-def _collect_target_files(input_folder):
-    """Lista los archivos .xml/.zip bajo input_folder (para conocer el total)."""
-    targets = []
-    for root_dir, _, files in os.walk(input_folder):
-        for file in files:
-            lower = file.lower()
-            if lower.endswith(".xml") or lower.endswith(".zip"):
-                targets.append(os.path.join(root_dir, file))
-    return targets
+    def close(self):
+        for table in self._tables:
+            table.close()
 
 
-def process_path(input_folder, on_log=None, on_progress=None):
+# Huella de una carpeta ya listada (ver ParseCache.load_manifest):
+#   mtime_ns     -> st_mtime_ns de la carpeta (cambia al agregar, borrar o
+#                   renombrar algo DENTRO de ella, no al editar un archivo)
+#   entry_count  -> cuantos .xml/.zip tenia
+#   total_size   -> suma de sus tamanios
+#   files        -> nombres de esos .xml/.zip, en el orden del recorrido
+#   subfolders   -> nombres de sus subcarpetas (sin enlaces simbolicos)
+DirManifest = namedtuple(
+    "DirManifest", ["mtime_ns", "entry_count", "total_size", "files", "subfolders"])
+
+# Una carpeta modificada hace menos de esto no se guarda en el manifiesto: con
+# relojes de baja resolucion un archivo agregado justo despues de listarla
+# podria no mover su mtime.
+MANIFEST_MIN_AGE_NS = 2 * 10 ** 9
+
+
+def _scan_target_files(input_folder, manifest=None, listed=None):
     """
-    Recorre input_folder, parsea cada XML/ZIP y devuelve un ProcessResult.
+    Genera (ruta, podada) por cada .xml/.zip bajo input_folder, con os.scandir
+    y en el orden de os.walk: los archivos de cada carpeta y despues sus
+    subcarpetas (sin seguir enlaces simbolicos a carpetas). Las carpetas que no
+    se pueden leer se omiten.
 
-    Callbacks opcionales (para CLI o GUI; pueden ser None):
-        on_log(mensaje:str)               -> mensaje de progreso legible
-        on_progress(actual:int, total:int, nombre:str) -> avance numerico
+    manifest: {carpeta absoluta: DirManifest} de un recorrido anterior. Una
+    carpeta cuyo mtime no cambio no se lista: sus archivos y subcarpetas salen
+    del manifiesto (podada=True) sin un stat por archivo. Las carpetas que si
+    se listan dejan su DirManifest nuevo en el dict `listed`.
+    """
+    stack = [input_folder]
+    while stack:
+        folder = stack.pop()
+        key = mtime_ns = None
+        if manifest is not None or listed is not None:
+            # mtime ANTES de listar: lo que se agregue despues lo mueve.
+            key = os.path.abspath(folder)
+            try:
+                mtime_ns = os.stat(folder).st_mtime_ns
+            except OSError:
+                continue
+            known = manifest.get(key) if manifest is not None else None
+            if known is not None and known.mtime_ns == mtime_ns:
+                for name in known.files:
+                    yield os.path.join(folder, name), True
+                stack.extend(os.path.join(folder, name) for name in reversed(known.subfolders))
+                continue
+        files, subfolders, total_size = [], [], 0
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        if not entry.is_symlink():
+                            subfolders.append(entry.name)
+                        continue
+                    lower = entry.name.lower()
+                    if lower.endswith(".xml") or lower.endswith(".zip"):
+                        if listed is not None:
+                            files.append(entry.name)
+                            try:
+                                total_size += entry.stat().st_size
+                            except OSError:
+                                pass
+                        yield entry.path, False
+        except OSError:
+            continue
+        if listed is not None and time.time_ns() - mtime_ns >= MANIFEST_MIN_AGE_NS:
+            listed[key] = DirManifest(mtime_ns, len(files), total_size,
+                                      tuple(files), tuple(subfolders))
+        stack.extend(os.path.join(folder, name) for name in reversed(subfolders))
 
-    Es agnostico de la UI: no imprime ni abre ventanas.
+
+class _TargetScanner:
+    """
+    Descubrimiento en un hilo aparte: recorre la carpeta con _scan_target_files
+    y deja cada ruta en una cola mientras el pipeline ya parsea las primeras (en
+    carpetas de red con cientos de miles de archivos el recorrido tarda minutos).
+    `found` es el total corriendo; es el definitivo cuando `done` es True.
+
+    Con manifest (ver _scan_target_files) las rutas de carpetas sin cambios
+    quedan en `pruned` y las carpetas listadas en `listed`, para guardarlas.
+    """
+
+    _END = object()
+
+    def __init__(self, input_folder, manifest=None):
+        self.found = 0
+        self.done = False
+        self.pruned = set()
+        self.listed = {} if manifest is not None else None
+        self._queue = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(input_folder, manifest), name="cfdi-scan", daemon=True)
+        self._thread.start()
+
+    def _run(self, input_folder, manifest):
+        try:
+            for path, pruned in _scan_target_files(input_folder, manifest, self.listed):
+                if self._stop.is_set():
+                    break
+                if pruned:
+                    self.pruned.add(path)
+                self.found += 1
+                self._queue.put(path)
+        finally:
+            self.done = True
+            self._queue.put(self._END)
+
+    def next_path(self, timeout=None):
+        """
+        Siguiente ruta, o None si ya no hay mas. Con timeout lanza queue.Empty
+        si el recorrido no encontro otra en ese tiempo.
+        """
+        path = self._queue.get(timeout=timeout)
+        if path is self._END:
+            self._queue.put(self._END)   # las siguientes llamadas tambien terminan
+            return None
+        return path
+
+    def __iter__(self):
+        return iter(self.next_path, None)
+
+    def stop(self):
+        """Detiene el recorrido (el consumidor dejo de iterar)."""
+        self._stop.set()
+
+
+# Tamanio maximo de lote enviado a cada proceso del pool.
+MAX_POOL_CHUNKSIZE = 64
+# Tareas en vuelo por worker: el descubrimiento no se adelanta sin limite.
+POOL_TASKS_PER_WORKER = 2
+# Espera (s) de una ruta nueva antes de entregar lo ya parseado y mandar al
+# pool el lote incompleto (recorridos lentos).
+SCAN_POLL_SECONDS = 0.05
+
+# Pool para workers > 1: "process" (ProcessPoolExecutor), "thread"
+# (ThreadPoolExecutor) o "auto" (hilos solo si el interprete corre sin GIL).
+EXECUTORS = ("auto", "process", "thread")
+
+
+def gil_enabled():
+    """False solo en un CPython free-threaded (3.13t en adelante) corriendo sin GIL."""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+def resolve_executor(executor="auto"):
+    """
+    "process" o "thread" para un valor de EXECUTORS. En "auto" se usan hilos
+    cuando no hay GIL: paralelizan igual que procesos pero sin copiar (pickle)
+    los registros de vuelta. Con GIL los hilos no paralelizan el parseo.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"Ejecutor desconocido: {executor}")
+    if executor == "auto":
+        return "process" if gil_enabled() else "thread"
+    return executor
+
+
+def _known_zip_members(zip_path, known_uuids):
+    """Miembros del .zip cuyo nombre empieza con un UUID conocido (solo el indice)."""
+    try:
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            return frozenset(name for name in zip_ref.namelist()
+                             if uuid_from_name(name) in known_uuids)
+    except (zipfile.BadZipFile, OSError):
+        return frozenset()
+
+
+def _parse_target(path, known_names=None, skip_fields=frozenset(), columns=None,
+                  filters=None):
     """
+    Parsea un objetivo (.xml o .zip) y devuelve su lista de TargetEntry.
+    known_names: miembros del .zip con UUID conocido (ver process_zip_file).
+
+    Funcion de nivel de modulo y sin callbacks para que pueda ejecutarse en un
+    proceso del pool: el proceso principal reproduce los mensajes y contadores
+    en orden (ver _merge_target).
+    """
+    file = os.path.basename(path)
+    if file.lower().endswith(".xml"):
+        # Ruteo y pre-filtro con solo el encabezado: lo que no es un CFDI
+        # soportado se cuenta como error sin construir el arbol completo.
+        header = _sniff_for_filters(path, filters)
+        if not is_supported_header(header):
+            return [TargetEntry(file, f" - Omitiendo {file} (no es un CFDI soportado)", None)]
+        # Filtros: primero lo del encabezado y despues la fecha del timbre.
+        if filters is not None and not (header_matches(filters, header)
+                                        and _passes_timbre_filter(path, filters)):
+            return [_filtered_entry(file)]
+        return [_parsed_entry(file, parse_xml_file_by_version(
+            path, header=header, skip_fields=skip_fields, columns=columns))]
+    # .zip: una entrada por miembro
+    return process_zip_file(path, skip_fields=skip_fields, columns=columns,
+                            filters=filters, known_names=known_names)
+
+
+# Registro entregado por iter_records, con su origen y el avance.
+#   record -> dict del parser (CFDI_Type dice su hoja: Invoice, Nomina o Pago)
+#   source -> ruta del XML o "ruta/paquete.zip/miembro.xml"
+#   index  -> numero (1..total) del objetivo .xml/.zip de donde viene
+#   total  -> objetivos encontrados hasta ese momento (el recorrido corre a la
+#             par del parseo; es el total definitivo al terminar de recorrer)
+RecordItem = namedtuple("RecordItem", ["record", "source", "index", "total"])
+
+
+def _target_records(stats, index, total, path, entries, log, on_progress):
+    """
+    Aplica las entradas de un objetivo a los contadores (y al log) y genera
+    un RecordItem por registro. Los miembros de un .zip reportan ademas su
+    avance con el indice del .zip y el nombre "paquete.zip/miembro.xml".
+    """
+    file = os.path.basename(path)
+    for entry in entries:
+        if on_progress and entry.name != file:
+            on_progress(index, total, entry.name)
+        log(entry.message)
+        if entry.skipped == SKIPPED_FILTERED:
+            stats.filtered_count += 1
+        elif entry.skipped == SKIPPED_KNOWN:
+            stats.known_count += 1
+        elif entry.records is None:
+            stats.error_count += 1
+        else:
+            source = os.path.join(os.path.dirname(path), entry.name)
+            if stats.is_duplicate(entry.records, source):
+                log(f" - Duplicado {entry.name} (UUID ya procesado)")
+                continue
+            stats.processed_count += len(entry.records)
+            for record in entry.records:
+                yield RecordItem(record, source, index, total)
+
+
+def _pool_chunksize(total, workers):
+    """Lotes de ~4 por proceso (acotados) para repartir carga sin mucho IPC."""
+    return max(1, min(MAX_POOL_CHUNKSIZE, total // (workers * 4)))
+
+
+def _parse_targets(parse_target, paths, known_names):
+    """Parsea un lote de objetivos (tarea del pool de hilos): una lista de entries por objetivo."""
+    return [parse_target(path, names) for path, names in zip(paths, known_names)]
+
+
+def _parse_batch(parse_target, paths, known_names):
+    """
+    Parsea un lote de objetivos en un proceso del pool y lo regresa empaquetado
+    (ver batch_transfer.py): un descriptor por lote en lugar de un dict pickleado
+    por registro.
+    """
+    return pack_batch(_parse_targets(parse_target, paths, known_names))
+
+
+def _unpacked_targets(descriptor):
+    """Lista de TargetEntry por objetivo de un lote empaquetado, en orden."""
+    return [[TargetEntry(*entry) for entry in entries] for entries in unpack_batch(descriptor)]
+
+
+class _PoolTask:
+    """Lote de objetivos para el pool; future es None mientras se sigue llenando."""
+
+    __slots__ = ("paths", "known_names", "future")
+
+    def __init__(self):
+        self.paths = []
+        self.known_names = []
+        self.future = None
+
+
+def select_columns(columns):
+    """
+    Seleccion de columnas para los parsers: None (todas) o un frozenset con las
+    columnas pedidas mas PROJECTION_REQUIRED_COLUMNS (tipo, UUID, RFCs y fecha
+    de timbrado, que usan la boveda y el nombre del reporte).
+    """
+    if columns is None:
+        return None
+    return frozenset(columns) | PROJECTION_REQUIRED_COLUMNS
+
+
+def extraction_variant(profile=DEFAULT_EXTRACTION_PROFILE, columns=None, filters=None):
+    """
+    Texto que identifica que registros produce una corrida con ese perfil,
+    seleccion de columnas y filtros. El cache de parseo la usa como parte de la
+    llave de cada fila (ParseCache(..., variant=...)): cada variante tiene sus
+    propias filas y no pisa las de otra. Sin columnas ni filtros es el nombre
+    del perfil.
+    """
+    if columns is None and filters is None:
+        return profile
+    key = repr((sorted(set(columns)) if columns is not None else None, filters))
+    return f"{profile}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:8]}"
+
+
+def iter_records(input_folder, on_log=None, on_progress=None, workers=1, cache=None,
+                 profile=DEFAULT_EXTRACTION_PROFILE, columns=None, filters=None,
+                 known_uuids=None, dedup=True, executor="auto", stats=None,
+                 prune_dirs=False):
+    """
+    Recorre input_folder y genera un RecordItem por registro, a medida que se
+    parsea cada XML o miembro de .zip y en el orden de los archivos. Sirve para
+    consumir los registros sin juntarlos todos (Boveda.ingest, un JSONL...);
+    process_path es este generador acumulado en un ProcessResult.
+
+    Los argumentos son los de process_path. stats: RunStats donde se acumulan
+    los contadores y los duplicados (si se pasa, su dedup manda sobre `dedup`);
+    quedan completos cuando el generador termina. Los errores de argumentos
+    (perfil, cache de otra variante, prune_dirs sin cache) se lanzan al
+    llamar, no al iterar.
+    """
+    if profile not in EXTRACTION_PROFILES:
+        raise ValueError(f"Perfil de extraccion desconocido: {profile}")
+    executor = resolve_executor(executor)
+    variant = extraction_variant(profile, columns, filters)
+    if cache is not None and cache.variant != variant:
+        raise ValueError(f"El cache es de la variante {cache.variant!r}, no de {variant!r}")
+    if prune_dirs and cache is None:
+        raise ValueError("prune_dirs requiere un cache de parseo")
+    skip_fields = EXTRACTION_PROFILES[profile]
+    if columns is not None:
+        # Una columna pedida explicitamente manda sobre el perfil.
+        skip_fields = skip_fields.difference(columns)
+    parse_target = partial(_parse_target, skip_fields=skip_fields,
+                           columns=select_columns(columns), filters=filters)
+    if stats is None:
+        stats = RunStats(dedup=dedup)
+    return _iter_records(input_folder, on_log, on_progress, workers, executor, cache,
+                         parse_target, known_uuids, stats, prune_dirs)
+
+
+def _iter_records(input_folder, on_log, on_progress, workers, executor, cache,
+                  parse_target, known_uuids, stats, prune_dirs):
+    """Cuerpo generador de iter_records (ya validados los argumentos)."""
     def log(msg):
         if on_log:
             on_log(msg)
 
-    result = ProcessResult()
-
     if not input_folder or not os.path.isdir(input_folder):
         log(f"Ruta invalida: {input_folder}")
-        return result
-
-    targets = _collect_target_files(input_folder)
-    total = len(targets)
-    log(f"Escaneando directorio: {input_folder} ({total} archivo(s) encontrados)")
-
-    for index, path in enumerate(targets, start=1):
-        file = os.path.basename(path)
-        if on_progress:
-            on_progress(index, total, file)
-
-        lower = file.lower()
-        if lower.endswith(".xml"):
-            log(f" - Procesando {file}...")
-            parsed_data = parse_xml_file_by_version(path)
-            if parsed_data:
-                if isinstance(parsed_data, list):
-                    result.all_parsed_data.extend(parsed_data)
-                    result.processed_count += len(parsed_data)
-                else:
-                    result.all_parsed_data.append(parsed_data)
-                    result.processed_count += 1
+        return
+
+    # El recorrido corre en otro hilo: el primer archivo se parsea en cuanto
+    # aparece y el avance reporta el total encontrado hasta ese momento.
+    log(f"Escaneando directorio: {input_folder}")
+    scanner = _TargetScanner(input_folder, cache.load_manifest() if prune_dirs else None)
+    summary = {"known_files": 0, "known_zips": 0, "cached": 0}
+
+    def classify(path):
+        """
+        (entries, None) si el resultado se sabe sin parsear (UUID conocido por
+        nombre y cola del timbre, o acierto del cache) o (None, known_names).
+        """
+        known_names = None
+        if known_uuids:
+            if path.lower().endswith(".zip"):
+                known_names = _known_zip_members(path, known_uuids)
+                if known_names:
+                    summary["known_zips"] += 1
             else:
-                result.error_count += 1
-        elif lower.endswith(".zip"):
-            log(f" - Descomprimiendo y procesando {file}...")
-            zip_results = process_zip_file(path)
-            if zip_results:
-                result.all_parsed_data.extend(zip_results)
-                result.processed_count += len(zip_results)
-
-    # Separar por tipo para las hojas del Excel.
-    result.invoice_data = [
-        d for d in result.all_parsed_data if d.get("CFDI_Type") == "Invoice"]
-    result.nomina_data = [
-        d for d in result.all_parsed_data if d.get("CFDI_Type") == "Nomina"]
-    result.pagos_data = [
-        d for d in result.all_parsed_data if d.get("CFDI_Type") == "Pago"]
+                name_uuid = uuid_from_name(path)
+                if name_uuid in known_uuids and _timbre_has_uuid(path, name_uuid):
+                    summary["known_files"] += 1
+                    return [_known_entry(os.path.basename(path))], None
+        # Los .zip con miembros conocidos no usan el cache.
+        if cache is not None and not known_names:
+            # Archivo de una carpeta sin cambios: sin stat, directo del cache.
+            entries = None
+            if path in scanner.pruned:
+                entries = cache.load_unchecked([path]).get(path)
+            if entries is None:
+                entries = cache.load([path]).get(path)
+            if entries is not None:
+                summary["cached"] += 1
+                return entries, None
+        return None, known_names
 
+    def parsed(path, known_names, entries):
+        if cache is not None and not known_names:
+            cache.store(path, entries)
+        return path, entries
+
+    def serial_entries():
+        for path in scanner:
+            entries, known_names = classify(path)
+            if entries is None:
+                yield parsed(path, known_names, parse_target(path, known_names))
+            else:
+                yield path, entries
+
+    def pooled_entries():
+        # Ventana en el orden del recorrido: objetivos ya resueltos (path,
+        # entries) y lotes (_PoolTask). El frente se entrega en cuanto esta
+        # listo, sin esperar a que termine el recorrido.
+        processes = executor != "thread"
+        if processes:
+            # Procesos: cada tarea es un lote que regresa empaquetado en
+            # columnas (memoria compartida si es grande).
+            pool = ProcessPoolExecutor(max_workers=workers)
+        else:
+            # Los parsers solo leen estado de modulo (catalogos, namespaces,
+            # planes compilados): se pueden compartir entre hilos sin candados,
+            # y los registros ya estan en este proceso.
+            pool = ThreadPoolExecutor(max_workers=workers)
+        window = deque()
+        open_task = None
+        in_flight = 0
+
+        def submit():
+            nonlocal open_task, in_flight
+            if open_task is not None:
+                open_task.future = pool.submit(
+                    _parse_batch if processes else _parse_targets,
+                    parse_target, open_task.paths, open_task.known_names)
+                open_task = None
+                in_flight += 1
+
+        def is_ready(item):
+            return not isinstance(item, _PoolTask) or (
+                item.future is not None and item.future.done())
+
+        def deliver(item):
+            nonlocal in_flight
+            if not isinstance(item, _PoolTask):
+                yield item
+                return
+            in_flight -= 1
+            result = item.future.result()
+            targets = _unpacked_targets(result) if processes else result
+            for path, known_names, entries in zip(item.paths, item.known_names, targets):
+                yield parsed(path, known_names, entries)
+
+        try:
+            while True:
+                while window and is_ready(window[0]):
+                    yield from deliver(window.popleft())
+                if in_flight >= workers * POOL_TASKS_PER_WORKER:
+                    wait([window[0].future])
+                    continue
+                try:
+                    path = scanner.next_path(timeout=SCAN_POLL_SECONDS if window else None)
+                except queue.Empty:
+                    # Recorrido lento: que el pool no espere a llenar el lote.
+                    submit()
+                    continue
+                if path is None:
+                    break
+                entries, known_names = classify(path)
+                if entries is not None:
+                    window.append((path, entries))
+                    continue
+                if open_task is None:
+                    open_task = _PoolTask()
+                    window.append(open_task)
+                open_task.paths.append(path)
+                open_task.known_names.append(known_names)
+                # Lotes que crecen con el total corriendo (1 con hilos: sin IPC).
+                size = _pool_chunksize(scanner.found, workers) if processes else 1
+                if len(open_task.paths) >= size:
+                    submit()
+            submit()
+            while window:
+                yield from deliver(window.popleft())
+        finally:
+            # Tambien si el consumidor deja de iterar antes de terminar: los
+            # lotes que no empezaron se cancelan y lo ya parseado queda en el cache.
+            pool.shutdown(cancel_futures=True)
+            if processes:
+                # Lotes terminados que nadie leyo: liberar su memoria compartida.
+                for item in window:
+                    if isinstance(item, _PoolTask) and item.future is not None:
+                        try:
+                            release_batch(item.future.result())
+                        except Exception:
+                            pass   # lote cancelado o fallido: no dejo segmento
+
+    def all_records(target_entries):
+        for index, (path, entries) in enumerate(target_entries, start=1):
+            total = scanner.found
+            if on_progress:
+                on_progress(index, total, os.path.basename(path))
+            yield from _target_records(stats, index, total, path, entries, log, on_progress)
+
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    try:
+        yield from all_records(serial_entries() if workers <= 1 else pooled_entries())
+        # Conciliacion: el total definitivo, ya con el recorrido terminado.
+        log(f"Escaneo terminado: {scanner.found} archivo(s) encontrados en {input_folder}")
+        if summary["known_files"] or summary["known_zips"]:
+            log(f"UUID ya registrados: {summary['known_files']} archivo(s) y "
+                f"{summary['known_zips']} .zip con miembros conocidos")
+        if summary["cached"]:
+            log(f"Cache: {summary['cached']} archivo(s) sin cambios, no se re-parsearon")
+        if prune_dirs:
+            if scanner.pruned:
+                log(f"Manifiesto: {len(scanner.pruned)} archivo(s) de carpetas sin "
+                    f"cambios, no se listaron")
+            cache.store_manifest(scanner.listed)
+    finally:
+        scanner.stop()
+        if cache is not None:
+            cache.flush()
+
+
+def process_path(input_folder, on_log=None, on_progress=None, workers=1, cache=None,
+                 profile=DEFAULT_EXTRACTION_PROFILE, columns=None, filters=None,
+                 known_uuids=None, dedup=True, executor="auto", prune_dirs=False,
+                 spool_dir=None):
+    """
+    Recorre input_folder, parsea cada XML/ZIP y devuelve un ProcessResult
+    (iter_records acumulado; para consumir registros uno por uno usar ese).
+
+    Callbacks opcionales (para CLI o GUI; pueden ser None):
+        on_log(mensaje:str)               -> mensaje de progreso legible
+        on_progress(actual:int, total:int, nombre:str) -> avance numerico
+    La carpeta se recorre en un hilo aparte mientras se parsea: `total` es lo
+    encontrado hasta ese momento y crece hasta el definitivo (el del ultimo
+    aviso; el log lo confirma al terminar).
+
+    workers: numero de procesos para parsear en paralelo (1 = en serie, 0 =
+    todos los nucleos). Los archivos se reparten en lotes a un
+    ProcessPoolExecutor; los callbacks se siguen llamando desde este proceso,
+    en el orden de los archivos, y el resultado es identico al modo en serie.
+    executor: "process", "thread" o "auto" (EXECUTORS): en "auto" un CPython
+    free-threaded sin GIL usa un ThreadPoolExecutor (sin pickle de ida y
+    vuelta) y cualquier otro usa procesos.
+
+    cache: parse_cache.ParseCache opcional. Los archivos sin cambios (misma
+    ruta, tamanio y mtime) se toman del cache; solo se parsean los nuevos o
+    modificados, y su resultado se guarda para la proxima corrida. El cache
+    debe ser de la misma variante (ParseCache(..., variant=extraction_variant(
+    profile, columns, filters))).
+
+    profile: perfil de extraccion (constants.EXTRACTION_PROFILES). "lean" omite
+    Sello, SelloSAT y Certificado de los registros, salvo los que se pidan en
+    `columns`.
+
+    columns: lista de columnas a extraer (None = todas). Los parsers se saltan
+    lo que solo alimenta columnas no pedidas y los registros solo llevan esas
+    columnas (mas las de select_columns). Exportar con export_report(columns=...).
+
+    filters: cfdi_filters.CfdiFilter opcional (ver cfdi_filters.build_filter):
+    RFC, rango de FechaTimbrado, TipoDeComprobante y Version. Se evaluan con el
+    encabezado y el timbre leidos sin parsear; los XML que no cumplen no se
+    parsean y solo suman a result.filtered_count.
+
+    known_uuids: conjunto de UUID en mayusculas ya guardados (p. ej.
+    Boveda.known_uuids()) para sincronizar solo lo nuevo. Un XML o miembro de
+    .zip cuyo nombre empieza con uno de ellos ("<UUID>@<RFC>.xml") no se parsea
+    si el UUID de su timbre coincide; solo suma a result.known_count. Los .zip
+    con miembros conocidos no usan el cache (sus entradas dependen del conjunto).
+
+    dedup: un CFDI repetido (mismo UUID del TimbreFiscalDigital en otro archivo
+    o miembro de .zip, de cualquier version) solo se agrega la primera vez; los
+    demas van a result.duplicates / result.duplicate_count. dedup=False los
+    conserva todos.
+
+    prune_dirs: con cache, guarda un manifiesto por carpeta (mtime, cuantos
+    .xml/.zip y su tamanio total; ver DirManifest) y en la siguiente corrida
+    no lista las carpetas cuyo mtime no cambio (los meses cerrados de la
+    boveda): sus archivos salen del manifiesto y sus entries del cache, sin un
+    stat por archivo. Solo se listan las carpetas donde se agrego, borro o
+    renombro algo. Un XML editado EN SU LUGAR no cambia el mtime de su
+    carpeta; despues de corregir archivos a mano, correr sin prune_dirs.
+
+    spool_dir: carpeta (ya creada) donde guardar los registros en lugar de
+    memoria; devuelve un SpooledResult que export_report(streaming=True)
+    escribe sin cargarlo completo. Quien llama borra la carpeta al terminar
+    (despues de result.close()).
+
+    Es agnostico de la UI: no imprime ni abre ventanas.
+    """
+    if spool_dir is None:
+        result = ProcessResult(dedup=dedup)
+    else:
+        result = SpooledResult(spool_dir, dedup=dedup)
+    for item in iter_records(input_folder, on_log, on_progress, workers, cache, profile,
+                             columns, filters, known_uuids, executor=executor,
+                             stats=result, prune_dirs=prune_dirs):
+        result.add(item.record)
+    return result
+
+
+def load_from_boveda(db_path, cfdi_types=None, rfc=None, direction=None,
+                     date_from=None, date_to=None):
+    """
+    Arma un ProcessResult con una consulta a la boveda SQLite, sin leer XML.
+
+    Los filtros son los de Boveda.query (tipo de CFDI, RFC, Emitidas/Recibidas y
+    rango de fecha de timbrado). El resultado se exporta igual que el de
+    process_path (export_report / build_default_filename).
+    """
+    result = ProcessResult()
+    with Boveda(db_path) as boveda:
+        by_type = boveda.query(cfdi_types=cfdi_types, rfc=rfc, direction=direction,
+                               date_from=date_from, date_to=date_to)
+    for cfdi_type in ("Invoice", "Nomina", "Pago"):
+        result.extend(by_type.get(cfdi_type, ()))
+    result.processed_count = result.record_count
     return result
 
 
@@ -210,10 +995,10 @@ def determine_file_naming_components(parsed_data_list):
     """
     Determina RFC, TypeOfXML (Emitidas/Recibidas/Mixed) y Year_Month para el
     nombre del archivo. (Logica original conservada sin cambios de comportamiento.)
-    """
-    if not parsed_data_list:
-        return "Generic", "Report", "UnknownDate"
 
+    parsed_data_list puede ser cualquier iterable de registros (p. ej.
+    result.iter_all()): se recorre una sola vez.
+    """
     all_rfcs_emisor = set()
     all_rfcs_receptor = set()
     all_dates_set = set()  # tuplas (anio, mes)
@@ -228,7 +1013,12 @@ def determine_file_naming_components(parsed_data_list):
                 continue
         return None
 
+    has_records = False
+    is_all_nomina = True
     for data in parsed_data_list:
+        has_records = True
+        if data.get("CFDI_Type") != "Nomina":
+            is_all_nomina = False
         emisor_rfc = data.get("RFC Emisor") or data.get("RFC Emisor CFDI")
         receptor_rfc = data.get("RFC Receptor") or data.get("RFC Receptor CFDI")
 
@@ -247,12 +1037,13 @@ def determine_file_naming_components(parsed_data_list):
         if dt_object:
             all_dates_set.add((dt_object.year, dt_object.month))
 
+    if not has_records:
+        return "Generic", "Report", "UnknownDate"
+
     rfc_part = "MixedRFCs"
     type_of_xml_part = "Report"
 
     # Priorizar el caso de Nomina unica.
-    is_all_nomina = all(d.get("CFDI_Type") ==
-                        "Nomina" for d in parsed_data_list)
     if is_all_nomina and len(all_rfcs_receptor) == 1:
         rfc_part = list(all_rfcs_receptor)[0]
         type_of_xml_part = "Recibidas"
@@ -298,10 +1089,21 @@ def build_default_filename(parsed_data_list):
     return f"{rfc_part}_{type_part}_{date_part}.xlsx"
 
 
-def export_report(result, output_path):
-    """Exporta el ProcessResult a un archivo Excel multi-hoja."""
-    export_to_excel(result.invoice_data, result.nomina_data,
-                    result.pagos_data, output_path)
+def export_report(result, output_path, streaming=False, columns=None,
+                  duplicates_sheet=False):
+    """
+    Exporta el ProcessResult a un archivo Excel multi-hoja.
+
+    streaming=True usa el escritor write_only (sin DataFrames): no agrega
+    memoria por fila, pero los registros de un ProcessResult ya estan en
+    memoria; para que la corrida completa no crezca con el numero de filas,
+    procesar con process_path(spool_dir=...). columns: solo exportar esas
+    columnas (la misma lista que se paso a process_path). duplicates_sheet=True agrega la
+    hoja "Duplicados" con result.duplicates (si hay).
+    """
+    export = export_to_excel_streaming if streaming else export_to_excel
+    export(result.invoice_data, result.nomina_data, result.pagos_data, output_path,
+           columns=columns, duplicates=result.duplicates if duplicates_sheet else None)
 
 
 def open_file(path):
@@ -1,26 +1,130 @@
 # --- cfdi_processor/excel_exporter.py ---
 import pandas as pd
+import numpy as np
 import os
+from itertools import chain, islice
 # Importar para el autoajuste de ancho de columna
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
 from openpyxl.utils import get_column_letter
 # Importar órdenes de columna
-from constants import INVOICE_COLUMN_ORDER, PAGOS_COLUMN_ORDER
+from constants import DUPLICATES_COLUMN_ORDER, INVOICE_COLUMN_ORDER, PAGOS_COLUMN_ORDER
+from records import RecordSpool, RecordTable
 
+# Máximo de filas que se miden para el ancho de columna. Con más filas se mide
+# una muestra fija (random_state=0) de este tamaño; None = medir todas.
+AUTOSIZE_SAMPLE_ROWS = 100_000
 
-def export_to_excel(invoice_data_list, nomina_data_list, pagos_data_list, output_file_path):
+# Modo streaming: filas que se guardan en memoria para medir el ancho de las
+# columnas antes de empezar a escribir (write_only exige fijar anchos primero).
+STREAM_WIDTH_SAMPLE_ROWS = 1_000
+
+# Excel admite 1,048,576 filas por hoja; una va al encabezado. Con mas filas la
+# hoja se parte en "Pagos", "Pagos_2", "Pagos_3"... con las mismas columnas y anchos.
+EXCEL_MAX_DATA_ROWS = 1_048_575
+
+# Tipos que se miden como número con 2 decimales (igual que el ajuste original).
+_NUMERIC_TYPES = (int, float, np.integer, np.floating, np.bool_)
+
+
+def _format_for_width(value):
+    """Texto cuyo largo define el ancho: números con 2 decimales, lo demás str()."""
+    if isinstance(value, _NUMERIC_TYPES):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def _compute_column_widths(df, sample_rows=AUTOSIZE_SAMPLE_ROWS):
+    """
+    Calcula el ancho de cada columna del DataFrame ANTES de escribirlo:
+    max(largo del encabezado, largo de cada valor no nulo) + 2.
+
+    Solo se formatean los valores únicos de cada columna (pd.unique) y el largo
+    se mide con .str.len(), en lugar de recorrer cada celda de openpyxl.
+    """
+    if sample_rows is not None and len(df) > sample_rows:
+        df = df.sample(n=sample_rows, random_state=0)
+    widths = []
+    for col in df.columns:
+        max_length = len(str(col))
+        uniques = pd.unique(df[col].dropna())
+        if len(uniques):
+            lengths = pd.Series(uniques, dtype=object).map(_format_for_width).str.len()
+            max_length = max(max_length, int(lengths.max()))
+        widths.append(max_length + 2)
+    return widths
+
+
+def _autosize_columns(worksheet, widths):
+    """Aplica los anchos calculados por _compute_column_widths a la hoja."""
+    for i, width in enumerate(widths, start=1):
+        worksheet.column_dimensions[get_column_letter(i)].width = width
+
+
+def _sheet_columns(column_order, selected=None):
+    """Columnas de una hoja: column_order sin CFDI_Type y, si hay seleccion, solo las pedidas."""
+    return [col for col in column_order
+            if col != "CFDI_Type" and (selected is None or col in selected)]
+
+
+def _to_dataframe(data, columns=None, selected=None):
+    """
+    DataFrame de una lista de dicts o de un RecordTable (este ultimo se arma
+    directo de sus columnas, sin un dict por fila). columns=None = todas las
+    columnas de los registros menos CFDI_Type (caso Nomina), filtradas por la
+    seleccion `selected` si la hay.
+    """
+    if isinstance(data, RecordTable):
+        if columns is None:
+            columns = _sheet_columns(data.columns, selected)
+        return data.to_dataframe(columns)
+    df = pd.DataFrame(data)
+    if columns is None:
+        return df[_sheet_columns(df.columns, selected)]
+    return df.reindex(columns=columns)
+
+
+def _sheet_part_name(sheet_name, part):
+    """Nombre de la parte N de una hoja partida: Pagos, Pagos_2, Pagos_3..."""
+    return sheet_name if part == 1 else f"{sheet_name}_{part}"
+
+
+def _write_sheet(writer, df, sheet_name, max_rows=EXCEL_MAX_DATA_ROWS):
+    """
+    Escribe el DataFrame en la hoja y auto-ajusta el ancho de sus columnas.
+    Si tiene mas de max_rows filas se reparte en varias hojas (ver
+    _sheet_part_name); los anchos se calculan una vez para todas.
+    """
+    widths = _compute_column_widths(df)
+    for part, start in enumerate(range(0, max(len(df), 1), max_rows), start=1):
+        part_name = _sheet_part_name(sheet_name, part)
+        df.iloc[start:start + max_rows].to_excel(writer, sheet_name=part_name, index=False)
+        _autosize_columns(writer.sheets[part_name], widths)
+
+
+def export_to_excel(invoice_data_list, nomina_data_list, pagos_data_list, output_file_path,
+                    max_rows_per_sheet=EXCEL_MAX_DATA_ROWS, columns=None, duplicates=None):
     """
     Exporta listas de diccionarios (una para facturas, otra para nóminas, otra para pagos)
     a un archivo de Excel con hojas separadas usando Pandas.
 
     Args:
-        invoice_data_list (list): Una lista de diccionarios para facturas regulares.
-        nomina_data_list (list): Lista de diccionarios para el complemento de nómina.
-        pagos_data_list (list): Lista de diccionarios para el complemento de pagos.
+        invoice_data_list (list | RecordTable): Una lista de diccionarios para facturas regulares.
+        nomina_data_list (list | RecordTable): Lista de diccionarios para el complemento de nómina.
+        pagos_data_list (list | RecordTable): Lista de diccionarios para el complemento de pagos.
         output_file_path (str): La ruta completa donde se guardará el archivo de Excel.
+        max_rows_per_sheet (int): Filas de datos por hoja antes de continuar en
+            Hoja_2, Hoja_3... (por defecto, el límite de Excel).
+        columns (iterable, opcional): Solo exportar estas columnas (en el orden
+            de cada hoja). None = todas.
+        duplicates (list, opcional): CFDIs repetidos (ProcessResult.duplicates)
+            para la hoja 'Duplicados'. None o vacía = sin esa hoja.
     """
     if not invoice_data_list and not nomina_data_list and not pagos_data_list:
         print("No hay datos para exportar. No se creará el archivo de Excel.")
         return
+    selected = frozenset(columns) if columns is not None else None
 
     # Asegurarse de que el directorio de salida exista.
     output_dir = os.path.dirname(output_file_path)
@@ -34,43 +138,13 @@ def export_to_excel(invoice_data_list, nomina_data_list, pagos_data_list, output
         with pd.ExcelWriter(output_file_path, engine='openpyxl') as writer:
             # --- Hoja de Invoices ---
             if invoice_data_list:
-                df_invoices = pd.DataFrame(invoice_data_list)
-
                 # Reindexar el DataFrame para que coincida exactamente con el orden de columnas deseado.
                 # Esto añadirá columnas faltantes con NaN y eliminará las no especificadas.
                 # Excluimos 'CFDI_Type' ya que es una columna interna para categorización.
-                final_invoice_columns = [
-                    col for col in INVOICE_COLUMN_ORDER if col != "CFDI_Type"]
-                df_invoices = df_invoices.reindex(
-                    columns=final_invoice_columns)
-
-                df_invoices.to_excel(
-                    writer, sheet_name='Invoices', index=False)
-
-                # Auto-ajustar el ancho de las columnas
-                worksheet = writer.sheets['Invoices']
-                for i, col in enumerate(df_invoices.columns):
-                    max_length = 0
-                    # Considerar la longitud del encabezado
-                    max_length = max(max_length, len(str(col)))
-                    # Iterar a través de la columna para encontrar la longitud máxima del contenido de la celda
-                    for cell in worksheet.iter_cols(min_col=i+1, max_col=i+1, min_row=1):
-                        for c in cell:
-                            try:
-                                if c.value is not None:
-                                    # Convertir a cadena para medir la longitud, pero no cambiar el tipo de dato subyacente
-                                    cell_value_str = str(c.value)
-                                    # Si es un número flotante, redondear para la medición de longitud
-                                    if isinstance(c.value, (float, int)):
-                                        # Considerar 2 decimales para ancho
-                                        cell_value_str = f"{c.value:.2f}"
-                                    max_length = max(
-                                        max_length, len(cell_value_str))
-                            except TypeError:
-                                pass  # Manejar casos donde el valor de la celda es None o no es una cadena
-                    adjusted_width = (max_length + 2)
-                    worksheet.column_dimensions[get_column_letter(
-                        i + 1)].width = adjusted_width
+                final_invoice_columns = _sheet_columns(INVOICE_COLUMN_ORDER, selected)
+                df_invoices = _to_dataframe(invoice_data_list, final_invoice_columns)
+
+                _write_sheet(writer, df_invoices, 'Invoices', max_rows_per_sheet)
 
                 print(
                     f"Exportadas {len(invoice_data_list)} facturas CFDI regulares a la hoja 'Invoices'.")
@@ -79,34 +153,11 @@ def export_to_excel(invoice_data_list, nomina_data_list, pagos_data_list, output
 
             # --- Hoja de Nomina ---
             if nomina_data_list:
-                df_nominas = pd.DataFrame(nomina_data_list)
-
                 # Para la hoja de Nómina, no tenemos un orden estricto en constants.py,
                 # así que simplemente eliminamos la columna interna 'CFDI_Type'.
-                df_nominas = df_nominas.drop(
-                    columns=['CFDI_Type'], errors='ignore')
-
-                df_nominas.to_excel(writer, sheet_name='Nomina', index=False)
-
-                # Auto-ajustar el ancho de las columnas
-                worksheet = writer.sheets['Nomina']
-                for i, col in enumerate(df_nominas.columns):
-                    max_length = 0
-                    max_length = max(max_length, len(str(col)))
-                    for cell in worksheet.iter_cols(min_col=i+1, max_col=i+1, min_row=1):
-                        for c in cell:
-                            try:
-                                if c.value is not None:
-                                    cell_value_str = str(c.value)
-                                    if isinstance(c.value, (float, int)):
-                                        cell_value_str = f"{c.value:.2f}"
-                                    max_length = max(
-                                        max_length, len(cell_value_str))
-                            except TypeError:
-                                pass
-                    adjusted_width = (max_length + 2)
-                    worksheet.column_dimensions[get_column_letter(
-                        i + 1)].width = adjusted_width
+                df_nominas = _to_dataframe(nomina_data_list, selected=selected)
+
+                _write_sheet(writer, df_nominas, 'Nomina', max_rows_per_sheet)
 
                 print(
                     f"Exportados {len(nomina_data_list)} complementos de Nómina CFDI 1.2 a la hoja 'Nomina'.")
@@ -115,43 +166,149 @@ def export_to_excel(invoice_data_list, nomina_data_list, pagos_data_list, output
 
             # --- Hoja de Pagos ---
             if pagos_data_list:
-                df_pagos = pd.DataFrame(pagos_data_list)
-
                 # Reindexar el DataFrame para que coincida exactamente con el orden de columnas deseado.
                 # Excluimos 'CFDI_Type' ya que es una columna interna para categorización.
-                final_pagos_columns = [
-                    col for col in PAGOS_COLUMN_ORDER if col != "CFDI_Type"]
-                df_pagos = df_pagos.reindex(columns=final_pagos_columns)
-
-                df_pagos.to_excel(writer, sheet_name='Pagos', index=False)
-
-                # Auto-ajustar el ancho de las columnas
-                worksheet = writer.sheets['Pagos']
-                for i, col in enumerate(df_pagos.columns):
-                    max_length = 0
-                    max_length = max(max_length, len(str(col)))
-                    for cell in worksheet.iter_cols(min_col=i+1, max_col=i+1, min_row=1):
-                        for c in cell:
-                            try:
-                                if c.value is not None:
-                                    cell_value_str = str(c.value)
-                                    if isinstance(c.value, (float, int)):
-                                        cell_value_str = f"{c.value:.2f}"
-                                    max_length = max(
-                                        max_length, len(cell_value_str))
-                            except TypeError:
-                                pass
-                    adjusted_width = (max_length + 2)
-                    worksheet.column_dimensions[get_column_letter(
-                        i + 1)].width = adjusted_width
+                final_pagos_columns = _sheet_columns(PAGOS_COLUMN_ORDER, selected)
+                df_pagos = _to_dataframe(pagos_data_list, final_pagos_columns)
+
+                _write_sheet(writer, df_pagos, 'Pagos', max_rows_per_sheet)
 
                 print(
                     f"Exportados {len(pagos_data_list)} complementos de Pagos CFDI 2.0 a la hoja 'Pagos'.")
             else:
                 print("No hay datos de Pagos para exportar.")
 
+            # --- Hoja de Duplicados (opcional) ---
+            if duplicates:
+                _write_sheet(writer, pd.DataFrame(duplicates, columns=DUPLICATES_COLUMN_ORDER),
+                             'Duplicados', max_rows_per_sheet)
+                print(f"Exportados {len(duplicates)} CFDI(s) duplicados a la hoja 'Duplicados'.")
+
         print(f"\nDatos exportados exitosamente a Excel: {output_file_path}")
 
     except Exception as e:
         print(f"Error al exportar a Excel: {e}")
         print("Por favor, asegúrate de que 'openpyxl' esté instalado (pip install openpyxl) y la ruta de salida sea válida.")
+
+
+# --- Exportacion en streaming (memoria constante) ---------------------------
+def _header_cells(worksheet, columns):
+    """Encabezados con el estilo de pandas 2.x (negrita, borde, centrado)."""
+    side = Side(style="thin")
+    cells = []
+    for col in columns:
+        cell = WriteOnlyCell(worksheet, value=col)
+        cell.font = Font(bold=True)
+        cell.border = Border(left=side, right=side, top=side, bottom=side)
+        cell.alignment = Alignment(horizontal="center", vertical="top")
+        cells.append(cell)
+    return cells
+
+
+def _new_stream_sheet(workbook, sheet_name, widths, column_order):
+    """Crea una hoja write_only con los anchos y el encabezado ya puestos."""
+    worksheet = workbook.create_sheet(sheet_name)
+    _autosize_columns(worksheet, widths)
+    worksheet.append(_header_cells(worksheet, column_order))
+    return worksheet
+
+
+def _stream_sheet(workbook, sheet_name, rows, column_order=None,
+                  max_rows=EXCEL_MAX_DATA_ROWS, selected=None):
+    """
+    Escribe una hoja en un workbook write_only a partir de un iterable de dicts,
+    un RecordTable o un RecordSpool.
+
+    Solo se guardan en memoria las primeras STREAM_WIDTH_SAMPLE_ROWS filas (para
+    calcular el ancho de columna); el resto pasa directo al archivo.
+    column_order: lista de columnas (sin CFDI_Type). Si es None (Nomina), se usan
+    las llaves de las filas de la muestra en orden de aparicion (las de todas
+    las filas en un RecordTable o RecordSpool), filtradas por la seleccion
+    `selected`, si la hay.
+    Cada max_rows filas se abre la siguiente hoja (Pagos_2, Pagos_3...) con las
+    mismas columnas y anchos.
+
+    Devuelve {nombre_hoja: filas_escritas} ({} = hoja no creada).
+    """
+    if isinstance(rows, RecordTable):
+        # Columnar: las filas salen como listas, sin armar un dict por fila.
+        if column_order is None:
+            column_order = _sheet_columns(rows.columns, selected)
+        value_rows = rows.iter_rows(column_order)
+    else:
+        if column_order is None and isinstance(rows, RecordSpool):
+            # En disco: las columnas de todos sus esquemas, no solo de la muestra.
+            column_order = _sheet_columns(rows.columns, selected)
+        rows = iter(rows)
+        head = list(islice(rows, STREAM_WIDTH_SAMPLE_ROWS))
+        if column_order is None:
+            column_order = _sheet_columns(dict.fromkeys(chain.from_iterable(head)), selected)
+        value_rows = ([row.get(col) for col in column_order] for row in chain(head, rows))
+
+    sample = list(islice(value_rows, STREAM_WIDTH_SAMPLE_ROWS))
+    if not sample:
+        return {}
+    widths = _compute_column_widths(
+        pd.DataFrame(sample, columns=column_order))
+
+    written = {}
+    part = 0
+    count = max_rows
+    for values in chain(sample, value_rows):
+        if count == max_rows:
+            part += 1
+            part_name = _sheet_part_name(sheet_name, part)
+            worksheet = _new_stream_sheet(workbook, part_name, widths, column_order)
+            count = written[part_name] = 0
+        worksheet.append(values)
+        count += 1
+        written[part_name] = count
+    return written
+
+
+def export_to_excel_streaming(invoice_rows, nomina_rows, pagos_rows, output_file_path,
+                              max_rows_per_sheet=EXCEL_MAX_DATA_ROWS, columns=None,
+                              duplicates=None):
+    """
+    Igual que export_to_excel pero SIN DataFrames: cada fila (dict) va directo a un
+    workbook de openpyxl en modo write_only, que no guarda las celdas en memoria.
+    Acepta listas, generadores, RecordTable o RecordSpool. El escritor no
+    guarda filas: con generadores o RecordSpool (process_path(spool_dir=...))
+    la memoria pico no crece con el numero de filas.
+
+    Columnas: INVOICE_COLUMN_ORDER / PAGOS_COLUMN_ORDER (sin CFDI_Type); Nomina
+    usa las llaves de sus registros. El ancho de columna se calcula con las
+    primeras STREAM_WIDTH_SAMPLE_ROWS filas de cada hoja. Pasadas
+    max_rows_per_sheet filas la hoja continua en Hoja_2, Hoja_3... Con
+    `columns` solo se exportan esas columnas. `duplicates` agrega la hoja
+    'Duplicados' (DUPLICATES_COLUMN_ORDER) como en export_to_excel.
+
+    Devuelve {nombre_hoja: filas_escritas} (una entrada por hoja del archivo).
+    """
+    output_dir = os.path.dirname(output_file_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    selected = frozenset(columns) if columns is not None else None
+    workbook = Workbook(write_only=True)
+    sheets = (
+        ("Invoices", invoice_rows, _sheet_columns(INVOICE_COLUMN_ORDER, selected)),
+        ("Nomina", nomina_rows, None),
+        ("Pagos", pagos_rows, _sheet_columns(PAGOS_COLUMN_ORDER, selected)),
+        ("Duplicados", duplicates, DUPLICATES_COLUMN_ORDER),
+    )
+    written = {}
+    for sheet_name, rows, column_order in sheets:
+        parts = _stream_sheet(workbook, sheet_name, rows or (), column_order,
+                              max_rows_per_sheet, selected)
+        for part_name, count in parts.items():
+            print(f"Exportadas {count} fila(s) a la hoja '{part_name}' (streaming).")
+        written.update(parts)
+
+    if not written:
+        print("No hay datos para exportar. No se creará el archivo de Excel.")
+        return written
+
+    workbook.save(output_file_path)
+    print(f"\nDatos exportados exitosamente a Excel: {output_file_path}")
+    return written
@@ -0,0 +1,90 @@
+# --- cfdi_processor/extraction_plan.py ---
+# Compiles the (xpath, attr, default, column) tables of constants.py into a plan.
+#
+# The tables list one row per column, so the same element (cfdi:Emisor,
+# nomina12:Receptor, ...) appears several times. A plan groups the rows by xpath
+# so each distinct element is searched once per document and then all its
+# attributes are read from it. Like tax_buckets.py this is NOT a parser: the
+# version modules keep their own logic and only use the plan to read values.
+
+from collections import namedtuple
+
+from constants import CFDI_COMMON_CHILD_ELEMENTS_TO_EXTRACT, NOMINA_FIELDS_TO_EXTRACT
+
+# xpaths: distinct xpaths, in first-appearance order.
+# fields: (xpath_index, attr_name, default_val, col_name) in the table's order.
+ExtractionPlan = namedtuple("ExtractionPlan", ["xpaths", "fields"])
+
+
+def compile_extraction_plan(fields_to_extract):
+    """
+    Builds an ExtractionPlan from a list of (xpath, attr, default, column) tuples.
+
+    The original row order is kept in `fields`, so values come out in the same
+    order (and with the same dict insertion order) as the row-by-row loop.
+    """
+    xpath_index = {}
+    fields = []
+    for xpath, attr_name, default_val, col_name in fields_to_extract:
+        index = xpath_index.setdefault(xpath, len(xpath_index))
+        fields.append((index, attr_name, default_val, col_name))
+    return ExtractionPlan(tuple(xpath_index), tuple(fields))
+
+
+def run_extraction_plan(plan, root, namespaces):
+    """
+    Resolves each distinct xpath once and yields (col_name, value) per field.
+
+    Same rules as the original loop: missing element -> default; attr_name
+    empty -> element text (or default); values are stripped.
+    """
+    elements = [root.find(xpath, namespaces) for xpath in plan.xpaths]
+    for index, attr_name, default_val, col_name in plan.fields:
+        element = elements[index]
+        if element is not None:
+            value = element.get(attr_name, default_val).strip() if attr_name else \
+                element.text.strip() if element.text is not None else default_val
+        else:
+            value = default_val
+        yield col_name, value
+
+
+# (id(plan), columns) -> projected plan. Plans are module-level constants, so
+# their id() is stable; frozensets cache their hash, so a lookup is cheap.
+# Safe under a thread pool (also without the GIL): two threads missing the same
+# key just compute equal plans and the last assignment wins.
+_PROJECTED_PLANS = {}
+
+
+def project_extraction_plan(plan, columns):
+    """
+    Returns a plan with only the fields whose column is in `columns` (a
+    frozenset; None returns the plan unchanged). Xpaths left without fields are
+    dropped, so elements nobody asked for are never searched. Each (plan,
+    columns) pair is projected once and then reused.
+    """
+    if columns is None:
+        return plan
+    key = (id(plan), columns)
+    projected = _PROJECTED_PLANS.get(key)
+    if projected is None:
+        xpath_index = {}
+        fields = []
+        for index, attr_name, default_val, col_name in plan.fields:
+            if col_name in columns:
+                new_index = xpath_index.setdefault(index, len(xpath_index))
+                fields.append((new_index, attr_name, default_val, col_name))
+        projected = _PROJECTED_PLANS[key] = ExtractionPlan(
+            tuple(plan.xpaths[i] for i in xpath_index), tuple(fields))
+    return projected
+
+
+def wants(columns, *col_names):
+    """True if any of `col_names` is selected (columns None = every column)."""
+    return columns is None or not columns.isdisjoint(col_names)
+
+
+# Built once at import time.
+CFDI_COMMON_CHILD_ELEMENTS_PLAN = compile_extraction_plan(
+    CFDI_COMMON_CHILD_ELEMENTS_TO_EXTRACT)
+NOMINA_FIELDS_PLAN = compile_extraction_plan(NOMINA_FIELDS_TO_EXTRACT)
@@ -8,14 +8,16 @@
 import os
 import sys
 
-from PySide6.QtCore import Qt, QObject, QThread, Signal, Slot
+from PySide6.QtCore import Qt, QObject, QThread, QDate, Signal, Slot
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QProgressBar, QPlainTextEdit, QFileDialog,
-    QMessageBox, QFrame,
+    QMessageBox, QFrame, QCheckBox, QLineEdit, QComboBox, QDateEdit, QGroupBox,
 )
 
 import core
+from boveda import Boveda
+from parse_cache import ParseCache
 
 APP_TITLE = "Procesador CFDI"
 
@@ -28,23 +30,58 @@ class ProcessWorker(QObject):
     finished = Signal(object)          # core.ProcessResult
     failed = Signal(str)
 
-    def __init__(self, input_folder):
+    def __init__(self, input_folder, save_to_boveda=False, profile="full"):
         super().__init__()
         self.input_folder = input_folder
+        self.save_to_boveda = save_to_boveda
+        self.profile = profile
 
     @Slot()
     def run(self):
         try:
-            result = core.process_path(
-                self.input_folder,
-                on_log=self.log.emit,
-                on_progress=lambda c, t, n: self.progress.emit(c, t, n),
-            )
+            # El cache se abre en este hilo (sqlite3 no comparte conexiones
+            # entre hilos).
+            with ParseCache(core.PARSE_CACHE_FILE,
+                            variant=core.extraction_variant(self.profile)) as cache:
+                result = core.process_path(
+                    self.input_folder,
+                    on_log=self.log.emit,
+                    on_progress=lambda c, t, n: self.progress.emit(c, t, n),
+                    cache=cache,
+                    profile=self.profile,
+                )
+            if self.save_to_boveda and result.has_data:
+                with Boveda(core.BOVEDA_DB_FILE) as boveda:
+                    stats = boveda.ingest(result.iter_all())
+                self.log.emit(f"Boveda: {stats.total} fila(s) guardadas")
             self.finished.emit(result)
         except Exception as exc:  # red de seguridad: nunca matar el hilo en silencio
             self.failed.emit(str(exc))
 
 
+class BovedaQueryWorker(QObject):
+    """Consulta la boveda SQLite en un hilo aparte (mismas senales que ProcessWorker)."""
+
+    log = Signal(str)
+    progress = Signal(int, int, str)
+    finished = Signal(object)          # core.ProcessResult
+    failed = Signal(str)
+
+    def __init__(self, filters):
+        super().__init__()
+        self.filters = filters
+
+    @Slot()
+    def run(self):
+        try:
+            self.log.emit(f"Consultando boveda: {core.BOVEDA_DB_FILE}")
+            result = core.load_from_boveda(core.BOVEDA_DB_FILE, **self.filters)
+            self.progress.emit(1, 1, "Consulta a la boveda")
+            self.finished.emit(result)
+        except Exception as exc:
+            self.failed.emit(str(exc))
+
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -89,11 +126,65 @@ class MainWindow(QMainWindow):
         layout.addLayout(folder_row)
 
         # Boton procesar
+        # Opcional, como --boveda en cli.py: no escribir la boveda sin pedirlo.
+        self.save_boveda_check = QCheckBox("Guardar tambien en la boveda")
+        self.save_boveda_check.setChecked(False)
+        layout.addWidget(self.save_boveda_check)
+        self.lean_check = QCheckBox(
+            "Modo ligero (sin Sello, SelloSAT ni Certificado)")
+        self.lean_check.setToolTip(
+            "Usa menos memoria y genera un Excel mas chico con carpetas grandes.")
+        layout.addWidget(self.lean_check)
         self.process_btn = QPushButton("Procesar y exportar a Excel")
         self.process_btn.setEnabled(False)
         self.process_btn.clicked.connect(self.on_process)
         layout.addWidget(self.process_btn)
 
+        # Reporte desde la boveda (consulta, sin re-parsear XML)
+        boveda_box = QGroupBox("Reporte desde la boveda")
+        boveda_layout = QVBoxLayout(boveda_box)
+        filter_row = QHBoxLayout()
+        self.rfc_edit = QLineEdit()
+        self.rfc_edit.setPlaceholderText("RFC (opcional)")
+        self.direction_combo = QComboBox()
+        self.direction_combo.addItems(["Todas", "Emitidas", "Recibidas"])
+        filter_row.addWidget(self.rfc_edit, stretch=1)
+        filter_row.addWidget(self.direction_combo)
+        boveda_layout.addLayout(filter_row)
+
+        date_row = QHBoxLayout()
+        self.date_check = QCheckBox("Fecha de timbrado del")
+        today = QDate.currentDate()
+        self.date_from_edit = QDateEdit(QDate(today.year(), today.month(), 1))
+        self.date_to_edit = QDateEdit(today)
+        for edit in (self.date_from_edit, self.date_to_edit):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("yyyy-MM-dd")
+            edit.setEnabled(False)
+            self.date_check.toggled.connect(edit.setEnabled)
+        date_row.addWidget(self.date_check)
+        date_row.addWidget(self.date_from_edit)
+        date_row.addWidget(QLabel("al"))
+        date_row.addWidget(self.date_to_edit)
+        date_row.addStretch(1)
+        boveda_layout.addLayout(date_row)
+
+        type_row = QHBoxLayout()
+        self.type_checks = {
+            "Invoice": QCheckBox("Facturas"),
+            "Nomina": QCheckBox("Nomina"),
+            "Pago": QCheckBox("Pagos"),
+        }
+        for check in self.type_checks.values():
+            check.setChecked(True)
+            type_row.addWidget(check)
+        type_row.addStretch(1)
+        self.query_btn = QPushButton("Generar desde boveda")
+        self.query_btn.clicked.connect(self.on_query_boveda)
+        type_row.addWidget(self.query_btn)
+        boveda_layout.addLayout(type_row)
+        layout.addWidget(boveda_box)
+
         # Barra de progreso
         self.progress_bar = QProgressBar()
         self.progress_bar.setValue(0)
@@ -129,6 +220,7 @@ class MainWindow(QMainWindow):
     def _set_busy(self, busy):
         self.select_btn.setEnabled(not busy)
         self.process_btn.setEnabled(not busy and bool(self.input_folder))
+        self.query_btn.setEnabled(not busy)
 
     # --- Acciones ---------------------------------------------------------
     @Slot()
@@ -147,7 +239,41 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, APP_TITLE,
                                 "Selecciona primero una carpeta valida.")
             return
+        if self.save_boveda_check.isChecked() and self.lean_check.isChecked():
+            # Un registro "ligero" reemplazaria la fila completa de su UUID en
+            # la boveda (se perderian Sello, SelloSAT y Certificado).
+            QMessageBox.warning(self, APP_TITLE,
+                                "El modo ligero no se puede usar al guardar en la boveda.")
+            return
 
+        self._start_worker(ProcessWorker(
+            self.input_folder, save_to_boveda=self.save_boveda_check.isChecked(),
+            profile="lean" if self.lean_check.isChecked() else "full"))
+
+    @Slot()
+    def on_query_boveda(self):
+        cfdi_types = [t for t, check in self.type_checks.items() if check.isChecked()]
+        if not cfdi_types:
+            QMessageBox.warning(self, APP_TITLE, "Selecciona al menos un tipo de CFDI.")
+            return
+        rfc = self.rfc_edit.text().strip().upper() or None
+        direction = self.direction_combo.currentText()
+        if direction != "Todas" and not rfc:
+            QMessageBox.warning(self, APP_TITLE,
+                                "Indica el RFC para filtrar Emitidas / Recibidas.")
+            return
+        filters = {
+            "cfdi_types": cfdi_types,
+            "rfc": rfc,
+            "direction": None if direction == "Todas" else direction,
+        }
+        if self.date_check.isChecked():
+            filters["date_from"] = self.date_from_edit.date().toString("yyyy-MM-dd")
+            filters["date_to"] = self.date_to_edit.date().toString("yyyy-MM-dd")
+        self._start_worker(BovedaQueryWorker(filters))
+
+    def _start_worker(self, worker):
+        """Arranca un worker (procesar carpeta o consultar boveda) en su hilo."""
         self.log_view.clear()
         self.progress_bar.setValue(0)
         self._result = None
@@ -156,7 +282,7 @@ class MainWindow(QMainWindow):
 
         # Arrancar worker en un hilo
         self.thread = QThread()
-        self.worker = ProcessWorker(self.input_folder)
+        self.worker = worker
         self.worker.moveToThread(self.thread)
 
         self.thread.started.connect(self.worker.run)
@@ -227,7 +353,8 @@ class MainWindow(QMainWindow):
         """Resumen + dialogo de guardado + exportacion. Corre sin hilo activo."""
         summary = (
             f"Procesados: {result.processed_count}  |  "
-            f"Errores: {result.error_count}\n"
+            f"Errores: {result.error_count}  |  "
+            f"Duplicados: {result.duplicate_count}\n"
             f"Facturas: {len(result.invoice_data)}  |  "
             f"Nomina: {len(result.nomina_data)}  |  "
             f"Pagos: {len(result.pagos_data)}"
@@ -246,7 +373,7 @@ class MainWindow(QMainWindow):
             return
 
         try:
-            core.export_report(result, output_path)
+            core.export_report(result, output_path, duplicates_sheet=True)
         except Exception as exc:
             QMessageBox.critical(self, APP_TITLE,
                                  f"Error al exportar el Excel:\n{exc}")
@@ -7,14 +7,92 @@ from datetime import datetime
 from constants import (
     NAMESPACES_CFDI_40, FORMA_PAGO_MAP, TIPO_COMPROBANTE_MAP, USO_CFDI_MAP,
     REGIMEN_FISCAL_RECEPTOR_MAP, PAGOS_COLUMN_ORDER, PAGO_FIELDS_TO_EXTRACT,
-    PAGO_DR_FIELDS_TO_EXTRACT, CFDI_COMMON_CHILD_ELEMENTS_TO_EXTRACT, PAGO_DR_TAX_FIELDS
+    PAGO_DR_FIELDS_TO_EXTRACT, CFDI_COMMON_CHILD_ELEMENTS_TO_EXTRACT, PAGO_DR_TAX_FIELDS,
+    PAGO_DR_UNCLASSIFIED_TAX_COLUMN
 )
+from tax_buckets import (
+    lookup_tax_buckets, PAGO_DR_TRASLADO_BUCKETS, PAGO_DR_RETENCION_BUCKETS
+)
+from extraction_plan import wants
 
 # Define the full URIs for relevant namespaces for direct attribute access
 CFDI_URI = NAMESPACES_CFDI_40['cfdi']
 TFD_URI = NAMESPACES_CFDI_40['tfd']
 PAGO20_URI = NAMESPACES_CFDI_40['pago20']
 
+# Columns filled by the per-DoctoRelacionado tax walk (skipped when a column
+# selection asks for none of them).
+_DR_TAX_COLUMNS = tuple(PAGO_DR_TAX_FIELDS) + (PAGO_DR_UNCLASSIFIED_TAX_COLUMN,)
+
+# Set view of PAGOS_COLUMN_ORDER: membership tests on the ~110-item list were
+# a linear scan per key, per Pago and per DoctoRelacionado.
+_PAGOS_COLUMNS = frozenset(PAGOS_COLUMN_ORDER)
+
+
+def _is_numeric_default(default_val):
+    """True for defaults like "0.00" / "1.0": those columns hold floats."""
+    return isinstance(default_val, str) and default_val.replace('.', '', 1).isdigit()
+
+
+# Per-Pago and per-DoctoRelacionado field specs, compiled once:
+# (attr_name, default_val, col_name, is_numeric, in_column_order).
+# Only the Pago fields in PAGOS_COLUMN_ORDER ever reach a row, so the rest are
+# dropped here; DR fields outside the order still get a None value per row.
+_PAGO_FIELD_SPECS = tuple(
+    (attr_name, default_val, col_name, _is_numeric_default(default_val), True)
+    for _, attr_name, default_val, col_name in PAGO_FIELDS_TO_EXTRACT
+    if col_name in _PAGOS_COLUMNS)
+_DR_FIELD_SPECS = tuple(
+    (attr_name, default_val, col_name, _is_numeric_default(default_val),
+     col_name in _PAGOS_COLUMNS)
+    for _, attr_name, default_val, col_name in PAGO_DR_FIELDS_TO_EXTRACT)
+
+
+class PagoRows:
+    """
+    The Pagos rows of one CFDI as a read-only sequence of dicts: one shared
+    header plus, per DoctoRelacionado, a (Pago delta, DR delta) pair. The
+    Pago delta is shared by all DRs of that Pago.
+
+    A row is only built (header, then Pago delta, then DR delta) when it is
+    read, so a complemento with thousands of DRs holds one header instead of
+    one full-row copy per DR. Every read returns a new, independent dict.
+    """
+
+    __slots__ = ("header", "deltas")
+
+    def __init__(self, header, deltas):
+        self.header = header
+        self.deltas = deltas
+
+    def __len__(self):
+        return len(self.deltas)
+
+    def __iter__(self):
+        for pago_delta, dr_delta in self.deltas:
+            yield self._row(pago_delta, dr_delta)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._row(*delta) for delta in self.deltas[index]]
+        return self._row(*self.deltas[index])
+
+    def __eq__(self, other):
+        if isinstance(other, (PagoRows, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"<PagoRows rows={len(self)}>"
+
+    def _row(self, pago_delta, dr_delta):
+        row = dict(self.header)
+        row.update(pago_delta)
+        row.update(dr_delta)
+        return row
+
 
 def _initialize_pagos_data_row():
     """
@@ -28,18 +106,50 @@ def _initialize_pagos_data_row():
     # Initialize numeric fields to 0.0 for aggregation
     # These are specific to Pagos and DoctoRelacionado taxes
     for _, _, default_val, col_name in PAGO_FIELDS_TO_EXTRACT:
-        if isinstance(default_val, str) and default_val.replace('.', '', 1).isdigit():
+        if _is_numeric_default(default_val):
             data[col_name] = 0.0
     for _, _, default_val, col_name in PAGO_DR_FIELDS_TO_EXTRACT:
-        if isinstance(default_val, str) and default_val.replace('.', '', 1).isdigit():
+        if _is_numeric_default(default_val):
             data[col_name] = 0.0
     for col_name, (_, _, default_val) in PAGO_DR_TAX_FIELDS.items():
-        if isinstance(default_val, str) and default_val.replace('.', '', 1).isdigit():
+        if _is_numeric_default(default_val):
             data[col_name] = 0.0
+    data[PAGO_DR_UNCLASSIFIED_TAX_COLUMN] = 0.0
 
     return data
 
 
+def _add_pagos_tax_dr(tax_dr_node, table, data):
+    """
+    Aggregates one TrasladoDR/RetencionDR into data using a bucket table derived
+    from PAGO_DR_TAX_FIELDS (see tax_buckets.py). Each bucket lists the
+    (column, "Base"|"Importe") pairs that receive BaseDR / ImporteDR.
+    Lines with no bucket add their ImporteDR to PAGO_DR_UNCLASSIFIED_TAX_COLUMN.
+    """
+    base_str = tax_dr_node.get("BaseDR", "0.00").strip()
+    importe_str = tax_dr_node.get("ImporteDR", "0.00").strip()
+
+    try:
+        base_val = float(base_str)
+    except (ValueError, TypeError):
+        base_val = 0.0
+    try:
+        importe_val = float(importe_str)
+    except (ValueError, TypeError):
+        importe_val = 0.0
+
+    buckets = lookup_tax_buckets(
+        table,
+        tax_dr_node.get("ImpuestoDR", "").strip(),
+        tax_dr_node.get("TipoFactorDR", "").strip(),
+        tax_dr_node.get("TasaOCuotaDR", "").strip())
+    if buckets is None:
+        data[PAGO_DR_UNCLASSIFIED_TAX_COLUMN] += importe_val
+        return
+    for col_name, amount in buckets:
+        data[col_name] += base_val if amount == "Base" else importe_val
+
+
 def _extract_pagos_tax_details_dr(docto_relacionado_node, data, namespaces):
     """
     Extracts and aggregates tax details (TrasladosDR, RetencionesDR) from a DoctoRelacionado node.
@@ -47,131 +157,85 @@ def _extract_pagos_tax_details_dr(docto_relacionado_node, data, namespaces):
     # Initialize all tax fields for this DR to 0.0 before summing
     for col_name in PAGO_DR_TAX_FIELDS.keys():
         data[col_name] = 0.0
+    data[PAGO_DR_UNCLASSIFIED_TAX_COLUMN] = 0.0
 
-    # Process TrasladosDR
     for traslado_dr in docto_relacionado_node.findall("./pago20:ImpuestosDR/pago20:TrasladosDR/pago20:TrasladoDR", namespaces):
-        impuesto_code = traslado_dr.get("ImpuestoDR", "").strip()
-        tipo_factor = traslado_dr.get("TipoFactorDR", "").strip()
-        tasa_ocuota = traslado_dr.get("TasaOCuotaDR", "").strip()
-        base_str = traslado_dr.get("BaseDR", "0.00").strip()
-        importe_str = traslado_dr.get("ImporteDR", "0.00").strip()
-
-        try:
-            base_val = float(base_str)
-        except (ValueError, TypeError):
-            base_val = 0.0
-        try:
-            importe_val = float(importe_str)
-        except (ValueError, TypeError):
-            importe_val = 0.0
-
-        if impuesto_code == "002":  # IVA
-            if tipo_factor == "Tasa":
-                if tasa_ocuota == "0.160000":
-                    data["IVA 16 Base"] += base_val
-                    data["IVA 16 Importe"] += importe_val
-                elif tasa_ocuota == "0.080000":
-                    data["IVA 8 Base"] += base_val
-                    data["IVA 8 Importe"] += importe_val
-                elif tasa_ocuota == "0.000000":  # IVA 0%
-                    data["IVA Cero Base"] += base_val
-                    data["IVA Cero"] += importe_val
-            elif tipo_factor == "Exento":
-                data["IVA Excento Base"] += base_val
-                data["IVA Excento"] += importe_val
-        elif impuesto_code == "003":  # IEPS
-            if tipo_factor == "Tasa":
-                if tasa_ocuota == "0.030000":
-                    data["IEPS 3 Base"] += base_val
-                    data["IEPS 3 Importe"] += importe_val
-                elif tasa_ocuota == "0.060000":
-                    data["IEPS 6 Base"] += base_val
-                    data["IEPS 6 Importe"] += importe_val
-                elif tasa_ocuota == "0.070000":
-                    data["IEPS 7 Base"] += base_val
-                    data["IEPS 7 Importe"] += importe_val
-                elif tasa_ocuota == "0.080000":
-                    data["IEPS 8 Base"] += base_val
-                    data["IEPS 8 Importe"] += importe_val
-                elif tasa_ocuota == "0.090000":
-                    data["IEPS 9 Base"] += base_val
-                    data["IEPS 9 Importe"] += importe_val
-                elif tasa_ocuota == "0.265000":
-                    data["IEPS 26.5 Base"] += base_val
-                    data["IEPS 26.5 Importe"] += importe_val
-                elif tasa_ocuota == "0.300000":
-                    data["IEPS 30 Base"] += base_val
-                    data["IEPS 30 Importe"] += importe_val
-                elif tasa_ocuota == "0.304000":
-                    data["IEPS 30.4 Base"] += base_val
-                    data["IEPS 30.4 Importe"] += importe_val
-                elif tasa_ocuota == "0.530000":
-                    data["IEPS 53 Base"] += base_val
-                    data["IEPS 53 Importe"] += importe_val
-                elif tasa_ocuota == "1.600000":
-                    data["IEPS 160 Base"] += base_val
-                    data["IEPS 160 Importe"] += importe_val
-                # Add other IEPS rates as needed based on PAGO_DR_TAX_FIELDS
-            elif tipo_factor == "Exento":
-                data["IEPS Cero Base"] += base_val
-                data["IEPS Cero"] += importe_val
-
-    # Process RetencionesDR
+        _add_pagos_tax_dr(traslado_dr, PAGO_DR_TRASLADO_BUCKETS, data)
+
     for retencion_dr in docto_relacionado_node.findall("./pago20:ImpuestosDR/pago20:RetencionesDR/pago20:RetencionDR", namespaces):
-        impuesto_code = retencion_dr.get("ImpuestoDR", "").strip()
-        tasa_ocuota = retencion_dr.get("TasaOCuotaDR", "").strip()
-        base_str = retencion_dr.get("BaseDR", "0.00").strip()
-        importe_str = retencion_dr.get("ImporteDR", "0.00").strip()
-
-        try:
-            base_val = float(base_str)
-        except (ValueError, TypeError):
-            base_val = 0.0
-        try:
-            importe_val = float(importe_str)
-        except (ValueError, TypeError):
-            importe_val = 0.0
-
-        if impuesto_code == "001":  # ISR
-            if tasa_ocuota == "0.012500":
-                data["Ret ISR 1.25 Base"] += base_val
-                data["Ret ISR 1.25 Importe"] += importe_val
-            elif tasa_ocuota == "0.100000":
-                data["Ret ISR 10 Base"] += base_val
-                data["Ret ISR 10 Importe"] += importe_val
-        elif impuesto_code == "002":  # IVA
-            if tasa_ocuota == "0.040000":
-                data["Ret IVA 4 Base"] += base_val
-                data["Ret IVA 4 Importe"] += importe_val
-            elif tasa_ocuota == "0.106667":
-                data["Ret IVA 10.667 Base"] += base_val
-                data["Ret IVA 10.667 Importe"] += importe_val
-            elif tasa_ocuota == "0.020000":
-                data["Ret IVA 2 Base"] += base_val
-                data["Ret IVA 2 Importe"] += importe_val
-            elif tasa_ocuota == "0.053333":
-                data["Ret IVA 5.33 Base"] += base_val
-                data["Ret IVA 5.33 Importe"] += importe_val
-            elif tasa_ocuota == "0.080000":
-                data["Ret IVA 8 Base"] += base_val
-                data["Ret IVA 8 Importe"] += importe_val
-            elif tasa_ocuota == "0.060000":
-                data["Ret IVA 6 Base"] += base_val
-                data["Ret IVA 6 Importe"] += importe_val
-            elif tasa_ocuota == "0.160000":
-                data["Ret IVA 16 Base"] += base_val
-                data["Ret IVA 16 Importe"] += importe_val
-
-
-def parse_cfdi_pago_20(xml_file_path):
+        _add_pagos_tax_dr(retencion_dr, PAGO_DR_RETENCION_BUCKETS, data)
+
+
+def _pago_values(pago_node, specs):
+    """
+    Values of one pago20:Pago for its row delta (FormaDePagoP mapped to its
+    catalog text, FechaPago as DD/MM/YYYY HH:MM:SS, numeric fields as float).
+    Missing attributes give None.
+    """
+    attrib = pago_node.attrib
+    values = {}
+    for attr_name, default_val, col_name, is_numeric, _ in specs:
+        if attr_name not in attrib:
+            values[col_name] = None
+            continue
+        value_str = attrib[attr_name].strip()
+        if col_name == "FormaDePagoP":
+            values[col_name] = f"{value_str} - {FORMA_PAGO_MAP.get(value_str, 'Desconocido')}" \
+                if value_str else None
+        elif col_name == "FechaPago":
+            try:
+                values[col_name] = datetime.strptime(
+                    value_str, "%Y-%m-%dT%H:%M:%S").strftime("%d/%m/%Y %H:%M:%S")
+            except ValueError:
+                # Keep original if parsing fails
+                values[col_name] = value_str
+        elif is_numeric:
+            try:
+                values[col_name] = float(value_str)
+            except (ValueError, TypeError):
+                values[col_name] = 0.0
+        else:
+            values[col_name] = value_str
+    return values
+
+
+def _docto_values(docto_relacionado_node, specs):
+    """Values of one pago20:DoctoRelacionado (numeric fields as float; missing -> None)."""
+    attrib = docto_relacionado_node.attrib
+    values = {}
+    for attr_name, _, col_name, is_numeric, in_order in specs:
+        if not in_order or attr_name not in attrib:
+            values[col_name] = None
+        elif is_numeric:
+            try:
+                values[col_name] = float(attrib[attr_name].strip())
+            except (ValueError, TypeError):
+                values[col_name] = 0.0
+        else:
+            values[col_name] = attrib[attr_name].strip()
+    return values
+
+
+def parse_cfdi_pago_20(xml_file_path, root=None, skip_fields=frozenset(), columns=None):
     """
     Parses a CFDI 4.0 XML file with a Pagos 2.0 complement.
-    Extracts data for each DoctoRelacionado and returns a list of dictionaries,
-    where each dictionary represents a row for the Pagos Excel sheet.
+    Extracts data for each DoctoRelacionado and returns a PagoRows sequence of
+    dictionaries (a plain list for the placeholder row and on errors), where
+    each dictionary represents a row for the Pagos Excel sheet.
+
+    If `root` (the already-parsed cfdi:Comprobante element) is given, the file is
+    not parsed again; xml_file_path is then only used for "Archivo XML" and logs.
+
+    `skip_fields` is accepted so the dispatcher can call every parser the same
+    way; Pagos rows carry none of the HEAVY_FIELDS, so it has no effect here.
+
+    `columns` (frozenset, optional) is a column selection: rows only keep those
+    keys, and the DR tax walk, catalog mapping and Fecha Emision formatting are
+    skipped when none of their columns was requested.
     """
     try:
-        tree = ET.parse(xml_file_path)
-        root = tree.getroot()
+        if root is None:
+            root = ET.parse(xml_file_path).getroot()
 
         # Ensure it's a CFDI 4.0 Pago comprobante
         if root.get('Version') != '4.0' or root.get('TipoDeComprobante') != 'P':
@@ -185,7 +249,7 @@ def parse_cfdi_pago_20(xml_file_path):
                 f"Skipping {os.path.basename(xml_file_path)}: No Pagos 2.0 complement found.")
             return []
 
-        all_pagos_data_rows = []
+        dr_deltas = []
 
         # Extract common CFDI Comprobante and Timbre Fiscal Digital data
         base_cfdi_data = _initialize_pagos_data_row()
@@ -212,7 +276,8 @@ def parse_cfdi_pago_20(xml_file_path):
                 "Rfc", "").strip()
             base_cfdi_data["Nombre Emisor CFDI"] = emisor_node.get(
                 "Nombre", "").strip()
-            regimen_emisor_code = emisor_node.get("RegimenFiscal", "").strip()
+            regimen_emisor_code = emisor_node.get("RegimenFiscal", "").strip() \
+                if wants(columns, "Regimen Fiscal Emisor CFDI") else ""
             base_cfdi_data[
                 "Regimen Fiscal Emisor CFDI"] = f"{regimen_emisor_code} - {REGIMEN_FISCAL_RECEPTOR_MAP.get(regimen_emisor_code, 'Desconocido')}" if regimen_emisor_code else None
 
@@ -223,12 +288,14 @@ def parse_cfdi_pago_20(xml_file_path):
                 "Rfc", "").strip()
             base_cfdi_data["Nombre Receptor CFDI"] = receptor_node.get(
                 "Nombre", "").strip()
-            uso_cfdi_code = receptor_node.get("UsoCFDI", "").strip()
+            uso_cfdi_code = receptor_node.get("UsoCFDI", "").strip() \
+                if wants(columns, "UsoCFDI CFDI") else ""
             base_cfdi_data["UsoCFDI CFDI"] = f"{uso_cfdi_code} - {USO_CFDI_MAP.get(uso_cfdi_code, 'Desconocido')}" if uso_cfdi_code else None
             base_cfdi_data["DomicilioFiscalReceptor CFDI"] = receptor_node.get(
                 'DomicilioFiscalReceptor', '').strip()
             regimen_receptor_code = receptor_node.get(
-                'RegimenFiscalReceptor', '').strip()
+                'RegimenFiscalReceptor', '').strip() \
+                if wants(columns, "Regimen Fiscal Receptor CFDI") else ""
             base_cfdi_data[
                 "Regimen Fiscal Receptor CFDI"] = f"{regimen_receptor_code} - {REGIMEN_FISCAL_RECEPTOR_MAP.get(regimen_receptor_code, 'Desconocido')}" if regimen_receptor_code else None
             base_cfdi_data["ResidenciaFiscal CFDI"] = receptor_node.get(
@@ -251,7 +318,7 @@ def parse_cfdi_pago_20(xml_file_path):
                 "NoCertificado", "").strip()
 
         # Format Dates (Fecha Emision: DD/MM/YYYY, Fecha Timbrado: DD/MM/YYYY HH:MM:SS)
-        if base_cfdi_data["Fecha Emision"]:
+        if base_cfdi_data["Fecha Emision"] and wants(columns, "Fecha Emision"):
             try:
                 dt_obj = datetime.strptime(
                     base_cfdi_data["Fecha Emision"], "%Y-%m-%dT%H:%M:%S")
@@ -272,7 +339,7 @@ def parse_cfdi_pago_20(xml_file_path):
             "./pago20:Totales", NAMESPACES_CFDI_40)
         if totales_node is not None:
             for _, attr_name, default_val, col_name in PAGO_FIELDS_TO_EXTRACT:
-                if col_name in PAGOS_COLUMN_ORDER and attr_name in totales_node.attrib:
+                if col_name in _PAGOS_COLUMNS and attr_name in totales_node.attrib:
                     value_str = totales_node.get(
                         attr_name, default_val).strip()
                     try:
@@ -281,69 +348,37 @@ def parse_cfdi_pago_20(xml_file_path):
                         # Ensure numeric default
                         base_cfdi_data[col_name] = 0.0
 
+        # Each row is the shared CFDI header plus a per-Pago delta and a
+        # per-DoctoRelacionado delta (see PagoRows). With a column selection
+        # the header and the specs are projected once here.
+        pago_specs, dr_specs = _PAGO_FIELD_SPECS, _DR_FIELD_SPECS
+        header = base_cfdi_data
+        if columns is not None:
+            header = {key: value for key, value in base_cfdi_data.items() if key in columns}
+            pago_specs = tuple(spec for spec in pago_specs if spec[2] in columns)
+            dr_specs = tuple(spec for spec in dr_specs if spec[2] in columns)
+        dr_taxes = wants(columns, *_DR_TAX_COLUMNS)
+
         # Iterate through each pago20:Pago element
         for pago_node in pagos_complement.findall("./pago20:Pago", NAMESPACES_CFDI_40):
-            # Extract data from the current pago20:Pago element
-            current_pago_data = {}
-            for _, attr_name, default_val, col_name in PAGO_FIELDS_TO_EXTRACT:
-                if col_name in PAGOS_COLUMN_ORDER and attr_name in pago_node.attrib:
-                    value_str = pago_node.get(attr_name, default_val).strip()
-                    if col_name == "FormaDePagoP":
-                        current_pago_data[
-                            col_name] = f"{value_str} - {FORMA_PAGO_MAP.get(value_str, 'Desconocido')}" if value_str else None
-                    elif col_name == "FechaPago":
-                        try:
-                            dt_obj = datetime.strptime(
-                                value_str, "%Y-%m-%dT%H:%M:%S")
-                            current_pago_data[col_name] = dt_obj.strftime(
-                                "%d/%m/%Y %H:%M:%S")
-                        except ValueError:
-                            # Keep original if parsing fails
-                            current_pago_data[col_name] = value_str
-                    # Check if it's a numeric field
-                    elif isinstance(default_val, str) and default_val.replace('.', '', 1).isdigit():
-                        try:
-                            current_pago_data[col_name] = float(value_str)
-                        except (ValueError, TypeError):
-                            current_pago_data[col_name] = 0.0
-                    else:
-                        current_pago_data[col_name] = value_str
-                else:
-                    # Ensure all fields are initialized
-                    current_pago_data[col_name] = None
+            pago_data = _pago_values(pago_node, pago_specs)
 
             # Iterate through each pago20:DoctoRelacionado element within the current pago20:Pago
             for docto_relacionado_node in pago_node.findall("./pago20:DoctoRelacionado", NAMESPACES_CFDI_40):
-                row_data = base_cfdi_data.copy()  # Start with base CFDI data
-
-                # Add current pago20:Pago data
-                for key, value in current_pago_data.items():
-                    if key in PAGOS_COLUMN_ORDER:  # Only add if it's in the final column order
-                        row_data[key] = value
-
-                # Extract data from the current pago20:DoctoRelacionado element
-                for _, attr_name, default_val, col_name in PAGO_DR_FIELDS_TO_EXTRACT:
-                    if col_name in PAGOS_COLUMN_ORDER and attr_name in docto_relacionado_node.attrib:
-                        value_str = docto_relacionado_node.get(
-                            attr_name, default_val).strip()
-                        if isinstance(default_val, str) and default_val.replace('.', '', 1).isdigit():
-                            try:
-                                row_data[col_name] = float(value_str)
-                            except (ValueError, TypeError):
-                                row_data[col_name] = 0.0
-                        else:
-                            row_data[col_name] = value_str
-                    else:
-                        # Ensure all fields are initialized
-                        row_data[col_name] = None
+                dr_data = _docto_values(docto_relacionado_node, dr_specs)
 
                 # Extract and aggregate tax details for this DoctoRelacionado
-                _extract_pagos_tax_details_dr(
-                    docto_relacionado_node, row_data, NAMESPACES_CFDI_40)
+                if dr_taxes:
+                    taxes = {}
+                    _extract_pagos_tax_details_dr(
+                        docto_relacionado_node, taxes, NAMESPACES_CFDI_40)
+                    if columns is not None:
+                        taxes = {key: value for key, value in taxes.items() if key in columns}
+                    dr_data.update(taxes)
 
-                all_pagos_data_rows.append(row_data)
+                dr_deltas.append((pago_data, dr_data))
 
-        if not all_pagos_data_rows:
+        if not dr_deltas:
             print(
                 f"No DoctoRelacionado found in Pagos 2.0 complement for {os.path.basename(xml_file_path)}. Adding a placeholder row.")
             # If there's a Pagos complement but no DoctoRelacionado, add a row with just base CFDI data
@@ -355,9 +390,13 @@ def parse_cfdi_pago_20(xml_file_path):
                 placeholder_data[col_name] = None
             for col_name in PAGO_DR_TAX_FIELDS.keys():
                 placeholder_data[col_name] = None
-            all_pagos_data_rows.append(placeholder_data)
+            placeholder_data[PAGO_DR_UNCLASSIFIED_TAX_COLUMN] = None
+            if columns is not None:
+                placeholder_data = {key: value for key, value in placeholder_data.items()
+                                    if key in columns}
+            return [placeholder_data]
 
-        return all_pagos_data_rows
+        return PagoRows(header, dr_deltas)
 
     except ET.ParseError as e:
         print(f"Error parsing XML file {xml_file_path}: {e}")
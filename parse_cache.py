@@ -0,0 +1,213 @@
+# --- parse_cache.py ---
+# Cache persistente (SQLite) de la salida de los parsers, por archivo.
+#
+# core.process_path lo usa para NO re-parsear los XML/ZIP que no cambiaron desde
+# la ultima corrida: la llave es (ruta, variante) con su (tamanio, mtime_ns) y
+# el valor es la lista de TargetEntry del archivo (mensaje + registros)
+# serializada como JSON.
+#
+# La variante de extraccion (core.extraction_variant: perfil full/lean,
+# seleccion de columnas y filtros) es parte de la llave: sus registros son
+# distintos, pero las filas de cada variante conviven, asi que una corrida
+# filtrada o "lean" no borra las de la corrida completa. Cada fila guarda
+# ademas la "version de parsers" (hash del codigo fuente de los modulos que
+# producen los registros); si cualquiera de esos modulos cambia, las filas
+# viejas (de todas las variantes) se borran al abrir el cache.
+#
+# Tambien guarda el manifiesto de carpetas de process_path(prune_dirs=True):
+# una fila por carpeta listada con su core.DirManifest (mtime, cuantos .xml/.zip
+# y su tamanio, nombres de archivos y subcarpetas). No depende de la version de
+# parsers: solo dice que archivos hay; sus entries siguen en parse_cache.
+#
+# No es la boveda (Roadmap paso 2): solo evita trabajo repetido; borrar el
+# archivo del cache nunca pierde datos.
+import hashlib
+import json
+import os
+import sqlite3
+
+from constants import DEFAULT_EXTRACTION_PROFILE
+from core import DirManifest, TargetEntry
+
+# Modulos cuyo codigo determina las entries de un archivo (despacho en core.py
+# incluido: ahi viven el ruteo por version y el manejo de .zip).
+PARSER_MODULES = (
+    "core.py", "cfdi_sniffer.py", "cfdi_filters.py", "constants.py", "extraction_plan.py",
+    "tax_buckets.py", "xml_parser_33.py", "xml_parser_40.py", "pagos_parser_20.py",
+)
+
+# Filas pendientes antes de escribirlas en un solo executemany.
+STORE_BATCH_SIZE = 500
+
+
+def compute_parser_version(module_files=PARSER_MODULES):
+    """Hash (sha256, 16 hex) del codigo fuente de los modulos de parseo."""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in module_files:
+        digest.update(name.encode("utf-8"))
+        with open(os.path.join(base_dir, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def file_fingerprint(path):
+    """(tamanio, mtime_ns) del archivo, o None si no se puede leer."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class ParseCache:
+    """
+    Cache de salida de parsers en un archivo SQLite.
+
+    Uso tipico (ver core.process_path):
+        with ParseCache(ruta_db) as cache:
+            hits = cache.load(rutas)      # {ruta: entries} de archivos sin cambios
+            ...
+            cache.store(ruta, entries)    # para los que se parsearon
+    """
+
+    def __init__(self, db_path, parser_version=None, variant=DEFAULT_EXTRACTION_PROFILE):
+        self.db_path = db_path
+        self.variant = variant
+        self.parser_version = parser_version or compute_parser_version()
+        self._fingerprints = {}
+        self._pending = []
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(parse_cache)")]
+        if columns and "variant" not in columns:
+            # Cache de antes de guardar la variante por fila: se descarta.
+            self.conn.execute("DROP TABLE parse_cache")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS parse_cache ("
+            " path TEXT NOT NULL,"
+            " variant TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " parser_version TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " PRIMARY KEY (path, variant))")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS dir_manifest ("
+            " path TEXT PRIMARY KEY,"
+            " mtime_ns INTEGER NOT NULL,"
+            " entry_count INTEGER NOT NULL,"
+            " total_size INTEGER NOT NULL,"
+            " files TEXT NOT NULL,"
+            " subfolders TEXT NOT NULL)")
+        # Entradas de otra version de parsers ya no sirven.
+        self.conn.execute(
+            "DELETE FROM parse_cache WHERE parser_version != ?", (self.parser_version,))
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def clear(self):
+        """Vacia el cache (para --rebuild-cache)."""
+        self._pending = []
+        self.conn.execute("DELETE FROM parse_cache")
+        self.conn.execute("DELETE FROM dir_manifest")
+        self.conn.commit()
+
+    def load(self, paths):
+        """
+        Devuelve {ruta: entries} para las rutas cuyo (tamanio, mtime_ns) coincide
+        con lo guardado. Recuerda la huella de las demas para store().
+        """
+        hits = {}
+        for path in paths:
+            key = os.path.abspath(path)
+            fingerprint = file_fingerprint(key)
+            self._fingerprints[key] = fingerprint
+            if fingerprint is None:
+                continue
+            row = self.conn.execute(
+                "SELECT payload FROM parse_cache"
+                " WHERE path = ? AND variant = ? AND size = ? AND mtime_ns = ?"
+                " AND parser_version = ?",
+                (key, self.variant, fingerprint[0], fingerprint[1],
+                 self.parser_version)).fetchone()
+            if row is not None:
+                hits[path] = [TargetEntry(*entry) for entry in json.loads(row[0])]
+        return hits
+
+    def load_unchecked(self, paths):
+        """
+        Como load() pero SIN comparar la huella (ni hacer stat): para archivos
+        de una carpeta que el manifiesto da por intacta.
+        """
+        hits = {}
+        for path in paths:
+            row = self.conn.execute(
+                "SELECT payload FROM parse_cache"
+                " WHERE path = ? AND variant = ? AND parser_version = ?",
+                (os.path.abspath(path), self.variant, self.parser_version)).fetchone()
+            if row is not None:
+                hits[path] = [TargetEntry(*entry) for entry in json.loads(row[0])]
+        return hits
+
+    def store(self, path, entries):
+        """Guarda las entries de un archivo recien parseado (con su huella de load())."""
+        key = os.path.abspath(path)
+        fingerprint = self._fingerprints.get(key) or file_fingerprint(key)
+        if fingerprint is None:
+            return
+        # Los registros (p. ej. un PagoRows) se guardan como lista de dicts.
+        payload = json.dumps(
+            [[name, message, None if records is None else list(records), skipped]
+             for name, message, records, skipped in entries], ensure_ascii=False)
+        self._pending.append(
+            (key, self.variant, fingerprint[0], fingerprint[1], self.parser_version,
+             payload))
+        if len(self._pending) >= STORE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Escribe las filas pendientes en una sola transaccion."""
+        if not self._pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO parse_cache"
+                " (path, variant, size, mtime_ns, parser_version, payload)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                self._pending)
+        self._pending = []
+
+    def load_manifest(self):
+        """{carpeta absoluta: DirManifest} guardados (ver core._scan_target_files)."""
+        manifest = {}
+        for path, mtime_ns, entry_count, total_size, files, subfolders in self.conn.execute(
+                "SELECT path, mtime_ns, entry_count, total_size, files, subfolders"
+                " FROM dir_manifest"):
+            manifest[path] = DirManifest(mtime_ns, entry_count, total_size,
+                                         tuple(json.loads(files)), tuple(json.loads(subfolders)))
+        return manifest
+
+    def store_manifest(self, listed):
+        """Guarda (reemplaza) el DirManifest de las carpetas recien listadas."""
+        if not listed:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO dir_manifest"
+                " (path, mtime_ns, entry_count, total_size, files, subfolders)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, m.mtime_ns, m.entry_count, m.total_size,
+                  json.dumps(list(m.files), ensure_ascii=False),
+                  json.dumps(list(m.subfolders), ensure_ascii=False))
+                 for path, m in listed.items()])
+
+    def close(self):
+        self.flush()
+        self.conn.close()
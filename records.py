@@ -0,0 +1,183 @@
+# --- records.py ---
+# Almacen columnar de registros (dicts de los parsers) para ProcessResult.
+#
+# Un CFDI parseado es un dict de ~130 llaves (sembradas desde
+# INVOICE_COLUMN_ORDER), casi todas en None. Guardar una lista de esos dicts
+# cuesta una tabla hash completa por fila. RecordTable guarda en cambio una
+# lista de valores por columna:
+#   - una columna que hasta ahora solo tiene None no ocupa nada (se crea al
+#     llegar su primer valor no nulo);
+#   - las llaves de cada fila se guardan una sola vez por "esquema" (tupla de
+#     llaves distinta) y cada fila solo lleva el indice de su esquema, asi que
+#     iterar regresa dicts identicos a los originales (mismas llaves y orden).
+#
+# to_dataframe() construye el DataFrame directo de las columnas, sin pasar por
+# un dict por fila.
+#
+# RecordSpool es la variante en disco para --streaming: las filas se escriben
+# una por una a un archivo temporal (con el mismo truco de esquemas) y se leen
+# de vuelta al exportar, asi que la memoria no crece con el numero de filas.
+import marshal
+import pickle
+from array import array
+
+import pandas as pd
+
+
+class RecordTable:
+    """
+    Tabla columnar de registros. Se comporta como una secuencia de solo lectura
+    de dicts (len, iteracion, indice), pero guarda los valores por columna.
+    """
+
+    def __init__(self, records=()):
+        self._columns = {}        # columna -> lista de valores, o None si todo es None
+        self._schemas = []        # tuplas de llaves distintas, en orden de llegada
+        self._schema_ids = {}     # tupla de llaves -> indice en _schemas
+        self._row_schema = array("I")
+        self.extend(records)
+
+    def __len__(self):
+        return len(self._row_schema)
+
+    def __iter__(self):
+        for index in range(len(self._row_schema)):
+            yield self._record(index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._record(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("RecordTable index out of range")
+        return self._record(index)
+
+    def __eq__(self, other):
+        if isinstance(other, (RecordTable, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"<RecordTable filas={len(self)} columnas={len(self._columns)}>"
+
+    @property
+    def columns(self):
+        """Todas las columnas vistas, en orden de primera aparicion."""
+        return list(self._columns)
+
+    def append(self, record):
+        keys = tuple(record)
+        schema = self._schema_ids.get(keys)
+        if schema is None:
+            schema = self._schema_ids[keys] = len(self._schemas)
+            self._schemas.append(keys)
+            for key in keys:
+                self._columns.setdefault(key, None)
+        rows = len(self._row_schema)
+        self._row_schema.append(schema)
+
+        columns = self._columns
+        for name, values in columns.items():
+            value = record.get(name)
+            if values is not None:
+                values.append(value)
+            elif value is not None:
+                # Primer valor no nulo: se crea la lista con el relleno previo.
+                columns[name] = [None] * rows + [value]
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def column(self, name):
+        """Valores de una columna (lista de len(self); None donde no hay valor)."""
+        values = self._columns.get(name)
+        return [None] * len(self) if values is None else values
+
+    def _record(self, index):
+        columns = self._columns
+        record = {}
+        for key in self._schemas[self._row_schema[index]]:
+            values = columns[key]
+            record[key] = None if values is None else values[index]
+        return record
+
+    def iter_rows(self, columns):
+        """Genera listas de valores en el orden de `columns` (sin dicts por fila)."""
+        lists = [self._columns.get(name) for name in columns]
+        for index in range(len(self)):
+            yield [None if values is None else values[index] for values in lists]
+
+    def to_dataframe(self, columns=None):
+        """
+        DataFrame con las columnas indicadas (por defecto todas, en orden de
+        aparicion), armado directo de las listas por columna. Las columnas que
+        no existen en la tabla salen vacias, como con DataFrame.reindex().
+        """
+        if columns is None:
+            columns = self.columns
+        return pd.DataFrame({name: self.column(name) for name in columns},
+                            columns=columns, index=pd.RangeIndex(len(self)))
+
+
+class RecordSpool:
+    """
+    Lista de registros en un archivo (solo agregar). Guarda las llaves una vez
+    por esquema, como RecordTable, y cada fila como (esquema, valores) con
+    marshal (pickle si algun valor no se puede). Se puede iterar varias veces;
+    cada iteracion vuelve a leer el archivo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "wb")
+        self._schemas = []
+        self._schema_ids = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        count = self._count
+        if not self._file.closed:
+            self._file.flush()
+        schemas = self._schemas
+        with open(self.path, "rb") as f:
+            for _ in range(count):
+                tag = f.read(1)
+                schema, values = marshal.load(f) if tag == b"M" else pickle.load(f)
+                yield dict(zip(schemas[schema], values))
+
+    @property
+    def columns(self):
+        """Todas las llaves vistas, en orden de primera aparicion (como RecordTable)."""
+        return list(dict.fromkeys(key for keys in self._schemas for key in keys))
+
+    def __repr__(self):
+        return f"<RecordSpool filas={self._count} archivo={self.path!r}>"
+
+    def append(self, record):
+        keys = tuple(record)
+        schema = self._schema_ids.get(keys)
+        if schema is None:
+            schema = self._schema_ids[keys] = len(self._schemas)
+            self._schemas.append(keys)
+        row = (schema, tuple(record.values()))
+        try:
+            data = b"M" + marshal.dumps(row)
+        except ValueError:
+            data = b"P" + pickle.dumps(row, pickle.HIGHEST_PROTOCOL)
+        self._file.write(data)
+        self._count += 1
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def close(self):
+        """Cierra el archivo de escritura (se puede seguir iterando)."""
+        self._file.close()
@@ -0,0 +1,78 @@
+# --- cfdi_processor/tax_buckets.py ---
+# Table-driven tax bucketing shared by the version parsers.
+#
+# This is NOT a parser: it only turns a tax line (Impuesto, TipoFactor,
+# TasaOCuota) into the report columns that receive its amounts, using lookup
+# tables defined in constants.py. Each version module keeps its own parsing
+# logic; they just replace their elif ladders with lookup_tax_buckets().
+
+from constants import (
+    PAGO_DR_TAX_FIELDS, TAX_CODE_BY_NAME,
+    INVOICE_TRASLADO_TAX_BUCKETS, INVOICE_RETENCION_TAX_BUCKETS,
+)
+
+
+def lookup_tax_buckets(table, impuesto, tipo_factor, tasa_ocuota):
+    """
+    Returns the bucket value for a tax line, or None if the line is unclassified.
+
+    Tries the exact (Impuesto, TipoFactor, TasaOCuota) key first and then the
+    wildcard keys (None in TasaOCuota and/or TipoFactor). At most four dict
+    lookups per line, regardless of how many rates the table holds.
+    """
+    buckets = table.get((impuesto, tipo_factor, tasa_ocuota))
+    if buckets is None:
+        buckets = table.get((impuesto, tipo_factor, None))
+    if buckets is None:
+        buckets = table.get((impuesto, None, tasa_ocuota))
+    if buckets is None:
+        buckets = table.get((impuesto, None, None))
+    return buckets
+
+
+def build_pago_dr_tax_buckets(tax_fields):
+    """
+    Derives the DoctoRelacionado lookup tables from PAGO_DR_TAX_FIELDS.
+
+    Each entry {column: (tax_name, spec, default)} becomes a (column, amount)
+    pair under its key, where amount is "Base" (BaseDR) or "Importe" (ImporteDR):
+        "0.160000_Base"    -> key (code, "Tasa", "0.160000"), "Base"
+        "0.160000_Importe" -> key (code, "Tasa", "0.160000"), "Importe"
+        "Exento_Base"      -> key (code, "Exento", None), "Base"
+        "Exento"           -> key (code, "Exento", None), "Importe"
+    Columns starting with "Ret " go to the RetencionesDR table, where TipoFactor
+    is ignored (wildcard); the rest go to the TrasladosDR table.
+
+    Returns:
+        tuple: (traslado_buckets, retencion_buckets), dicts of key -> tuple of pairs.
+    """
+    traslados = {}
+    retenciones = {}
+    for col_name, (tax_name, spec, _) in tax_fields.items():
+        impuesto = TAX_CODE_BY_NAME[tax_name]
+        rate, _, amount = spec.partition("_")
+        amount = amount or "Importe"
+        is_retencion = col_name.startswith("Ret ")
+        if rate == "Exento":
+            key = (impuesto, "Exento", None)
+        elif is_retencion:
+            key = (impuesto, None, rate)
+        else:
+            key = (impuesto, "Tasa", rate)
+        table = retenciones if is_retencion else traslados
+        table.setdefault(key, []).append((col_name, amount))
+    return ({k: tuple(v) for k, v in traslados.items()},
+            {k: tuple(v) for k, v in retenciones.items()})
+
+
+# Built once at import time.
+PAGO_DR_TRASLADO_BUCKETS, PAGO_DR_RETENCION_BUCKETS = build_pago_dr_tax_buckets(
+    PAGO_DR_TAX_FIELDS)
+
+# Every column fed by the Invoice tables (to initialize them to 0.0).
+INVOICE_TAX_BUCKET_COLUMNS = tuple(dict.fromkeys(
+    col
+    for table in (INVOICE_TRASLADO_TAX_BUCKETS, INVOICE_RETENCION_TAX_BUCKETS)
+    for cols in table.values()
+    for col in cols
+))
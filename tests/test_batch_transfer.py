@@ -0,0 +1,95 @@
+"""
+Pruebas del empaquetado de lotes del pool de procesos (batch_transfer).
+
+Verifican que pack_batch / unpack_batch regresen las mismas entries (en linea y
+por memoria compartida), el respaldo con pickle para valores que marshal no
+serializa, que el segmento se libere al leerlo o con release_batch, y que
+process_path con executor="process" siga igual a la corrida serial.
+
+Ejecutar con:
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import unittest
+from decimal import Decimal
+from multiprocessing import shared_memory
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import batch_transfer  # noqa: E402
+import core  # noqa: E402
+from batch_transfer import pack_batch, release_batch, unpack_batch  # noqa: E402
+
+FIXTURE_DIR = os.path.join(REPO_ROOT, "XML-Test")
+
+BATCH = [
+    [("a.xml", "Procesado: a.xml",
+      [{"UUID": "A", "Total": 10.5, "Moneda": None},
+       {"UUID": "B", "Total": 3.0, "Moneda": "MXN"}], None)],
+    [("b.xml", "Error en b.xml", None, None)],
+    [("c.zip", "ZIP: c.zip", [], None),
+     ("c.zip/d.xml", "Procesado: d.xml", [{"UUID": "D", "Serie": "F"}], None)],
+    [("e.xml", "Omitido: e.xml", [], core.SKIPPED_FILTERED)],
+]
+
+
+def _segment_exists(name):
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    return True
+
+
+class TestPackUnpack(unittest.TestCase):
+    def test_inline_round_trip(self):
+        descriptor = pack_batch(BATCH)
+        self.assertEqual(descriptor[0], "bytes")
+        self.assertEqual(unpack_batch(descriptor), BATCH)
+
+    @unittest.skipUnless(batch_transfer.USE_SHARED_MEMORY, "sin memoria compartida")
+    def test_shared_memory_round_trip_unlinks_segment(self):
+        with mock.patch.object(batch_transfer, "INLINE_MAX_BYTES", 0):
+            descriptor = pack_batch(BATCH)
+        self.assertEqual(descriptor[0], "shm")
+        self.assertEqual(unpack_batch(descriptor), BATCH)
+        self.assertFalse(_segment_exists(descriptor[1]))
+
+    @unittest.skipUnless(batch_transfer.USE_SHARED_MEMORY, "sin memoria compartida")
+    def test_release_unread_segment(self):
+        with mock.patch.object(batch_transfer, "INLINE_MAX_BYTES", 0):
+            descriptor = pack_batch(BATCH)
+        self.assertTrue(_segment_exists(descriptor[1]))
+        release_batch(descriptor)
+        self.assertFalse(_segment_exists(descriptor[1]))
+
+    def test_pickle_fallback(self):
+        batch = [[("a.xml", "Procesado: a.xml", [{"Total": Decimal("1.10")}], None)]]
+        descriptor = pack_batch(batch)
+        self.assertEqual(descriptor[1][:1], b"P")
+        self.assertEqual(unpack_batch(descriptor), batch)
+
+    def test_key_order_is_kept(self):
+        batch = [[("a.xml", "", [{"B": 1, "A": 2}, {"A": 2, "B": 1}], None)]]
+        records = unpack_batch(pack_batch(batch))[0][0][2]
+        self.assertEqual([list(r) for r in records], [["B", "A"], ["A", "B"]])
+
+
+class TestProcessPool(unittest.TestCase):
+    def test_process_pool_matches_serial(self):
+        serial = core.process_path(FIXTURE_DIR)
+        # Con fork los procesos del pool heredan el umbral parcheado.
+        with mock.patch.object(batch_transfer, "INLINE_MAX_BYTES", 0):
+            pooled = core.process_path(FIXTURE_DIR, workers=2, executor="process")
+        self.assertEqual(pooled.all_parsed_data, serial.all_parsed_data)
+        self.assertEqual(pooled.processed_count, serial.processed_count)
+        self.assertEqual(pooled.error_count, serial.error_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+"""
+Pruebas de la boveda SQLite (boveda).
+
+Verifican que la ingesta reparta los registros en invoices/nomina/pagos, que sea
+idempotente por UUID (tambien cuando un Pago cambia su numero de
+DoctoRelacionado, cruza lotes o viene dos veces en la misma ingesta), que el JSON guardado regrese el registro
+original y que existan los indices de consulta.
+
+Ejecutar con:
+    python -m unittest discover -s tests
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import boveda  # noqa: E402
+import core  # noqa: E402
+from boveda import Boveda, normalize_fecha_timbrado  # noqa: E402
+
+FIXTURE_DIR = os.path.join(REPO_ROOT, "XML-Test")
+
+
+def pago_rows(uuid, n_doctos):
+    return [
+        {"CFDI_Type": "Pago", "UUID CFDI": uuid, "RFC Emisor CFDI": "EEE010101AAA",
+         "RFC Receptor CFDI": "RRR010101BBB", "Fecha Timbrado": "01/03/2025 09:01:00",
+         "IdDocumento Relacionado": f"DOC-{i}"}
+        for i in range(n_doctos)
+    ]
+
+
+class TestBovedaIngest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.result = core.process_path(FIXTURE_DIR)
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp, "boveda.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_ingest_is_idempotent_by_uuid(self):
+        with Boveda(self.db_path) as bov:
+            stats = bov.ingest(self.result.all_parsed_data)
+            bov.ingest(self.result.all_parsed_data)
+            self.assertEqual(stats.skipped, 0)
+            self.assertEqual(bov.count("invoices"), len(self.result.invoice_data))
+            self.assertEqual(bov.count("nomina"), len(self.result.nomina_data))
+
+    def test_data_round_trips_with_key_order(self):
+        record = self.result.nomina_data[0]
+        with Boveda(self.db_path) as bov:
+            bov.ingest([record])
+            uuid, year_month, data = bov.conn.execute(
+                "SELECT uuid, year_month, data FROM nomina").fetchone()
+        self.assertEqual(uuid, record["UUID"].upper())
+        restored = json.loads(data)
+        self.assertEqual(list(restored.items()), list(record.items()))
+        fecha = normalize_fecha_timbrado(record["Fecha Timbrado"])
+        self.assertEqual(year_month, fecha[:7])
+
+    def test_pago_reingest_replaces_all_doctos(self):
+        with Boveda(self.db_path) as bov:
+            bov.ingest(pago_rows("AAAA", 3) + pago_rows("BBBB", 1))
+            bov.ingest(pago_rows("AAAA", 2))
+            self.assertEqual(bov.count("pagos"), 3)
+            self.assertEqual(
+                bov.conn.execute("SELECT row_index FROM pagos WHERE uuid = 'AAAA'"
+                                 " ORDER BY row_index").fetchall(), [(0,), (1,)])
+
+    def test_pago_doctos_spanning_batches(self):
+        with mock.patch.object(boveda, "INGEST_BATCH_SIZE", 2), Boveda(self.db_path) as bov:
+            bov.ingest(pago_rows("AAAA", 5))
+            bov.ingest(pago_rows("AAAA", 5))
+            self.assertEqual(bov.count("pagos"), 5)
+
+    def test_pago_twice_in_one_ingest(self):
+        copy = [dict(row, **{"Archivo XML": "copia.xml"}) for row in pago_rows("AAAA", 2)]
+        cases = {
+            "seguidos": pago_rows("AAAA", 2) + pago_rows("AAAA", 2),
+            "otro nombre": pago_rows("AAAA", 2) + copy,
+            "separados": pago_rows("AAAA", 3) + pago_rows("BBBB", 1) + pago_rows("AAAA", 2),
+        }
+        for name, records in cases.items():
+            for batch_size in (boveda.INGEST_BATCH_SIZE, 2):
+                with self.subTest(name, batch_size=batch_size), \
+                        mock.patch.object(boveda, "INGEST_BATCH_SIZE", batch_size), \
+                        Boveda(os.path.join(self.tmp, f"{name}-{batch_size}.sqlite3")) as bov:
+                    bov.ingest(records)
+                    self.assertEqual(
+                        bov.conn.execute("SELECT row_index FROM pagos WHERE uuid = 'AAAA'"
+                                         " ORDER BY row_index").fetchall(), [(0,), (1,)])
+
+    def test_known_uuids_then_incremental_sync(self):
+        with Boveda(self.db_path) as bov:
+            bov.ingest(self.result.nomina_data)
+            bov.ingest(pago_rows("AAAA", 2))
+            known = bov.known_uuids()
+        self.assertEqual(known, {r["UUID"].upper() for r in self.result.nomina_data} | {"AAAA"})
+        again = core.process_path(FIXTURE_DIR, known_uuids=known)
+        self.assertEqual(again.known_count, len(self.result.nomina_data))
+        self.assertEqual(list(again.invoice_data), list(self.result.invoice_data))
+        self.assertEqual(len(again.nomina_data), 0)
+
+    def test_records_without_uuid_are_skipped(self):
+        with Boveda(self.db_path) as bov:
+            stats = bov.ingest([{"CFDI_Type": "Invoice", "UUID": ""}, {"CFDI_Type": "Otro"}])
+            self.assertEqual(stats.skipped, 2)
+            self.assertEqual(stats.total, 0)
+
+    def test_wal_mode_and_indexes(self):
+        with Boveda(self.db_path) as bov:
+            mode = bov.conn.execute("PRAGMA journal_mode").fetchone()[0]
+            self.assertEqual(mode, "wal")
+            for table in boveda.TABLES:
+                names = {row[1] for row in bov.conn.execute(f"PRAGMA index_list({table})")}
+                self.assertIn(f"idx_{table}_emisor", names)
+                self.assertIn(f"idx_{table}_receptor", names)
+                self.assertIn(f"idx_{table}_year_month", names)
+            plan = " ".join(str(row) for row in bov.conn.execute(
+                "EXPLAIN QUERY PLAN SELECT data FROM invoices"
+                " WHERE rfc_emisor = ? AND fecha_timbrado >= ?", ("X", "2025")))
+            self.assertIn("idx_invoices_emisor", plan)
+
+
+def invoice(uuid, emisor, receptor, fecha):
+    return {"CFDI_Type": "Invoice", "UUID": uuid, "RFC Emisor": emisor,
+            "RFC Receptor": receptor, "Fecha Timbrado": fecha}
+
+
+class TestBovedaQuery(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp, "boveda.sqlite3")
+        self.records = [
+            invoice("U3", "AAA", "BBB", "15/02/2025 10:00:00"),
+            invoice("U1", "AAA", "CCC", "01/02/2025 00:00:00"),
+            invoice("U2", "BBB", "AAA", "28/02/2025 23:59:59"),
+            invoice("U4", "AAA", "BBB", "01/03/2025 00:00:00"),
+        ] + pago_rows("P1", 2)
+        with Boveda(self.db_path) as bov:
+            bov.ingest(self.records)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def uuids(self, **filters):
+        result = core.load_from_boveda(self.db_path, **filters)
+        return [r.get("UUID") or r.get("UUID CFDI") for r in result.all_parsed_data]
+
+    def test_emitidas_recibidas_and_month_range(self):
+        february = {"date_from": "2025-02-01", "date_to": "2025-02-28"}
+        self.assertEqual(self.uuids(rfc="AAA", direction="Emitidas", **february), ["U1", "U3"])
+        self.assertEqual(self.uuids(rfc="AAA", direction="Recibidas", **february), ["U2"])
+        self.assertEqual(self.uuids(rfc="AAA", cfdi_types=["Invoice"], **february),
+                         ["U1", "U3", "U2"])
+
+    def test_rfc_is_normalized(self):
+        february = {"date_from": "2025-02-01", "date_to": "2025-02-28"}
+        self.assertEqual(self.uuids(rfc=" aaa ", direction="Emitidas", **february),
+                         ["U1", "U3"])
+
+    def test_type_filter_and_result_buckets(self):
+        result = core.load_from_boveda(self.db_path, cfdi_types=["Pago"])
+        self.assertEqual(len(result.pagos_data), 2)
+        self.assertEqual(result.invoice_data, [])
+        self.assertEqual(result.processed_count, 2)
+        self.assertEqual([r["IdDocumento Relacionado"] for r in result.pagos_data],
+                         ["DOC-0", "DOC-1"])
+
+    def test_round_trip_from_folder(self):
+        result = core.process_path(FIXTURE_DIR)
+        with Boveda(self.db_path) as bov:
+            bov.ingest(result.all_parsed_data)
+        loaded = core.load_from_boveda(self.db_path, cfdi_types=["Invoice", "Nomina"])
+        expected = list(result.invoice_data) + list(result.nomina_data) + self.records[:4]
+        self.assertCountEqual([json.dumps(r, sort_keys=True) for r in loaded.all_parsed_data],
+                              [json.dumps(r, sort_keys=True) for r in expected])
+        self.assertEqual(loaded.processed_count, loaded.record_count)
+        self.assertEqual(loaded.record_count, len(expected))
+
+    def test_rfc_filters_use_indexes(self):
+        with Boveda(self.db_path) as bov:
+            plan = " ".join(str(row) for row in bov.conn.execute(
+                "EXPLAIN QUERY PLAN SELECT data FROM pagos WHERE rfc_receptor = ?"
+                " AND fecha_timbrado >= ? AND fecha_timbrado <= ?", ("X", "a", "b")))
+            self.assertIn("idx_pagos_receptor", plan)
+            with self.assertRaises(ValueError):
+                bov.query(rfc="AAA", direction="Otra")
+
+
+class TestNormalizeFecha(unittest.TestCase):
+    def test_formats(self):
+        self.assertEqual(normalize_fecha_timbrado("05/02/2025 19:32:11"), "2025-02-05T19:32:11")
+        self.assertEqual(normalize_fecha_timbrado("2025-02-05T19:32:11"), "2025-02-05T19:32:11")
+        self.assertIsNone(normalize_fecha_timbrado(""))
+        self.assertIsNone(normalize_fecha_timbrado("ayer"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
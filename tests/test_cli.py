@@ -0,0 +1,74 @@
+"""
+Pruebas de la linea de comandos (cli).
+
+Verifican que --columns solo acepte nombres de columna conocidos
+(constants.SELECTABLE_COLUMNS) y que esos nombres cubran todo lo que producen
+los parsers. Una corrida que no produce registros completos (--columns o
+--profile lean) no debe escribir en la boveda.
+
+Ejecutar con:
+    python -m unittest discover -s tests
+"""
+import contextlib
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import cli  # noqa: E402
+import core  # noqa: E402
+from constants import SELECTABLE_COLUMNS  # noqa: E402
+
+FIXTURE_DIR = os.path.join(REPO_ROOT, "XML-Test")
+
+
+class TestColumnsArgument(unittest.TestCase):
+    def test_every_parsed_column_is_selectable(self):
+        for record in core.process_path(FIXTURE_DIR).iter_all():
+            self.assertLessEqual(set(record), SELECTABLE_COLUMNS, record["CFDI_Type"])
+
+    def test_known_names_are_accepted(self):
+        self.assertEqual(cli._column_list(" UUID, Total Sueldos,IVA 16% "),
+                         ["UUID", "Total Sueldos", "IVA 16%"])
+
+    def test_unknown_names_are_rejected(self):
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), self.assertRaises(SystemExit) as exit_:
+            cli.main([FIXTURE_DIR, "--columns", "UUID,Totl,IVA16"])
+        self.assertEqual(exit_.exception.code, 2)
+        self.assertIn("'Totl', 'IVA16'", stderr.getvalue())
+
+
+class TestBovedaGuards(unittest.TestCase):
+    def run_cli(self, argv):
+        stdout = io.StringIO()
+        with mock.patch.object(core, "create_initial_directories"), \
+                mock.patch.object(cli, "Boveda") as boveda, \
+                mock.patch.object(core, "process_path") as process_path, \
+                contextlib.redirect_stdout(stdout):
+            code = cli.main(argv)
+        boveda.assert_not_called()
+        process_path.assert_not_called()
+        return code, stdout.getvalue()
+
+    def test_columns_with_boveda_is_rejected(self):
+        for extra in ([], ["--skip-known"]):
+            with self.subTest(extra=extra):
+                code, out = self.run_cli(
+                    [FIXTURE_DIR, "--columns", "Total", "--boveda", "--no-cache"] + extra)
+                self.assertEqual(code, 1)
+                self.assertIn("--columns no se puede con --boveda", out)
+
+    def test_lean_profile_with_boveda_is_rejected(self):
+        code, out = self.run_cli([FIXTURE_DIR, "--profile", "lean", "--boveda", "--no-cache"])
+        self.assertEqual(code, 1)
+        self.assertIn("--profile lean no se puede con --boveda", out)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+"""
+Pruebas de paridad del recorrido unico de cfdi:Concepto (_visit_conceptos).
+
+Comparan la salida de parse_cfdi_40_invoice / parse_cfdi_33_invoice contra una
+copia de la implementacion anterior (varias pasadas `.//` sobre los Conceptos),
+con los fixtures de XML-Test y con XMLs sinteticos que ejercitan IEPS,
+retenciones, IEDU y deteccion de combustible en ambas versiones.
+
+Ejecutar con:
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from constants import (  # noqa: E402
+    NAMESPACES_CFDI_33, NAMESPACES_CFDI_40,
+    FUEL_PROD_SERV_CODES, FUEL_UNITS, FUEL_KEYWORDS,
+)
+from xml_parser_40 import parse_cfdi_40_invoice  # noqa: E402
+from xml_parser_33 import parse_cfdi_33_invoice  # noqa: E402
+
+FIXTURE_DIR = os.path.join(REPO_ROOT, "XML-Test")
+
+COMPARED_FIELDS = [
+    "Conceptos", "Conceptos_Importe_Sum", "Total IEPS", "IVA 16%", "IVA 8%",
+    "IEPS 3%", "IEPS 6%", "IEPS 7%", "IEPS 8%", "IEPS 9%", "IEPS 26.5%",
+    "IEPS 30%", "IEPS 30.4%", "IEPS 53%", "IEPS 160%",
+    "Retenido ISR", "Retenido IVA", "IVA Ret 6%",
+    "CURP Dependiente", "Nivel Educativo", "Nombre Dependiente", "Combustible",
+]
+
+IEPS_RATES = {
+    "0.030000": "IEPS 3%", "0.060000": "IEPS 6%", "0.070000": "IEPS 7%",
+    "0.080000": "IEPS 8%", "0.090000": "IEPS 9%", "0.265000": "IEPS 26.5%",
+    "0.300000": "IEPS 30%", "0.304000": "IEPS 30.4%", "0.530000": "IEPS 53%",
+    "1.600000": "IEPS 160%",
+}
+
+
+def legacy_concepto_fields(root, ns):
+    """Implementacion anterior (multiples pasadas) de los campos por Concepto."""
+    data = {field: 0.0 for field in COMPARED_FIELDS}
+    for field in ("Conceptos", "CURP Dependiente", "Nivel Educativo", "Nombre Dependiente"):
+        data[field] = None
+
+    descriptions = []
+    for concepto in root.findall(".//cfdi:Concepto", ns):
+        description = concepto.get("Descripcion", "").strip()
+        if description:
+            descriptions.append(description)
+        importe_str = concepto.get("Importe")
+        if importe_str:
+            try:
+                data["Conceptos_Importe_Sum"] += float(importe_str)
+            except ValueError:
+                pass
+    data["Conceptos"] = " | ".join(descriptions) if descriptions else None
+
+    for traslado in root.findall(".//cfdi:Concepto/cfdi:Impuestos/cfdi:Traslados/cfdi:Traslado", ns):
+        impuesto = traslado.get("Impuesto", "").strip()
+        tipo_factor = traslado.get("TipoFactor", "").strip()
+        tasa = traslado.get("TasaOCuota", "").strip()
+        try:
+            importe = float(traslado.get("Importe", "0.00").strip())
+        except ValueError:
+            importe = 0.0
+        if impuesto == "002" and tipo_factor == "Tasa":
+            if tasa == "0.160000":
+                data["IVA 16%"] += importe
+            elif tasa == "0.080000":
+                data["IVA 8%"] += importe
+        elif impuesto == "003" and tipo_factor == "Tasa":
+            data["Total IEPS"] += importe
+            if tasa in IEPS_RATES:
+                data[IEPS_RATES[tasa]] += importe
+
+    for retencion in root.findall(".//cfdi:Concepto/cfdi:Impuestos/cfdi:Retenciones/cfdi:Retencion", ns):
+        impuesto = retencion.get("Impuesto", "").strip()
+        try:
+            importe = float(retencion.get("Importe", "0.00").strip())
+        except ValueError:
+            importe = 0.0
+        if impuesto == "001":
+            data["Retenido ISR"] += importe
+        elif impuesto == "002":
+            data["Retenido IVA"] += importe
+            if retencion.get("TasaOCuota", "").strip() == "0.060000":
+                data["IVA Ret 6%"] += importe
+
+    iedu = root.find(".//cfdi:Concepto/cfdi:ComplementoConcepto/iedu:instEducativas", ns)
+    if iedu is not None:
+        data["CURP Dependiente"] = iedu.get("CURP", "").strip()
+        data["Nivel Educativo"] = iedu.get("nivelEducativo", "").strip()
+        data["Nombre Dependiente"] = iedu.get("nombreAlumno", "").strip()
+
+    combustible = False
+    for concepto in root.findall(".//cfdi:Concepto", ns):
+        clave = concepto.get("ClaveProdServ", "").strip()
+        unidad = concepto.get("ClaveUnidad", "").upper().strip()
+        description = concepto.get("Descripcion", "").upper().strip()
+        if clave in FUEL_PROD_SERV_CODES:
+            combustible = True
+            break
+        if unidad in FUEL_UNITS and any(k in description for k in FUEL_KEYWORDS):
+            combustible = True
+            break
+    data["Combustible"] = "Si   " if combustible else "No"
+    return data
+
+
+CONCEPTO_TEMPLATE = (
+    '<cfdi:Concepto ClaveProdServ="{clave}" ClaveUnidad="{unidad}" Descripcion="{desc}" '
+    'Cantidad="1" ValorUnitario="{importe}" Importe="{importe}">'
+    '<cfdi:Impuestos><cfdi:Traslados>'
+    '<cfdi:Traslado Base="{importe}" Impuesto="002" TipoFactor="Tasa" TasaOCuota="{iva}" Importe="{iva_imp}"/>'
+    '<cfdi:Traslado Base="{importe}" Impuesto="003" TipoFactor="Tasa" TasaOCuota="{ieps}" Importe="{ieps_imp}"/>'
+    '</cfdi:Traslados><cfdi:Retenciones>'
+    '<cfdi:Retencion Base="{importe}" Impuesto="{ret_imp}" TipoFactor="Tasa" TasaOCuota="{ret_tasa}" Importe="{ret}"/>'
+    '</cfdi:Retenciones></cfdi:Impuestos>{extra}</cfdi:Concepto>'
+)
+
+
+def synthetic_cfdi(cfdi_uri, version, n_conceptos, fuel_at=None):
+    """Arma un CFDI con muchos Conceptos variados (IEPS, retenciones, IEDU, combustible)."""
+    ieps_rates = sorted(IEPS_RATES) + ["0.250000"]
+    conceptos = []
+    for i in range(n_conceptos):
+        is_fuel = fuel_at is not None and i == fuel_at
+        extra = ""
+        if i in (3, 5):  # dos IEDU: debe tomarse el primero
+            extra = ('<cfdi:ComplementoConcepto><iedu:instEducativas version="1.0" '
+                     f'nombreAlumno="Alumno {i}" CURP="CURP{i:014d}" nivelEducativo="Primaria"/>'
+                     '</cfdi:ComplementoConcepto>')
+        conceptos.append(CONCEPTO_TEMPLATE.format(
+            clave="15101514" if is_fuel else "43211500",
+            unidad="LTR" if i % 7 == 0 else "H87",
+            # Unidad LTR + palabra clave solo coinciden en i=280 (deteccion por descripcion).
+            desc="Articulo gas %d" % i if i % 7 == 3 or i == 280 else "Articulo %d" % i,
+            importe="%.2f" % (10 + i * 1.37),
+            iva="0.160000" if i % 2 else "0.080000",
+            iva_imp="%.2f" % (1.6 + i * 0.21),
+            ieps=ieps_rates[i % len(ieps_rates)],
+            ieps_imp="%.2f" % (0.3 + i * 0.11),
+            ret_imp="001" if i % 3 else "002",
+            ret_tasa="0.060000" if i % 4 == 0 else "0.100000",
+            ret="%.2f" % (0.5 + i * 0.07),
+            extra=extra,
+        ))
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        f'<cfdi:Comprobante xmlns:cfdi="{cfdi_uri}" xmlns:iedu="http://www.sat.gob.mx/iedu" '
+        f'Version="{version}" Fecha="2024-01-02T03:04:05" SubTotal="1" Total="1" '
+        'TipoDeComprobante="I" Moneda="MXN" LugarExpedicion="44100">'
+        '<cfdi:Emisor Rfc="EEE010101AAA" Nombre="Emisor" RegimenFiscal="601"/>'
+        '<cfdi:Receptor Rfc="RRR010101BBB" Nombre="Receptor" UsoCFDI="G03"/>'
+        '<cfdi:Conceptos>' + "".join(conceptos) + '</cfdi:Conceptos>'
+        '<cfdi:Complemento><tfd:TimbreFiscalDigital xmlns:tfd="http://www.sat.gob.mx/TimbreFiscalDigital" '
+        'UUID="00000000-0000-0000-0000-000000000000" FechaTimbrado="2024-01-02T03:05:00"/>'
+        '</cfdi:Complemento></cfdi:Comprobante>'
+    )
+
+
+class TestConceptoVisitorParity(unittest.TestCase):
+    def assert_parity(self, parse_func, path, ns):
+        root = ET.parse(path).getroot()
+        expected = legacy_concepto_fields(root, ns)
+        data = parse_func(path)
+        self.assertIsNotNone(data)
+        for field in COMPARED_FIELDS:
+            self.assertEqual(data[field], expected[field], field)
+
+    def test_fixtures_match_legacy_implementation(self):
+        for name in sorted(os.listdir(FIXTURE_DIR)):
+            path = os.path.join(FIXTURE_DIR, name)
+            with self.subTest(fixture=name):
+                self.assert_parity(parse_cfdi_40_invoice, path, NAMESPACES_CFDI_40)
+
+    def test_synthetic_many_conceptos_both_versions(self):
+        cases = [
+            (parse_cfdi_40_invoice, NAMESPACES_CFDI_40, "4.0"),
+            (parse_cfdi_33_invoice, NAMESPACES_CFDI_33, "3.3"),
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            for parse_func, ns, version in cases:
+                # (sin combustible), (por descripcion en i=280), (por ClaveProdServ)
+                for n_conceptos, fuel_at in ((200, None), (300, None), (300, 1)):
+                    path = os.path.join(tmp, f"cfdi_{version}_{n_conceptos}_{fuel_at}.xml")
+                    with open(path, "w", encoding="utf-8") as f:
+                        f.write(synthetic_cfdi(ns["cfdi"], version, n_conceptos, fuel_at))
+                    with self.subTest(version=version, n=n_conceptos, fuel_at=fuel_at):
+                        self.assert_parity(parse_func, path, ns)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
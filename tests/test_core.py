@@ -2,20 +2,38 @@
 Pruebas del pipeline core (carpeta -> parseo -> resultado).
 
 Verifican que core.process_path recorra los fixtures de XML-Test, los clasifique
-por tipo y produzca un nombre de archivo coherente, SIN abrir ninguna UI.
+por tipo y produzca un nombre de archivo coherente, SIN abrir ninguna UI, y que
+el perfil "lean" solo omita Sello, SelloSAT y Certificado, y que una seleccion
+de columnas de los mismos valores que la extraccion completa. Los filtros
+(cfdi_filters) deben descartar los XML antes del parseo completo, igual que
+los UUID ya conocidos tomados del nombre del archivo; un CFDI repetido (suelto
+y en un .zip) solo debe aparecer una vez. core.iter_records debe entregar los
+mismos registros que process_path, uno por uno, y el pool de hilos lo mismo
+que el modo en serie. El recorrido con os.scandir debe seguir el orden de
+os.walk y correr a la par del parseo. Con spool_dir los registros quedan en
+disco y el Excel en streaming debe salir igual que desde memoria.
 
 Ejecutar con:
     python -m unittest discover -s tests
 """
 import os
+import shutil
 import sys
+import tempfile
+import threading
 import unittest
+import zipfile
+from unittest import mock
+
+from openpyxl import load_workbook
 
 REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if REPO_ROOT not in sys.path:
     sys.path.insert(0, REPO_ROOT)
 
 import core  # noqa: E402
+from boveda import Boveda  # noqa: E402
+from cfdi_filters import build_filter  # noqa: E402
 
 FIXTURE_DIR = os.path.join(REPO_ROOT, "XML-Test")
 
@@ -49,6 +67,154 @@ class TestProcessPath(unittest.TestCase):
         self.assertGreaterEqual(name.count("_"), 2)
 
 
+class TestSingleParseDispatch(unittest.TestCase):
+    def test_file_is_parsed_only_once(self):
+        # El despacho construye el arbol y los parsers lo reutilizan.
+        path = os.path.join(FIXTURE_DIR, sorted(os.listdir(FIXTURE_DIR))[0])
+        real_parse = core.ET.parse
+        with mock.patch.object(core.ET, "parse", side_effect=real_parse) as spy:
+            data = core.parse_xml_file_by_version(path)
+        self.assertIsNotNone(data)
+        self.assertEqual(spy.call_count, 1)
+
+    def test_bytes_input_matches_path_input(self):
+        path = os.path.join(FIXTURE_DIR, sorted(os.listdir(FIXTURE_DIR))[0])
+        with open(path, "rb") as f:
+            raw = f.read()
+        self.assertEqual(core.parse_xml_file_by_version(path, xml_bytes=raw),
+                         core.parse_xml_file_by_version(path))
+
+
+class TestParallelMode(unittest.TestCase):
+    def run_both(self, folder):
+        runs = []
+        for workers in (1, 2):
+            logs, progress = [], []
+            result = core.process_path(
+                folder, on_log=logs.append,
+                on_progress=lambda c, t, n: progress.append((c, t, n)),
+                workers=workers)
+            runs.append((result, logs, progress))
+        return runs
+
+    def test_pool_matches_serial_output_and_callbacks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            fixtures = sorted(os.listdir(FIXTURE_DIR))
+            for name in fixtures:
+                shutil.copy(os.path.join(FIXTURE_DIR, name), tmp)
+            with open(os.path.join(tmp, "otro.xml"), "wb") as f:
+                f.write(b'<?xml version="1.0"?><Otro Version="4.0"/>')
+            with zipfile.ZipFile(os.path.join(tmp, "paquete.zip"), "w") as zf:
+                zf.write(os.path.join(FIXTURE_DIR, fixtures[0]), fixtures[0])
+            (serial, serial_logs, serial_progress), (pooled, pooled_logs, pooled_progress) = \
+                self.run_both(tmp)
+
+        self.assertEqual(pooled.all_parsed_data, serial.all_parsed_data)
+        self.assertEqual(pooled.nomina_data, serial.nomina_data)
+        self.assertEqual(pooled.processed_count, serial.processed_count)
+        self.assertEqual(pooled.error_count, serial.error_count)
+        self.assertEqual(serial.error_count, 1)
+        self.assertEqual(pooled_logs, serial_logs)
+        # El total del avance es el encontrado hasta ese momento (el recorrido
+        # corre a la par): depende del ritmo, pero el ultimo es el definitivo.
+        self.assertEqual([(c, n) for c, _, n in pooled_progress],
+                         [(c, n) for c, _, n in serial_progress])
+        for progress in (serial_progress, pooled_progress):
+            self.assertEqual(progress[-1][1], len(fixtures) + 2)
+            totals = [t for _, t, _ in progress]
+            self.assertEqual(totals, sorted(totals))
+            self.assertTrue(all(c <= t for c, t, _ in progress))
+
+    def test_chunksize_bounds(self):
+        self.assertEqual(core._pool_chunksize(3, 16), 1)
+        self.assertEqual(core._pool_chunksize(800, 4), 50)
+        self.assertEqual(core._pool_chunksize(10 ** 6, 16), core.MAX_POOL_CHUNKSIZE)
+
+
+class TestZipStreaming(unittest.TestCase):
+    def test_members_parsed_from_memory_with_progress_and_errors(self):
+        fixtures = sorted(os.listdir(FIXTURE_DIR))
+        with tempfile.TemporaryDirectory() as tmp:
+            with zipfile.ZipFile(os.path.join(tmp, "paquete.zip"), "w") as zf:
+                zf.write(os.path.join(FIXTURE_DIR, fixtures[0]), "a/" + fixtures[0])
+                zf.writestr("otro.xml", b'<?xml version="1.0"?><Otro Version="4.0"/>')
+                zf.writestr("leeme.txt", b"no es xml")
+            with open(os.path.join(tmp, "roto.zip"), "wb") as f:
+                f.write(b"esto no es un zip")
+            progress = []
+            with mock.patch.object(zipfile.ZipFile, "extractall") as extractall:
+                result = core.process_path(
+                    tmp, on_progress=lambda c, t, n: progress.append((c, t, n)))
+
+        extractall.assert_not_called()
+        self.assertEqual(result.all_parsed_data,
+                         [core.parse_xml_file_by_version(os.path.join(FIXTURE_DIR, fixtures[0]))])
+        # miembro no soportado + zip corrupto
+        self.assertEqual(result.error_count, 2)
+        # Los miembros reportan avance con el indice de su .zip (el orden de
+        # los .zip depende de os.walk).
+        zip_index = next(c for c, _, n in progress if n == "paquete.zip")
+        self.assertEqual([(c, n) for c, _, n in progress if n.startswith("paquete.zip")], [
+            (zip_index, "paquete.zip"),
+            (zip_index, "paquete.zip/a/" + fixtures[0]),
+            (zip_index, "paquete.zip/otro.xml"),
+        ])
+        self.assertIn((3 - zip_index, "roto.zip"), [(c, n) for c, _, n in progress])
+        self.assertEqual(progress[-1][1], 2)
+
+
+class TestStreamingDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.names = sorted(f for f in os.listdir(FIXTURE_DIR) if f.endswith(".xml"))
+        for folder, names in (("", self.names[:3]), ("a", self.names[3:6]),
+                              (os.path.join("a", "b"), self.names[6:9]),
+                              ("tarde", self.names[9:])):
+            os.makedirs(os.path.join(self.tmp, folder), exist_ok=True)
+            for name in names:
+                shutil.copy(os.path.join(FIXTURE_DIR, name), os.path.join(self.tmp, folder))
+        open(os.path.join(self.tmp, "a", "leeme.txt"), "w").close()
+        shutil.copy(os.path.join(FIXTURE_DIR, self.names[0]),
+                    os.path.join(self.tmp, "a", "MAYUS.XML"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_scan_follows_os_walk_order(self):
+        expected = [os.path.join(root, f) for root, _, files in os.walk(self.tmp)
+                    for f in files if f.lower().endswith((".xml", ".zip"))]
+        self.assertEqual(list(core._scan_target_files(self.tmp)),
+                         [(path, False) for path in expected])
+
+    def test_parsing_starts_before_the_scan_ends(self):
+        real_scandir = os.scandir
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                first_parsed = threading.Event()
+                overlapped = []
+
+                def slow_scandir(path):
+                    # La carpeta "tarde" no se lista hasta que ya hubo avance.
+                    if os.path.basename(path) == "tarde":
+                        overlapped.append(first_parsed.wait(timeout=10))
+                    return real_scandir(path)
+
+                progress = []
+
+                def on_progress(c, t, n):
+                    progress.append((c, t))
+                    first_parsed.set()
+
+                with mock.patch.object(os, "scandir", slow_scandir):
+                    result = core.process_path(self.tmp, on_progress=on_progress,
+                                               workers=workers, executor="thread")
+                self.assertEqual(overlapped, [True])
+                # MAYUS.XML es un duplicado del primero.
+                self.assertEqual(result.processed_count, len(self.names))
+                self.assertLess(progress[0][1], len(self.names) + 1)
+                self.assertEqual(progress[-1], (len(self.names) + 1, len(self.names) + 1))
+
+
 class TestProcessPathInvalid(unittest.TestCase):
     def test_invalid_path_returns_empty_result(self):
         result = core.process_path(os.path.join(REPO_ROOT, "no_such_dir_xyz"))
@@ -56,5 +222,317 @@ class TestProcessPathInvalid(unittest.TestCase):
         self.assertEqual(result.processed_count, 0)
 
 
+class TestIterRecords(unittest.TestCase):
+    def test_same_records_and_counters_as_process_path(self):
+        result = core.process_path(FIXTURE_DIR)
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                stats = core.RunStats(dedup=True)
+                items = list(core.iter_records(FIXTURE_DIR, workers=workers, stats=stats))
+                self.assertEqual([item.record for item in items], result.all_parsed_data)
+                self.assertEqual(stats.processed_count, result.processed_count)
+                self.assertEqual(stats.error_count, result.error_count)
+                self.assertTrue(all(1 <= item.index <= item.total <= 13 for item in items))
+                self.assertEqual(items[-1].total, 13)
+                self.assertTrue(all(item.source.startswith(FIXTURE_DIR) for item in items))
+
+    def test_is_lazy_and_validates_on_call(self):
+        with self.assertRaises(ValueError):
+            core.iter_records(FIXTURE_DIR, profile="otro")
+        with mock.patch.object(core, "parse_xml_file_by_version",
+                               wraps=core.parse_xml_file_by_version) as parse:
+            records = core.iter_records(FIXTURE_DIR)
+            parse.assert_not_called()
+            next(records)
+            records.close()
+        self.assertEqual(parse.call_count, 1)
+
+    def test_feeds_boveda_ingest(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with Boveda(os.path.join(tmp, "boveda.sqlite3")) as boveda:
+                stats = boveda.ingest(item.record for item in core.iter_records(FIXTURE_DIR))
+                self.assertEqual(stats.total, 13)
+
+
+class TestExecutor(unittest.TestCase):
+    def test_thread_pool_matches_serial(self):
+        serial = core.process_path(FIXTURE_DIR)
+        threaded = core.process_path(FIXTURE_DIR, workers=4, executor="thread")
+        self.assertEqual(threaded.all_parsed_data, serial.all_parsed_data)
+        self.assertEqual(threaded.processed_count, serial.processed_count)
+
+    def test_auto_follows_the_gil(self):
+        with mock.patch.object(sys, "_is_gil_enabled", lambda: False, create=True):
+            self.assertEqual(core.resolve_executor("auto"), "thread")
+        with mock.patch.object(sys, "_is_gil_enabled", lambda: True, create=True):
+            self.assertEqual(core.resolve_executor("auto"), "process")
+        self.assertEqual(core.resolve_executor("thread"), "thread")
+        with self.assertRaises(ValueError):
+            core.process_path(FIXTURE_DIR, executor="fibras")
+
+
+class TestExtractionProfile(unittest.TestCase):
+    def test_lean_profile_drops_heavy_fields_only(self):
+        full = core.process_path(FIXTURE_DIR, workers=2)
+        lean = core.process_path(FIXTURE_DIR, profile="lean")
+        self.assertEqual(len(lean.all_parsed_data), len(full.all_parsed_data))
+        for full_record, lean_record in zip(full.iter_all(), lean.iter_all()):
+            expected = {k: v for k, v in full_record.items()
+                        if k not in ("Sello", "Certificado", "SelloSAT")}
+            self.assertEqual(list(lean_record.items()), list(expected.items()))
+
+    def test_requested_columns_win_over_profile(self):
+        columns = ["Total", "Sello"]
+        full = core.process_path(FIXTURE_DIR, columns=columns).all_parsed_data
+        lean = core.process_path(FIXTURE_DIR, profile="lean", columns=columns).all_parsed_data
+        self.assertEqual(lean, full)
+        self.assertTrue(any(record.get("Sello") for record in lean))
+
+    def test_certificado_is_shared_by_no_certificado(self):
+        # Con el pool cada registro llega como una copia nueva del str.
+        result = core.process_path(FIXTURE_DIR, workers=2)
+        by_number = {}
+        for record in result.iter_all():
+            by_number.setdefault(record["NoCertificado"], set()).add(id(record["Certificado"]))
+        self.assertTrue(any(len(ids) == 1 for ids in by_number.values()))
+        self.assertTrue(all(len(ids) == 1 for ids in by_number.values()))
+
+    def test_unknown_profile_and_cache_mismatch(self):
+        with self.assertRaises(ValueError):
+            core.process_path(FIXTURE_DIR, profile="otro")
+        cache = mock.Mock(variant="full")
+        with self.assertRaises(ValueError):
+            core.process_path(FIXTURE_DIR, cache=cache, profile="lean")
+
+
+class TestColumnProjection(unittest.TestCase):
+    SELECTIONS = (
+        ["Total", "Nombre Emisor"],
+        ["Conceptos", "IVA 16%", "Fecha Emision"],
+        ["Total Sueldos", "TotalGravado", "Numero Empleado", "Complemento"],
+        ["Total LocalTrasladado", "FormaDePago", "UsoCFDI", "Certificado"],
+    )
+
+    def test_projected_records_match_full_records(self):
+        full = core.process_path(FIXTURE_DIR).all_parsed_data
+        for columns in self.SELECTIONS:
+            selection = core.select_columns(columns)
+            with self.subTest(columns=columns):
+                projected = core.process_path(FIXTURE_DIR, columns=columns).all_parsed_data
+                expected = [{k: v for k, v in record.items() if k in selection}
+                            for record in full]
+                self.assertEqual([list(r.items()) for r in projected],
+                                 [list(r.items()) for r in expected])
+
+    def test_skipped_steps_do_not_run(self):
+        with mock.patch("xml_parser_40._visit_conceptos") as visit, \
+                mock.patch("xml_parser_40._extract_tax_details") as taxes:
+            result = core.process_path(FIXTURE_DIR, columns=["Total"])
+        self.assertTrue(result.has_data)
+        visit.assert_not_called()
+        taxes.assert_not_called()
+
+    def test_export_only_selected_columns(self):
+        columns = ["Total", "Nombre Emisor", "UUID"]
+        result = core.process_path(FIXTURE_DIR, columns=columns)
+        with tempfile.TemporaryDirectory() as tmp:
+            for streaming in (False, True):
+                path = os.path.join(tmp, f"reporte_{streaming}.xlsx")
+                core.export_report(result, path, streaming=streaming, columns=columns)
+                workbook = load_workbook(path, read_only=True)
+                for sheet in ("Invoices", "Nomina"):
+                    header = next(workbook[sheet].iter_rows(max_row=1, values_only=True))
+                    self.assertEqual(list(header), ["UUID", "Nombre Emisor", "Total"])
+                workbook.close()
+
+
+class TestSpooledResult(unittest.TestCase):
+    def test_spooled_result_matches_in_memory(self):
+        memory = core.process_path(FIXTURE_DIR)
+        with tempfile.TemporaryDirectory() as tmp:
+            spooled = core.process_path(FIXTURE_DIR, spool_dir=tmp)
+            self.assertIsInstance(spooled.invoice_data, core.RecordSpool)
+            self.assertEqual(list(spooled.iter_all()), memory.all_parsed_data)
+            self.assertEqual(spooled.record_count, memory.record_count)
+            self.assertEqual(spooled.duplicate_count, memory.duplicate_count)
+            self.assertEqual(core.build_default_filename(spooled.iter_all()),
+                             core.build_default_filename(memory.all_parsed_data))
+
+            sheets = []
+            for result in (memory, spooled):
+                path = os.path.join(tmp, f"reporte_{len(sheets)}.xlsx")
+                core.export_report(result, path, streaming=True, duplicates_sheet=True)
+                workbook = load_workbook(path, read_only=True)
+                sheets.append({ws.title: list(ws.iter_rows(values_only=True))
+                               for ws in workbook.worksheets})
+                workbook.close()
+            spooled.close()
+        self.assertEqual(sheets[0], sheets[1])
+        self.assertLessEqual({"Invoices", "Nomina"}, set(sheets[0]))
+
+
+def timbrado_iso(record):
+    """'DD/MM/AAAA hh:mm:ss' del registro -> 'AAAA-MM-DD'."""
+    day, month, year = record["Fecha Timbrado"][:10].split("/")
+    return f"{year}-{month}-{day}"
+
+
+class TestFilters(unittest.TestCase):
+    def setUp(self):
+        self.full = list(core.process_path(FIXTURE_DIR).iter_all())
+
+    def assert_filter_keeps(self, flt, keep):
+        expected = [r for r in self.full if keep(r)]
+        result = core.process_path(FIXTURE_DIR, filters=flt, workers=0)
+        self.assertEqual(result.all_parsed_data, expected)
+        self.assertEqual(result.error_count, 0)
+        kept = len({r["UUID"] for r in expected})
+        self.assertEqual(result.processed_count, kept)
+        self.assertEqual(result.filtered_count, 13 - kept)
+
+    def test_filters_match_filtering_the_full_result(self):
+        cases = (
+            (build_filter(tipos=["N"]), lambda r: r["CFDI_Type"] == "Nomina"),
+            (build_filter(rfc="xexx010101000"), lambda r: r["RFC Receptor"] == "XEXX010101000"),
+            (build_filter(rfc_emisor="XEXX010101000"), lambda r: False),
+            (build_filter(date_from="2025-02-10", date_to="2025-02-18"),
+             lambda r: "2025-02-10" <= timbrado_iso(r) <= "2025-02-18"),
+            (build_filter(versions=["3.3"]), lambda r: False),
+        )
+        for flt, keep in cases:
+            with self.subTest(filters=flt):
+                self.assert_filter_keeps(flt, keep)
+
+    def test_filtered_files_are_not_parsed(self):
+        with mock.patch.object(core, "parse_xml_file_by_version") as parse:
+            result = core.process_path(FIXTURE_DIR, filters=build_filter(versions=["3.3"]))
+        parse.assert_not_called()
+        self.assertEqual(result.filtered_count, 13)
+
+    def test_zip_members_are_filtered(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with zipfile.ZipFile(os.path.join(tmp, "lote.zip"), "w") as zf:
+                for name in os.listdir(FIXTURE_DIR):
+                    zf.write(os.path.join(FIXTURE_DIR, name), name)
+            result = core.process_path(tmp, filters=build_filter(
+                tipos=["I"], date_to="2025-02-10"))
+        self.assertEqual(result.filtered_count, 9)
+        self.assertEqual({timbrado_iso(r) for r in result.iter_all()},
+                         {"2025-02-05", "2025-02-08", "2025-02-10"})
+
+    def test_variant_changes_with_filters(self):
+        self.assertEqual(core.extraction_variant("full"), "full")
+        flt = build_filter(rfc="XAXX010101000")
+        self.assertNotEqual(core.extraction_variant("full", filters=flt), "full")
+        with self.assertRaises(ValueError):
+            core.process_path(FIXTURE_DIR, cache=mock.Mock(variant="full"), filters=flt)
+
+
+class TestKnownUuids(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.names = sorted(f for f in os.listdir(FIXTURE_DIR) if f.endswith(".xml"))
+        self.known = {core.uuid_from_name(name) for name in self.names[:5]}
+        self.full = list(core.process_path(FIXTURE_DIR).iter_all())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def expected(self):
+        return [r for r in self.full if r["UUID"] not in self.known]
+
+    def test_uuid_from_name(self):
+        self.assertEqual(core.uuid_from_name("a/3b3c422f-5fc5-44a5-a55d-656197f13178@X.xml"),
+                         "3B3C422F-5FC5-44A5-A55D-656197F13178")
+        self.assertIsNone(core.uuid_from_name("factura.xml"))
+
+    def test_known_files_are_not_opened_by_the_parser(self):
+        with mock.patch.object(core, "parse_xml_file_by_version",
+                               wraps=core.parse_xml_file_by_version) as parse:
+            result = core.process_path(FIXTURE_DIR, known_uuids=self.known, workers=1)
+        self.assertEqual(parse.call_count, len(self.names) - 5)
+        self.assertEqual(result.known_count, 5)
+        self.assertEqual(result.all_parsed_data, self.expected())
+
+    def test_known_zip_members_are_not_read_whole(self):
+        with zipfile.ZipFile(os.path.join(self.tmp, "lote.zip"), "w",
+                             zipfile.ZIP_DEFLATED) as zf:
+            for name in self.names[:5]:
+                zf.write(os.path.join(FIXTURE_DIR, name), name)
+        with mock.patch.object(zipfile.ZipFile, "read") as read:
+            result = core.process_path(self.tmp, known_uuids=self.known)
+        read.assert_not_called()
+        self.assertEqual(result.known_count, 5)
+
+    def test_misnamed_file_is_still_parsed(self):
+        # El nombre dice un UUID conocido pero el timbre es de otro CFDI.
+        known_name, other = self.names[0], self.names[-1]
+        shutil.copy(os.path.join(FIXTURE_DIR, other), os.path.join(self.tmp, known_name))
+        result = core.process_path(self.tmp, known_uuids=self.known)
+        self.assertEqual(result.known_count, 0)
+        self.assertEqual(result.processed_count, 1)
+
+    def test_zip_members_are_skipped(self):
+        with zipfile.ZipFile(os.path.join(self.tmp, "lote.zip"), "w") as zf:
+            for name in self.names:
+                zf.write(os.path.join(FIXTURE_DIR, name), f"sub/{name}")
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                result = core.process_path(self.tmp, known_uuids=self.known, workers=workers)
+                self.assertEqual(result.known_count, 5)
+                # El .zip va en orden de nombre, la carpeta en el de os.walk.
+                self.assertEqual(sorted(result.all_parsed_data, key=lambda r: r["UUID"]),
+                                 sorted(self.expected(), key=lambda r: r["UUID"]))
+
+
+class TestDedup(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.names = sorted(f for f in os.listdir(FIXTURE_DIR) if f.endswith(".xml"))
+        for name in self.names:
+            shutil.copy(os.path.join(FIXTURE_DIR, name), self.tmp)
+        # Los primeros 4 otra vez, con otro nombre, en un .zip de una subcarpeta
+        # (os.walk recorre la subcarpeta despues de los archivos sueltos).
+        os.makedirs(os.path.join(self.tmp, "lote"))
+        with zipfile.ZipFile(os.path.join(self.tmp, "lote", "b.zip"), "w") as zf:
+            for i, name in enumerate(self.names[:4]):
+                zf.write(os.path.join(FIXTURE_DIR, name), f"copia_{i}.xml")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_duplicates_are_dropped_and_reported(self):
+        result = core.process_path(self.tmp, workers=2)
+        uuids = [r["UUID"] for r in result.iter_all()]
+        self.assertEqual(len(uuids), len(self.names))
+        self.assertEqual(len(set(uuids)), len(self.names))
+        self.assertEqual(result.duplicate_count, 4)
+        self.assertEqual({d["UUID"] for d in result.duplicates},
+                         {core.uuid_from_name(name) for name in self.names[:4]})
+        self.assertTrue(all(d["Archivo"].startswith(os.path.join(self.tmp, "lote", "b.zip/"))
+                            for d in result.duplicates))
+
+        kept = core.process_path(self.tmp, dedup=False)
+        self.assertEqual(len(kept.all_parsed_data), len(self.names) + 4)
+        self.assertEqual(kept.duplicate_count, 0)
+
+    def test_duplicates_sheet(self):
+        result = core.process_path(self.tmp)
+        for streaming in (False, True):
+            with self.subTest(streaming=streaming):
+                path = os.path.join(self.tmp, f"reporte_{streaming}.xlsx")
+                core.export_report(result, path, streaming=streaming, duplicates_sheet=True)
+                workbook = load_workbook(path, read_only=True)
+                rows = list(workbook["Duplicados"].iter_rows(values_only=True))
+                workbook.close()
+                self.assertEqual(rows[0], ("UUID", "CFDI_Type", "Archivo"))
+                self.assertEqual(len(rows), 5)
+                path = os.path.join(self.tmp, "sin_hoja.xlsx")
+                core.export_report(result, path, streaming=streaming)
+                workbook = load_workbook(path, read_only=True)
+                self.assertNotIn("Duplicados", workbook.sheetnames)
+                workbook.close()
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -0,0 +1,189 @@
+"""
+Pruebas del auto-ajuste de ancho de columnas del exportador (excel_exporter).
+
+Comparan los anchos calculados sobre el DataFrame (valores unicos + .str.len())
+contra el recorrido original celda por celda de openpyxl, con los fixtures de
+XML-Test y con columnas mixtas (texto, numeros, enteros, booleanos y nulos).
+Tambien verifican que el modo streaming (write_only) produzca las mismas
+celdas y anchos que el exportador con pandas, con memoria constante, y que
+ambos partan las hojas en Pagos_2, Pagos_3... al pasar el limite de filas.
+
+Ejecutar con:
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+import unittest
+from unittest import mock
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import core  # noqa: E402
+import excel_exporter  # noqa: E402
+from excel_exporter import (  # noqa: E402
+    _compute_column_widths, export_to_excel, export_to_excel_streaming,
+)
+
+FIXTURE_DIR = os.path.join(REPO_ROOT, "XML-Test")
+
+
+def legacy_widths(df, path):
+    """Recorrido original: escribir y medir cada celda de openpyxl."""
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        df.to_excel(writer, sheet_name="Hoja", index=False)
+        worksheet = writer.sheets["Hoja"]
+        widths = []
+        for i, col in enumerate(df.columns):
+            max_length = len(str(col))
+            for cell in worksheet.iter_cols(min_col=i + 1, max_col=i + 1, min_row=1):
+                for c in cell:
+                    if c.value is not None:
+                        cell_value_str = str(c.value)
+                        if isinstance(c.value, (float, int)):
+                            cell_value_str = f"{c.value:.2f}"
+                        max_length = max(max_length, len(cell_value_str))
+            widths.append(max_length + 2)
+    return widths
+
+
+class TestColumnWidths(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def assert_same_widths(self, df):
+        path = os.path.join(self.tmp.name, "legacy.xlsx")
+        self.assertEqual(_compute_column_widths(df), legacy_widths(df, path))
+
+    def test_fixture_sheets_match_legacy_loop(self):
+        result = core.process_path(FIXTURE_DIR)
+        for data in (result.invoice_data, result.nomina_data):
+            with self.subTest(rows=len(data)):
+                self.assert_same_widths(pd.DataFrame(data))
+
+    def test_mixed_columns_match_legacy_loop(self):
+        df = pd.DataFrame({
+            "Texto": ["a", "", None, "descripcion larga"],
+            "Monto": [1.0, 1234567.891, float("nan"), -3.5],
+            "Entero": [1, 22, 333, 4444],
+            "Mixta": ["", 12.5, None, "X"],
+            "Bandera": [True, False, True, False],
+            "Vacia": [None, None, None, None],
+            "Encabezado muy largo": [1, 2, 3, 4],
+        })
+        self.assert_same_widths(df)
+
+    def test_sample_cap(self):
+        df = pd.DataFrame({"Col": ["x" * 50] + ["y"] * 999})
+        self.assertEqual(_compute_column_widths(df, sample_rows=None), [52])
+        # La muestra es fija (mismo resultado en cada llamada).
+        self.assertEqual(_compute_column_widths(df, sample_rows=10),
+                         _compute_column_widths(df, sample_rows=10))
+
+    def test_export_sets_widths_on_sheets(self):
+        result = core.process_path(FIXTURE_DIR)
+        path = os.path.join(self.tmp.name, "reporte.xlsx")
+        export_to_excel(result.invoice_data, result.nomina_data, [], path)
+        worksheet = load_workbook(path)["Nomina"]
+        df = pd.DataFrame(result.nomina_data).drop(columns=["CFDI_Type"])
+        for i, width in enumerate(_compute_column_widths(df), start=1):
+            self.assertEqual(worksheet.column_dimensions[get_column_letter(i)].width, width)
+
+
+def sheet_snapshot(path):
+    """{hoja: (valores de celdas, anchos de columna)} de un .xlsx."""
+    workbook = load_workbook(path)
+    snapshot = {}
+    for worksheet in workbook.worksheets:
+        values = [list(row) for row in worksheet.iter_rows(values_only=True)]
+        widths = [worksheet.column_dimensions[get_column_letter(i)].width
+                  for i in range(1, worksheet.max_column + 1)]
+        snapshot[worksheet.title] = (values, widths)
+    return snapshot
+
+
+class TestStreamingExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.result = core.process_path(FIXTURE_DIR)
+
+    def test_same_cells_and_widths_as_pandas_export(self):
+        pagos = [{"CFDI_Type": "Pago", "UUID CFDI": "U1", "Monto Pago": 10.5,
+                  "IdDocumento Relacionado": "DOC-1"}]
+        pandas_path = os.path.join(self.tmp.name, "pandas.xlsx")
+        stream_path = os.path.join(self.tmp.name, "stream.xlsx")
+        export_to_excel(self.result.invoice_data, self.result.nomina_data, pagos, pandas_path)
+        written = export_to_excel_streaming(
+            iter(self.result.invoice_data), iter(self.result.nomina_data), iter(pagos),
+            stream_path)
+        self.assertEqual(written, {"Invoices": len(self.result.invoice_data),
+                                   "Nomina": len(self.result.nomina_data), "Pagos": 1})
+        self.assertEqual(sheet_snapshot(stream_path), sheet_snapshot(pandas_path))
+
+    def test_empty_input_writes_nothing(self):
+        path = os.path.join(self.tmp.name, "vacio.xlsx")
+        self.assertEqual(export_to_excel_streaming([], iter(()), None, path), {})
+        self.assertFalse(os.path.exists(path))
+
+    def test_peak_memory_does_not_grow_with_rows(self):
+        rows = self.result.invoice_data
+
+        def peak(n):
+            path = os.path.join(self.tmp.name, f"filas_{n}.xlsx")
+            tracemalloc.start()
+            try:
+                export_to_excel_streaming((rows[i % len(rows)] for i in range(n)), [], [], path)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        with mock.patch.object(excel_exporter, "STREAM_WIDTH_SAMPLE_ROWS", 10):
+            small, large = peak(300), peak(3000)
+        self.assertLess(large, small * 1.5)
+
+
+class TestSheetRollover(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.pagos = [{"CFDI_Type": "Pago", "UUID CFDI": f"U{i}", "Monto Pago": float(i),
+                       "IdDocumento Relacionado": "DOC-" + "X" * (i % 7)}
+                      for i in range(12)]
+
+    def assert_split(self, path):
+        snapshot = sheet_snapshot(path)
+        self.assertEqual(list(snapshot), ["Pagos", "Pagos_2", "Pagos_3"])
+        headers = {tuple(values[0]) for values, _ in snapshot.values()}
+        widths = {tuple(widths) for _, widths in snapshot.values()}
+        self.assertEqual(len(headers), 1)
+        self.assertEqual(len(widths), 1)
+        uuid_col = headers.pop().index("UUID CFDI")
+        uuids = [row[uuid_col] for values, _ in snapshot.values() for row in values[1:]]
+        self.assertEqual(uuids, [p["UUID CFDI"] for p in self.pagos])
+        self.assertEqual([len(values) - 1 for values, _ in snapshot.values()], [5, 5, 2])
+
+    def test_streaming_rolls_over_to_numbered_sheets(self):
+        path = os.path.join(self.tmp.name, "stream.xlsx")
+        with mock.patch.object(excel_exporter, "STREAM_WIDTH_SAMPLE_ROWS", 3):
+            written = export_to_excel_streaming([], [], iter(self.pagos), path,
+                                                max_rows_per_sheet=5)
+        self.assertEqual(written, {"Pagos": 5, "Pagos_2": 5, "Pagos_3": 2})
+        self.assert_split(path)
+
+    def test_pandas_export_rolls_over_to_numbered_sheets(self):
+        path = os.path.join(self.tmp.name, "pandas.xlsx")
+        export_to_excel([], [], self.pagos, path, max_rows_per_sheet=5)
+        self.assert_split(path)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,99 @@
+"""
+Pruebas del plan de extraccion compilado (extraction_plan).
+
+Verifican que cada elemento distinto se busque una sola vez y que los valores
+(y su orden) coincidan con el recorrido fila por fila de las tablas de
+constants.py sobre los fixtures de XML-Test (Invoice y Nomina), y que un plan
+proyectado a una seleccion de columnas solo busque los elementos necesarios.
+
+Ejecutar con:
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import unittest
+import xml.etree.ElementTree as ET
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from constants import (  # noqa: E402
+    NAMESPACES_CFDI_40, CFDI_COMMON_CHILD_ELEMENTS_TO_EXTRACT, NOMINA_FIELDS_TO_EXTRACT,
+)
+from extraction_plan import (  # noqa: E402
+    run_extraction_plan, project_extraction_plan, wants,
+    CFDI_COMMON_CHILD_ELEMENTS_PLAN, NOMINA_FIELDS_PLAN,
+)
+
+FIXTURE_DIR = os.path.join(REPO_ROOT, "XML-Test")
+
+
+def legacy_extract(fields_to_extract, root, ns):
+    """Recorrido anterior: un root.find() por cada fila de la tabla."""
+    values = []
+    for xpath, attr_name, default_val, col_name in fields_to_extract:
+        element = root.find(xpath, ns)
+        if element is not None:
+            value = element.get(attr_name, default_val).strip() if attr_name else \
+                element.text.strip() if element.text is not None else default_val
+        else:
+            value = default_val
+        values.append((col_name, value))
+    return values
+
+
+class CountingRoot:
+    """Envuelve un Element y cuenta las llamadas a find()."""
+
+    def __init__(self, root):
+        self.root = root
+        self.calls = []
+
+    def find(self, xpath, namespaces=None):
+        self.calls.append(xpath)
+        return self.root.find(xpath, namespaces)
+
+
+class TestExtractionPlan(unittest.TestCase):
+    def test_plan_matches_row_by_row_loop(self):
+        for name in sorted(os.listdir(FIXTURE_DIR)):
+            root = ET.parse(os.path.join(FIXTURE_DIR, name)).getroot()
+            with self.subTest(fixture=name):
+                for table, plan in (
+                        (CFDI_COMMON_CHILD_ELEMENTS_TO_EXTRACT, CFDI_COMMON_CHILD_ELEMENTS_PLAN),
+                        (NOMINA_FIELDS_TO_EXTRACT, NOMINA_FIELDS_PLAN)):
+                    self.assertEqual(
+                        list(run_extraction_plan(plan, root, NAMESPACES_CFDI_40)),
+                        legacy_extract(table, root, NAMESPACES_CFDI_40))
+
+    def test_each_distinct_element_is_searched_once(self):
+        name = sorted(os.listdir(FIXTURE_DIR))[0]
+        root = CountingRoot(ET.parse(os.path.join(FIXTURE_DIR, name)).getroot())
+        list(run_extraction_plan(NOMINA_FIELDS_PLAN, root, NAMESPACES_CFDI_40))
+        self.assertEqual(len(root.calls), len(set(root.calls)))
+        self.assertEqual(root.calls.count(".//nomina12:Receptor"), 1)
+        self.assertLess(len(root.calls), len(NOMINA_FIELDS_TO_EXTRACT))
+
+    def test_projected_plan_searches_only_selected_elements(self):
+        name = sorted(os.listdir(FIXTURE_DIR))[0]
+        element = ET.parse(os.path.join(FIXTURE_DIR, name)).getroot()
+        columns = frozenset({"NSS", "SBC", "No existe"})
+        plan = project_extraction_plan(NOMINA_FIELDS_PLAN, columns)
+        self.assertIs(plan, project_extraction_plan(NOMINA_FIELDS_PLAN, columns))
+        self.assertIs(project_extraction_plan(NOMINA_FIELDS_PLAN, None), NOMINA_FIELDS_PLAN)
+
+        root = CountingRoot(element)
+        values = list(run_extraction_plan(plan, root, NAMESPACES_CFDI_40))
+        self.assertEqual(root.calls, [".//nomina12:Receptor"])
+        full = list(run_extraction_plan(NOMINA_FIELDS_PLAN, element, NAMESPACES_CFDI_40))
+        self.assertEqual(values, [(col, value) for col, value in full if col in columns])
+
+    def test_wants(self):
+        self.assertTrue(wants(None, "Total"))
+        self.assertTrue(wants(frozenset({"Total", "UUID"}), "SubTotal", "Total"))
+        self.assertFalse(wants(frozenset({"UUID"}), "SubTotal", "Total"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,200 @@
+"""
+Pruebas del cache de parseo (parse_cache).
+
+Verifican que una segunda corrida sobre la misma carpeta no vuelva a parsear,
+que solo se re-parseen los archivos modificados y que un cambio de version de
+parsers invalide las entradas viejas. Con prune_dirs, las carpetas cuyo mtime
+no cambio no se vuelven a listar: sus archivos salen del manifiesto.
+
+Ejecutar con:
+    python -m unittest discover -s tests
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import core  # noqa: E402
+from pagos_parser_20 import PagoRows  # noqa: E402
+from cfdi_filters import build_filter  # noqa: E402
+from parse_cache import ParseCache, compute_parser_version  # noqa: E402
+
+FIXTURE_DIR = os.path.join(REPO_ROOT, "XML-Test")
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.folder = os.path.join(self.tmp, "xml")
+        os.makedirs(self.folder)
+        for name in sorted(os.listdir(FIXTURE_DIR))[:4]:
+            shutil.copy(os.path.join(FIXTURE_DIR, name), self.folder)
+        with open(os.path.join(self.folder, "otro.xml"), "wb") as f:
+            f.write(b'<?xml version="1.0"?><Otro Version="4.0"/>')
+        self.db_path = os.path.join(self.tmp, "cache.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def run_cached(self, parser_version="v1", profile="full", filters=None):
+        real_parse = core.parse_xml_file_by_version
+        variant = core.extraction_variant(profile, filters=filters)
+        with ParseCache(self.db_path, parser_version=parser_version,
+                        variant=variant) as cache, \
+                mock.patch.object(core, "parse_xml_file_by_version",
+                                  side_effect=real_parse) as spy:
+            result = core.process_path(self.folder, cache=cache, profile=profile,
+                                       filters=filters)
+        return result, spy.call_count
+
+    def test_second_run_is_served_from_cache(self):
+        first, first_calls = self.run_cached()
+        second, second_calls = self.run_cached()
+        self.assertEqual(first_calls, 4)
+        self.assertEqual(second_calls, 0)
+        self.assertEqual(second.all_parsed_data, first.all_parsed_data)
+        self.assertEqual(second.all_parsed_data, core.process_path(self.folder).all_parsed_data)
+        self.assertEqual(second.error_count, first.error_count)
+        self.assertEqual(second.error_count, 1)
+
+    def test_only_changed_files_are_reparsed(self):
+        self.run_cached()
+        changed = os.path.join(self.folder, sorted(os.listdir(self.folder))[0])
+        st = os.stat(changed)
+        os.utime(changed, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        _, calls = self.run_cached()
+        self.assertEqual(calls, 1)
+
+    def test_pago_rows_are_stored_as_records(self):
+        path = os.path.join(self.folder, "otro.xml")
+        rows = PagoRows({"CFDI_Type": "Pago", "UUID CFDI": "P1"},
+                        [({"FechaPago": "x"}, {"ImpPagado": 1.0}),
+                         ({"FechaPago": "x"}, {"ImpPagado": 2.0})])
+        with ParseCache(self.db_path) as cache:
+            cache.load([path])
+            cache.store(path, [core.TargetEntry("otro.xml", "", rows)])
+            cache.flush()
+            entries = cache.load([path])[path]
+        self.assertEqual(entries[0].records, list(rows))
+
+    def test_variants_keep_their_own_rows(self):
+        # Una corrida filtrada o "lean" no debe borrar las filas de la completa.
+        filters = build_filter(versions=["4.0"])
+        self.assertEqual(self.run_cached()[1], 4)
+        self.assertEqual(self.run_cached(filters=filters)[1], 4)
+        self.assertEqual(self.run_cached(profile="lean")[1], 4)
+        plain, calls = self.run_cached()
+        self.assertEqual(calls, 0)
+        self.assertEqual(plain.all_parsed_data, core.process_path(self.folder).all_parsed_data)
+        self.assertEqual(self.run_cached(filters=filters)[1], 0)
+        self.assertEqual(self.run_cached(profile="lean")[1], 0)
+        # Otra version de parsers si invalida todas las variantes.
+        self.assertEqual(self.run_cached(parser_version="v2", profile="lean")[1], 4)
+        self.assertEqual(self.run_cached(parser_version="v2")[1], 4)
+
+    def test_cache_without_variant_column_is_rebuilt(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE parse_cache (path TEXT PRIMARY KEY, size INTEGER,"
+                     " mtime_ns INTEGER, parser_version TEXT, payload TEXT)")
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.run_cached()[1], 4)
+        self.assertEqual(self.run_cached()[1], 0)
+
+    def test_parser_version_change_invalidates(self):
+        self.run_cached(parser_version="v1")
+        _, calls = self.run_cached(parser_version="v2")
+        self.assertEqual(calls, 4)
+
+    def test_clear_forces_full_reparse(self):
+        self.run_cached()
+        with ParseCache(self.db_path, parser_version="v1") as cache:
+            cache.clear()
+        _, calls = self.run_cached()
+        self.assertEqual(calls, 4)
+
+    def test_default_version_tracks_parser_sources(self):
+        version = compute_parser_version()
+        self.assertEqual(version, compute_parser_version())
+        self.assertNotEqual(version, compute_parser_version(("constants.py",)))
+
+
+class TestDirManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.folder = os.path.join(self.tmp, "XAXX010101000")
+        self.names = sorted(f for f in os.listdir(FIXTURE_DIR) if f.endswith(".xml"))
+        self.months = {}
+        for month, names in (("01", self.names[:4]), ("02", self.names[4:8])):
+            path = os.path.join(self.folder, "2024", month)
+            os.makedirs(path)
+            for name in names:
+                shutil.copy(os.path.join(FIXTURE_DIR, name), path)
+            self.months[month] = path
+        # Carpetas "cerradas": modificadas hace una hora.
+        old = (os.stat(self.folder).st_mtime_ns - 3600 * 10 ** 9,) * 2
+        for root, _, _ in os.walk(self.folder):
+            os.utime(root, ns=old)
+        self.db_path = os.path.join(self.tmp, "cache.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def run_pruned(self):
+        real_parse, real_scandir = core.parse_xml_file_by_version, os.scandir
+        listed = []
+
+        def scandir(path):
+            listed.append(os.path.relpath(path, self.folder))
+            return real_scandir(path)
+
+        with ParseCache(self.db_path, parser_version="v1") as cache, \
+                mock.patch.object(core, "parse_xml_file_by_version",
+                                  side_effect=real_parse) as spy, \
+                mock.patch.object(os, "scandir", scandir):
+            result = core.process_path(self.folder, cache=cache, prune_dirs=True)
+        return result, spy.call_count, listed
+
+    def test_unchanged_folders_are_not_listed(self):
+        first, first_calls, first_listed = self.run_pruned()
+        self.assertEqual(first_calls, 8)
+        self.assertEqual(len(first_listed), 4)
+
+        second, second_calls, second_listed = self.run_pruned()
+        self.assertEqual((second_calls, second_listed), (0, []))
+        self.assertEqual(second.all_parsed_data, first.all_parsed_data)
+        self.assertEqual(second.all_parsed_data, core.process_path(self.folder).all_parsed_data)
+
+        # Llega un CFDI al mes en curso: solo esa carpeta se lista y se parsea.
+        shutil.copy(os.path.join(FIXTURE_DIR, self.names[8]), self.months["02"])
+        third, third_calls, third_listed = self.run_pruned()
+        self.assertEqual((third_calls, third_listed), (1, [os.path.join("2024", "02")]))
+        self.assertEqual(third.all_parsed_data, core.process_path(self.folder).all_parsed_data)
+
+    def test_manifest_contents_and_clear(self):
+        self.run_pruned()
+        with ParseCache(self.db_path, parser_version="v1") as cache:
+            manifest = cache.load_manifest()
+            month = manifest[os.path.abspath(self.months["01"])]
+            self.assertEqual(month.files, tuple(os.listdir(self.months["01"])))
+            self.assertEqual(month.entry_count, 4)
+            self.assertEqual(month.total_size, sum(
+                os.path.getsize(os.path.join(self.months["01"], name)) for name in month.files))
+            self.assertEqual(manifest[os.path.abspath(self.folder)].subfolders, ("2024",))
+            cache.clear()
+            self.assertEqual(cache.load_manifest(), {})
+
+    def test_requires_cache(self):
+        with self.assertRaises(ValueError):
+            core.process_path(self.folder, prune_dirs=True)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
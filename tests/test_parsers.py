@@ -15,7 +15,8 @@ para no acoplar las pruebas a Tkinter / la UI.
 NOTA DE COBERTURA: los fixtures en XML-Test/ son todos CFDI 4.0
 (Invoice y Nomina). Aun NO hay fixtures de CFDI 3.3 ni de Pagos 2.0,
 asi que esos parsers no estan cubiertos. Agregar fixtures cuando se
-tengan XMLs de muestra (anonimizados) de esas variantes.
+tengan XMLs de muestra (anonimizados) de esas variantes. La expansion de
+Pagos por DoctoRelacionado se prueba con un XML sintetico (TestPagosExpansion).
 """
 import os
 import sys
@@ -29,22 +30,23 @@ if REPO_ROOT not in sys.path:
 
 from xml_parser_40 import parse_cfdi_40_invoice  # noqa: E402
 from xml_parser_33 import parse_cfdi_33_invoice  # noqa: E402
-from pagos_parser_20 import parse_cfdi_pago_20    # noqa: E402
+from pagos_parser_20 import PagoRows, parse_cfdi_pago_20  # noqa: E402
+from constants import PAGOS_COLUMN_ORDER          # noqa: E402
 
 FIXTURE_DIR = os.path.join(REPO_ROOT, "XML-Test")
 
 
 def dispatch(xml_file_path):
-    """Replica main.parse_xml_file_by_version sin importar la UI."""
+    """Replica core.parse_xml_file_by_version sin importar la UI."""
     root = ET.parse(xml_file_path).getroot()
     version = root.get("Version")
     tipo = root.get("TipoDeComprobante")
     if tipo == "P" and version == "4.0":
-        return parse_cfdi_pago_20(xml_file_path)
+        return parse_cfdi_pago_20(xml_file_path, root=root)
     if version == "3.3":
-        return parse_cfdi_33_invoice(xml_file_path)
+        return parse_cfdi_33_invoice(xml_file_path, root=root)
     if version == "4.0":
-        return parse_cfdi_40_invoice(xml_file_path)
+        return parse_cfdi_40_invoice(xml_file_path, root=root)
     return None
 
 
@@ -114,5 +116,91 @@ class TestCfdi40Parsing(unittest.TestCase):
                 )
 
 
+class TestPreParsedRoot(unittest.TestCase):
+    """Pasar el arbol ya parseado debe dar exactamente lo mismo que la ruta."""
+
+    def test_root_argument_matches_path_parsing(self):
+        for path in all_fixtures():
+            root = ET.parse(path).getroot()
+            if root.get("TipoDeComprobante") == "P":
+                continue
+            with self.subTest(fixture=os.path.basename(path)):
+                self.assertEqual(parse_cfdi_40_invoice(path, root=root),
+                                 parse_cfdi_40_invoice(path))
+
+
+def _docto(id_documento, pagado, taxes=""):
+    return (f'<pago20:DoctoRelacionado IdDocumento="{id_documento}" MonedaDR="MXN" '
+            f'NumParcialidad="1" ImpSaldoAnt="{pagado}" ImpPagado="{pagado}" '
+            f'ImpSaldoInsoluto="0" ObjetoImpDR="02">{taxes}</pago20:DoctoRelacionado>')
+
+
+MULTI_PAGO_XML = (
+    '<cfdi:Comprobante xmlns:cfdi="http://www.sat.gob.mx/cfd/4" '
+    'xmlns:pago20="http://www.sat.gob.mx/Pagos20" Version="4.0" '
+    'Fecha="2024-01-02T03:04:05" TipoDeComprobante="P" LugarExpedicion="44100">'
+    '<cfdi:Emisor Rfc="EEE010101AAA" Nombre="Emisor" RegimenFiscal="601"/>'
+    '<cfdi:Receptor Rfc="RRR010101BBB" Nombre="Receptor" UsoCFDI="CP01"/>'
+    '<cfdi:Complemento><pago20:Pagos Version="2.0"><pago20:Totales MontoTotalPagos="300"/>'
+    '<pago20:Pago FechaPago="2024-01-02T00:00:00" FormaDePagoP="03" MonedaP="MXN" Monto="200">'
+    + _docto("DOC-1", "116", '<pago20:ImpuestosDR><pago20:TrasladosDR><pago20:TrasladoDR '
+             'BaseDR="100" ImpuestoDR="002" TipoFactorDR="Tasa" TasaOCuotaDR="0.160000" '
+             'ImporteDR="16"/></pago20:TrasladosDR></pago20:ImpuestosDR>')
+    + _docto("DOC-2", "84") +
+    '</pago20:Pago>'
+    '<pago20:Pago FechaPago="2024-02-03T00:00:00" FormaDePagoP="01" MonedaP="MXN" Monto="100">'
+    + _docto("DOC-3", "100") +
+    '</pago20:Pago></pago20:Pagos>'
+    '<tfd:TimbreFiscalDigital xmlns:tfd="http://www.sat.gob.mx/TimbreFiscalDigital" '
+    'UUID="00000000-0000-0000-0000-000000000003" FechaTimbrado="2024-03-01T09:00:00"/>'
+    '</cfdi:Complemento></cfdi:Comprobante>'
+)
+
+
+class TestPagosExpansion(unittest.TestCase):
+    """Una fila por DoctoRelacionado: encabezado comun + datos de su Pago y su DR."""
+
+    def setUp(self):
+        self.rows = parse_cfdi_pago_20("pago.xml", root=ET.fromstring(MULTI_PAGO_XML))
+
+    def test_one_independent_row_per_docto(self):
+        rows = self.rows
+        self.assertEqual([r["IdDocumento Relacionado"] for r in rows],
+                         ["DOC-1", "DOC-2", "DOC-3"])
+        self.assertEqual([r["Monto Pago"] for r in rows], [200.0, 200.0, 100.0])
+        self.assertEqual([r["FechaPago"] for r in rows],
+                         ["02/01/2024 00:00:00", "02/01/2024 00:00:00", "03/02/2024 00:00:00"])
+        self.assertEqual([r["FormaDePagoP"][:2] for r in rows], ["03", "03", "01"])
+        # Los impuestos de un DR no se arrastran al siguiente.
+        self.assertEqual([r["IVA 16 Importe"] for r in rows], [16.0, 0.0, 0.0])
+        self.assertTrue(all(r["UUID CFDI"] == "00000000-0000-0000-0000-000000000003"
+                            for r in rows))
+        # Mismas llaves y en el orden de PAGOS_COLUMN_ORDER; dicts independientes.
+        self.assertEqual(list(rows[0])[:len(PAGOS_COLUMN_ORDER)], PAGOS_COLUMN_ORDER)
+        self.assertTrue(all(list(r) == list(rows[0]) for r in rows))
+        rows[0]["Monto Pago"] = -1
+        self.assertEqual(rows[1]["Monto Pago"], 200.0)
+
+    def test_rows_share_one_header(self):
+        # Sin copias por DR: un encabezado y un (delta del Pago, delta del DR)
+        # por fila; el delta de un Pago es el mismo objeto para sus DR.
+        rows = self.rows
+        self.assertIsInstance(rows, PagoRows)
+        self.assertEqual(len(rows.deltas), 3)
+        self.assertIs(rows.deltas[0][0], rows.deltas[1][0])
+        self.assertNotIn("UUID CFDI", rows.deltas[0][0])
+        self.assertNotIn("UUID CFDI", rows.deltas[0][1])
+        self.assertEqual(rows[-1], list(rows)[-1])
+        self.assertEqual(rows[1:], list(rows)[1:])
+
+    def test_column_selection_matches_filtered_rows(self):
+        columns = frozenset({"CFDI_Type", "UUID CFDI", "ImpPagado", "IVA 16 Base",
+                             "FechaPago", "Nombre Emisor CFDI"})
+        projected = parse_cfdi_pago_20("pago.xml", root=ET.fromstring(MULTI_PAGO_XML),
+                                       columns=columns)
+        self.assertEqual([list(r.items()) for r in projected],
+                         [[(k, v) for k, v in r.items() if k in columns] for r in self.rows])
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
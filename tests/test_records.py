@@ -0,0 +1,111 @@
+"""
+Pruebas del almacen columnar (records.RecordTable) y de ProcessResult.
+
+Verifican que los registros regresen identicos (llaves, orden y valores,
+incluidas llaves faltantes y columnas que solo tienen None), que to_dataframe()
+de el mismo DataFrame que pandas con la lista de dicts, y que ProcessResult
+reparta por CFDI_Type conservando el orden original en all_parsed_data.
+RecordSpool (en disco) debe regresar los mismos registros, varias veces.
+
+Ejecutar con:
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from decimal import Decimal
+
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import core  # noqa: E402
+from records import RecordSpool, RecordTable  # noqa: E402
+
+FIXTURE_DIR = os.path.join(REPO_ROOT, "XML-Test")
+
+RECORDS = [
+    {"CFDI_Type": "Invoice", "UUID": "U1", "Total": 10.5, "Notas": None},
+    {"CFDI_Type": "Invoice", "UUID": "U2", "Total": None, "Notas": None},
+    {"UUID": "U3", "CFDI_Type": "Invoice", "Extra": 3},
+    {"CFDI_Type": "Invoice", "UUID": "U4", "Total": 1.0, "Notas": "hola"},
+]
+
+
+class TestRecordTable(unittest.TestCase):
+    def test_records_round_trip(self):
+        table = RecordTable(RECORDS)
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table, RECORDS)
+        for original, restored in zip(RECORDS, table):
+            self.assertEqual(list(restored.items()), list(original.items()))
+        self.assertEqual(table[-1], RECORDS[-1])
+        self.assertEqual(table[1:3], RECORDS[1:3])
+        with self.assertRaises(IndexError):
+            table[4]
+
+    def test_all_none_columns_are_not_stored(self):
+        table = RecordTable(RECORDS[:2])
+        self.assertIsNone(table._columns["Notas"])
+        self.assertEqual(table.column("Notas"), [None, None])
+        self.assertEqual(table.columns, ["CFDI_Type", "UUID", "Total", "Notas"])
+
+    def test_dataframe_matches_pandas_from_dicts(self):
+        table = RecordTable(RECORDS)
+        columns = ["UUID", "Total", "Extra", "Notas"]
+        expected = pd.DataFrame(RECORDS).reindex(columns=columns)
+        actual = table.to_dataframe(columns)
+        self.assertEqual(list(actual.columns), columns)
+        self.assertEqual(actual["Total"].dtype, expected["Total"].dtype)
+        self.assertEqual(actual.isna().values.tolist(), expected.isna().values.tolist())
+        self.assertEqual(actual.fillna("").values.tolist(),
+                         expected.fillna("").values.tolist())
+        self.assertEqual(list(table.iter_rows(["UUID", "Falta"]))[2], ["U3", None])
+
+
+class TestRecordSpool(unittest.TestCase):
+    def test_records_round_trip_and_reiterate(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            spool = RecordSpool(os.path.join(tmp, "registros.spool"))
+            spool.extend(RECORDS)
+            self.assertEqual(len(spool), len(RECORDS))
+            self.assertEqual(list(spool), RECORDS)
+            self.assertEqual([list(r) for r in spool], [list(r) for r in RECORDS])
+            spool.append({"UUID": "U5", "Total": Decimal("1.10")})
+            spool.close()
+            self.assertEqual(list(spool)[-1], {"UUID": "U5", "Total": Decimal("1.10")})
+            self.assertEqual(spool.columns, RecordTable(list(spool)).columns)
+
+
+class TestProcessResult(unittest.TestCase):
+    def test_buckets_by_type_and_keeps_order(self):
+        records = [
+            {"CFDI_Type": "Pago", "UUID CFDI": "P1"},
+            {"CFDI_Type": "Invoice", "UUID": "U1"},
+            {"CFDI_Type": "Otro", "UUID": "X1"},
+            {"CFDI_Type": "Nomina", "UUID": "N1"},
+            {"CFDI_Type": "Pago", "UUID CFDI": "P1"},
+        ]
+        result = core.ProcessResult()
+        self.assertFalse(result.has_data)
+        result.extend(records)
+        self.assertTrue(result.has_data)
+        self.assertEqual(result.all_parsed_data, records)
+        self.assertEqual(len(result.pagos_data), 2)
+        self.assertEqual(result.invoice_data, [records[1]])
+        self.assertEqual(result.nomina_data, [records[3]])
+
+    def test_fixtures_match_list_of_dicts(self):
+        result = core.process_path(FIXTURE_DIR)
+        records = result.all_parsed_data
+        self.assertEqual(result.invoice_data,
+                         [r for r in records if r["CFDI_Type"] == "Invoice"])
+        self.assertEqual(result.nomina_data,
+                         [r for r in records if r["CFDI_Type"] == "Nomina"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,139 @@
+"""
+Pruebas del detector de encabezado (cfdi_sniffer).
+
+Verifican que la version/tipo se obtengan leyendo solo el inicio del archivo,
+que coincidan con el parseo completo y que core descarte lo que no es un CFDI
+soportado sin construir el arbol; y que los RFC de Emisor/Receptor y el
+UUID/FechaTimbrado del timbre coincidan con lo que extrae el parser.
+
+Ejecutar con:
+    python -m unittest discover -s tests
+"""
+import io
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+import xml.etree.ElementTree as ET
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import core  # noqa: E402
+from cfdi_sniffer import sniff_cfdi_header, sniff_timbre, SNIFF_MAX_BYTES  # noqa: E402
+
+FIXTURE_DIR = os.path.join(REPO_ROOT, "XML-Test")
+
+
+def all_fixtures():
+    return sorted(
+        os.path.join(FIXTURE_DIR, f)
+        for f in os.listdir(FIXTURE_DIR)
+        if f.lower().endswith(".xml")
+    )
+
+
+class TestSniffHeader(unittest.TestCase):
+    def test_matches_full_parse_on_fixtures(self):
+        for path in all_fixtures():
+            root = ET.parse(path).getroot()
+            with self.subTest(fixture=os.path.basename(path)):
+                header = sniff_cfdi_header(path)
+                self.assertIsNotNone(header)
+                self.assertTrue(header.is_cfdi)
+                self.assertEqual(header.version, root.get("Version"))
+                self.assertEqual(header.tipo, root.get("TipoDeComprobante"))
+                self.assertIn("cfdi", header.namespaces)
+
+    def test_accepts_bytes_and_file_objects(self):
+        path = all_fixtures()[0]
+        with open(path, "rb") as f:
+            raw = f.read()
+        self.assertEqual(sniff_cfdi_header(raw), sniff_cfdi_header(path))
+        self.assertEqual(sniff_cfdi_header(io.BytesIO(raw)), sniff_cfdi_header(path))
+
+    def test_only_reads_the_head(self):
+        # Todo lo que sigue al nodo raiz esta truncado/corrupto: si el detector
+        # leyera el archivo completo fallaria.
+        path = all_fixtures()[0]
+        with open(path, "rb") as f:
+            raw = f.read()
+        head = raw[:raw.index(b"<cfdi:Emisor")]
+        header = sniff_cfdi_header(head + b"<<<basura" * 100000)
+        self.assertIsNotNone(header)
+        self.assertEqual(header.version, "4.0")
+
+    def test_non_cfdi_and_garbage(self):
+        other = sniff_cfdi_header(b'<?xml version="1.0"?><Otro Version="4.0"/>')
+        self.assertFalse(other.is_cfdi)
+        self.assertIsNone(sniff_cfdi_header(b"esto no es xml"))
+        self.assertIsNone(sniff_cfdi_header(b"<!-- " + b"x" * (SNIFF_MAX_BYTES + 10)))
+
+
+class TestSniffPartiesAndTimbre(unittest.TestCase):
+    def test_matches_full_parse_on_fixtures(self):
+        records = {r["UUID"]: r for r in core.process_path(FIXTURE_DIR).iter_all()}
+        for path in all_fixtures():
+            with self.subTest(fixture=os.path.basename(path)):
+                header = sniff_cfdi_header(path, parties=True)
+                timbre = sniff_timbre(path)
+                record = records[timbre.uuid]
+                self.assertEqual(header.rfc_emisor, record["RFC Emisor"])
+                self.assertEqual(header.rfc_receptor, record["RFC Receptor"])
+                self.assertEqual(timbre.uuid, record["UUID"])
+                # El registro la trae como DD/MM/AAAA hh:mm:ss.
+                date, time = timbre.fecha_timbrado.split("T")
+                self.assertEqual("/".join(reversed(date.split("-"))) + " " + time,
+                                 record["Fecha Timbrado"])
+                # Sin parties el encabezado no trae RFCs.
+                self.assertIsNone(sniff_cfdi_header(path).rfc_emisor)
+
+    def test_parties_stop_at_conceptos(self):
+        path = all_fixtures()[0]
+        with open(path, "rb") as f:
+            raw = f.read()
+        head = raw[:raw.index(b"<cfdi:Conceptos")]
+        header = sniff_cfdi_header(head + b"<cfdi:Conceptos><<<basura", parties=True)
+        self.assertEqual(header.rfc_emisor, "XAXX010101000")
+
+    def test_timbre_missing(self):
+        self.assertIsNone(sniff_timbre(b'<cfdi:Comprobante Version="4.0"/>'))
+
+    def test_zip_member_tail_and_addenda_fallback(self):
+        path = all_fixtures()[0]
+        with open(path, "rb") as f:
+            raw = f.read()
+        # Addenda mas grande que la cola despues del Complemento.
+        end = raw.rindex(b"</cfdi:Comprobante>")
+        padded = raw[:end] + b"<cfdi:Addenda>" + b"x" * 20000 + b"</cfdi:Addenda>" + raw[end:]
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("a.xml", raw)
+            zf.writestr("b.xml", padded)
+        with zipfile.ZipFile(buffer) as zf:
+            for info in zf.infolist():
+                with self.subTest(member=info.filename), zf.open(info) as member:
+                    self.assertEqual(sniff_timbre(member, size=info.file_size),
+                                     sniff_timbre(path))
+
+
+class TestProcessPathPrefilter(unittest.TestCase):
+    def test_unsupported_files_never_reach_the_full_parser(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "otro.xml"), "wb") as f:
+                f.write(b'<?xml version="1.0"?><Otro Version="4.0"><x/></Otro>')
+            with open(os.path.join(tmp, "cfdi32.xml"), "wb") as f:
+                f.write(b'<cfdi:Comprobante xmlns:cfdi="http://www.sat.gob.mx/cfd/3" '
+                        b'version="3.2"/>')
+            with mock.patch.object(core, "parse_xml_file_by_version") as parse:
+                result = core.process_path(tmp)
+        parse.assert_not_called()
+        self.assertEqual(result.error_count, 2)
+        self.assertFalse(result.has_data)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,159 @@
+"""
+Pruebas de las tablas de impuestos (tax_buckets).
+
+Verifican la busqueda por (Impuesto, TipoFactor, TasaOCuota) con comodines,
+que las tablas de Pagos se deriven completas de PAGO_DR_TAX_FIELDS y que las
+tasas desconocidas caigan en la columna "No Clasificados" en lugar de perderse.
+
+Ejecutar con:
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from constants import (  # noqa: E402
+    PAGO_DR_TAX_FIELDS, INVOICE_TRASLADO_TAX_BUCKETS, INVOICE_RETENCION_TAX_BUCKETS,
+    UNCLASSIFIED_TAX_COLUMN, PAGO_DR_UNCLASSIFIED_TAX_COLUMN,
+)
+from tax_buckets import (  # noqa: E402
+    lookup_tax_buckets, PAGO_DR_TRASLADO_BUCKETS, PAGO_DR_RETENCION_BUCKETS,
+)
+from xml_parser_40 import parse_cfdi_40_invoice  # noqa: E402
+from pagos_parser_20 import parse_cfdi_pago_20  # noqa: E402
+
+
+INVOICE_XML = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<cfdi:Comprobante xmlns:cfdi="http://www.sat.gob.mx/cfd/4" Version="4.0" '
+    'Fecha="2024-01-02T03:04:05" SubTotal="300" Total="348" TipoDeComprobante="I" '
+    'Moneda="MXN" LugarExpedicion="44100">'
+    '<cfdi:Emisor Rfc="EEE010101AAA" Nombre="Emisor" RegimenFiscal="601"/>'
+    '<cfdi:Receptor Rfc="RRR010101BBB" Nombre="Receptor" UsoCFDI="G03"/>'
+    '<cfdi:Conceptos>'
+    '<cfdi:Concepto ClaveProdServ="43211500" Descripcion="A" Importe="100"><cfdi:Impuestos>'
+    '<cfdi:Traslados>'
+    '<cfdi:Traslado Base="100" Impuesto="002" TipoFactor="Tasa" TasaOCuota="0.160000" Importe="16"/>'
+    '<cfdi:Traslado Base="100" Impuesto="003" TipoFactor="Tasa" TasaOCuota="0.070000" Importe="7"/>'
+    '<cfdi:Traslado Base="100" Impuesto="003" TipoFactor="Tasa" TasaOCuota="0.250000" Importe="25"/>'
+    '<cfdi:Traslado Base="100" Impuesto="002" TipoFactor="Exento"/>'
+    '<cfdi:Traslado Base="100" Impuesto="002" TipoFactor="Tasa" TasaOCuota="0.110000" Importe="11"/>'
+    '</cfdi:Traslados><cfdi:Retenciones>'
+    '<cfdi:Retencion Base="100" Impuesto="002" TipoFactor="Tasa" TasaOCuota="0.060000" Importe="6"/>'
+    '<cfdi:Retencion Base="100" Impuesto="001" TipoFactor="Tasa" TasaOCuota="0.100000" Importe="10"/>'
+    '<cfdi:Retencion Base="100" Impuesto="004" TipoFactor="Tasa" TasaOCuota="0.010000" Importe="1"/>'
+    '</cfdi:Retenciones></cfdi:Impuestos></cfdi:Concepto>'
+    '</cfdi:Conceptos>'
+    '<cfdi:Complemento><tfd:TimbreFiscalDigital xmlns:tfd="http://www.sat.gob.mx/TimbreFiscalDigital" '
+    'UUID="00000000-0000-0000-0000-000000000001" FechaTimbrado="2024-01-02T03:05:00"/>'
+    '</cfdi:Complemento></cfdi:Comprobante>'
+)
+
+PAGO_XML = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<cfdi:Comprobante xmlns:cfdi="http://www.sat.gob.mx/cfd/4" '
+    'xmlns:pago20="http://www.sat.gob.mx/Pagos20" Version="4.0" '
+    'Fecha="2024-01-02T03:04:05" SubTotal="0" Total="0" TipoDeComprobante="P" '
+    'Moneda="XXX" LugarExpedicion="44100">'
+    '<cfdi:Emisor Rfc="EEE010101AAA" Nombre="Emisor" RegimenFiscal="601"/>'
+    '<cfdi:Receptor Rfc="RRR010101BBB" Nombre="Receptor" UsoCFDI="CP01"/>'
+    '<cfdi:Complemento><pago20:Pagos Version="2.0"><pago20:Totales MontoTotalPagos="116"/>'
+    '<pago20:Pago FechaPago="2024-01-02T00:00:00" FormaDePagoP="03" MonedaP="MXN" Monto="116">'
+    '<pago20:DoctoRelacionado IdDocumento="AAAAAAAA-0000-0000-0000-000000000000" '
+    'MonedaDR="MXN" NumParcialidad="1" ImpSaldoAnt="116" ImpPagado="116" ImpSaldoInsoluto="0" '
+    'ObjetoImpDR="02"><pago20:ImpuestosDR><pago20:TrasladosDR>'
+    '<pago20:TrasladoDR BaseDR="100" ImpuestoDR="002" TipoFactorDR="Tasa" TasaOCuotaDR="0.160000" ImporteDR="16"/>'
+    '<pago20:TrasladoDR BaseDR="100" ImpuestoDR="003" TipoFactorDR="Tasa" TasaOCuotaDR="0.500000" ImporteDR="50"/>'
+    '<pago20:TrasladoDR BaseDR="40" ImpuestoDR="002" TipoFactorDR="Exento"/>'
+    '<pago20:TrasladoDR BaseDR="100" ImpuestoDR="002" TipoFactorDR="Tasa" TasaOCuotaDR="0.110000" ImporteDR="11"/>'
+    '</pago20:TrasladosDR><pago20:RetencionesDR>'
+    '<pago20:RetencionDR BaseDR="100" ImpuestoDR="001" TipoFactorDR="Tasa" TasaOCuotaDR="0.350000" ImporteDR="35"/>'
+    '</pago20:RetencionesDR></pago20:ImpuestosDR></pago20:DoctoRelacionado>'
+    '</pago20:Pago></pago20:Pagos>'
+    '<tfd:TimbreFiscalDigital xmlns:tfd="http://www.sat.gob.mx/TimbreFiscalDigital" '
+    'UUID="00000000-0000-0000-0000-000000000002" FechaTimbrado="2024-01-02T03:05:00"/>'
+    '</cfdi:Complemento></cfdi:Comprobante>'
+)
+
+
+def write_temp(tmp, name, content):
+    path = os.path.join(tmp, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+class TestLookup(unittest.TestCase):
+    def test_exact_key_wins_over_wildcards(self):
+        self.assertEqual(
+            lookup_tax_buckets(INVOICE_TRASLADO_TAX_BUCKETS, "003", "Tasa", "0.070000"),
+            ("Total IEPS", "IEPS 7%"))
+        self.assertEqual(
+            lookup_tax_buckets(INVOICE_TRASLADO_TAX_BUCKETS, "003", "Tasa", "0.250000"),
+            ("Total IEPS", UNCLASSIFIED_TAX_COLUMN))
+        self.assertEqual(
+            lookup_tax_buckets(INVOICE_RETENCION_TAX_BUCKETS, "002", "Tasa", "0.060000"),
+            ("Retenido IVA", "IVA Ret 6%"))
+        self.assertEqual(
+            lookup_tax_buckets(INVOICE_RETENCION_TAX_BUCKETS, "002", "Tasa", "0.106667"),
+            ("Retenido IVA",))
+
+    def test_unknown_lines_return_none(self):
+        self.assertIsNone(
+            lookup_tax_buckets(INVOICE_TRASLADO_TAX_BUCKETS, "002", "Tasa", "0.110000"))
+        self.assertIsNone(
+            lookup_tax_buckets(INVOICE_TRASLADO_TAX_BUCKETS, "003", "Cuota", "5.000000"))
+        self.assertIsNone(
+            lookup_tax_buckets(PAGO_DR_RETENCION_BUCKETS, "001", "Tasa", "0.350000"))
+
+    def test_pago_tables_cover_every_tax_field(self):
+        columns = [
+            col
+            for table in (PAGO_DR_TRASLADO_BUCKETS, PAGO_DR_RETENCION_BUCKETS)
+            for pairs in table.values()
+            for col, _ in pairs
+        ]
+        self.assertCountEqual(columns, PAGO_DR_TAX_FIELDS.keys())
+        self.assertEqual(
+            PAGO_DR_TRASLADO_BUCKETS[("002", "Tasa", "0.160000")],
+            (("IVA 16 Base", "Base"), ("IVA 16 Importe", "Importe")))
+        self.assertEqual(
+            PAGO_DR_TRASLADO_BUCKETS[("002", "Exento", None)],
+            (("IVA Excento", "Importe"), ("IVA Excento Base", "Base")))
+
+
+class TestParsersUseBuckets(unittest.TestCase):
+    def test_invoice_unknown_rates_are_unclassified(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            data = parse_cfdi_40_invoice(write_temp(tmp, "inv.xml", INVOICE_XML))
+        self.assertEqual(data["IVA 16%"], 16.0)
+        self.assertEqual(data["IEPS 7%"], 7.0)
+        self.assertEqual(data["Total IEPS"], 32.0)
+        self.assertEqual(data["Retenido IVA"], 6.0)
+        self.assertEqual(data["IVA Ret 6%"], 6.0)
+        self.assertEqual(data["Retenido ISR"], 10.0)
+        # IVA 11% (traslado) + IEPS 25% (tasa no listada; tambien suma a
+        # Total IEPS) + impuesto 004 (retencion)
+        self.assertEqual(data[UNCLASSIFIED_TAX_COLUMN], 37.0)
+
+    def test_pago_dr_derived_buckets(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            rows = parse_cfdi_pago_20(write_temp(tmp, "pago.xml", PAGO_XML))
+        self.assertEqual(len(rows), 1)
+        row = rows[0]
+        self.assertEqual(row["IVA 16 Base"], 100.0)
+        self.assertEqual(row["IVA 16 Importe"], 16.0)
+        self.assertEqual(row["IEPS 50 Base"], 100.0)
+        self.assertEqual(row["IEPS 50 Importe"], 50.0)
+        self.assertEqual(row["IVA Excento Base"], 40.0)
+        # IVA 11% + ISR retenido 35%
+        self.assertEqual(row[PAGO_DR_UNCLASSIFIED_TAX_COLUMN], 46.0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
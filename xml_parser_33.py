@@ -7,9 +7,15 @@ from datetime import datetime
 from constants import (
     NAMESPACES_CFDI_33, TIPO_COMPROBANTE_MAP, FORMA_PAGO_MAP, METODO_PAGO_MAP,
     USO_CFDI_MAP, REGIMEN_FISCAL_RECEPTOR_MAP, INVOICE_COLUMN_ORDER,
-    CFDI_COMMON_CHILD_ELEMENTS_TO_EXTRACT, NOMINA_FIELDS_TO_EXTRACT,
-    FUEL_PROD_SERV_CODES, FUEL_UNITS, FUEL_KEYWORDS
+    NOMINA_FIELDS_TO_EXTRACT,
+    FUEL_PROD_SERV_CODES, FUEL_UNITS, FUEL_KEYWORDS, UNCLASSIFIED_TAX_COLUMN,
+    INVOICE_TRASLADO_TAX_BUCKETS, INVOICE_RETENCION_TAX_BUCKETS
 )
+from extraction_plan import (
+    run_extraction_plan, project_extraction_plan, wants,
+    CFDI_COMMON_CHILD_ELEMENTS_PLAN, NOMINA_FIELDS_PLAN
+)
+from tax_buckets import lookup_tax_buckets, INVOICE_TAX_BUCKET_COLUMNS
 
 # Define the full URI for the CFDI namespace for direct attribute access (for CFDI 3.3)
 CFDI_URI_33 = NAMESPACES_CFDI_33['cfdi']
@@ -19,6 +25,20 @@ IEDU_URI = NAMESPACES_CFDI_33['iedu']  # IEDU namespace is consistent
 # ImpLocal namespace is consistent
 IMPLOCAL_URI = NAMESPACES_CFDI_33['implocal']
 
+# Columns filled by each optional step. With a column selection (`columns`) a
+# step only runs when at least one of its columns was requested.
+_CONCEPTO_COLUMNS = (
+    "Conceptos", "Conceptos_Importe_Sum", UNCLASSIFIED_TAX_COLUMN, "Combustible",
+    "Complemento", "CURP Dependiente", "Nivel Educativo", "Nombre Dependiente",
+) + tuple(INVOICE_TAX_BUCKET_COLUMNS)
+_TAX_TOTAL_COLUMNS = (
+    "Total Trasladados", "Total Retenidos", "ISH",
+    "Total LocalTrasladado", "Total LocalRetenido",
+)
+_NOMINA_COLUMNS = tuple(col for _, _, _, col in NOMINA_FIELDS_TO_EXTRACT) + (
+    "TotalGravado", "TotalExcento", "TotalDeducciones", "TotalOtrosPagos",
+)
+
 
 def _initialize_cfdi_data(cfdi_version="3.3", cfdi_type_category="Invoice"):
     """
@@ -59,13 +79,18 @@ def _initialize_cfdi_data(cfdi_version="3.3", cfdi_type_category="Invoice"):
     data["IVA 8%"] = 0.0
     data["IVA Ret 6%"] = 0.0
     data["Conceptos_Importe_Sum"] = 0.0
+    # Any column fed by the tax bucket tables, plus the unclassified bucket
+    for col_name in INVOICE_TAX_BUCKET_COLUMNS:
+        data[col_name] = 0.0
+    data[UNCLASSIFIED_TAX_COLUMN] = 0.0
 
     return data
 
 
 def _extract_tax_details(root, data, namespaces):
     """
-    Extracts and aggregates various tax details (IVA, IEPS, Retenidos, Local Taxes) from XML.
+    Extracts the global tax totals and the local taxes (implocal) from XML.
+    Per-Concepto taxes (IVA, IEPS, Retenidos) are aggregated by _visit_conceptos.
     This function is designed to be compatible with both CFDI 3.3 and 4.0 tax structures.
     """
     # --- Extract TotalImpuestosTrasladados and TotalImpuestosRetenidos from global cfdi:Impuestos attributes ---
@@ -90,64 +115,6 @@ def _extract_tax_details(root, data, namespaces):
         data["Total Trasladados"] = 0.0
         data["Total Retenidos"] = 0.0
 
-    # --- Process Specific Traslados (IVA, IEPS) from Conceptos ONLY ---
-    for concepto_traslado in root.findall(".//cfdi:Concepto/cfdi:Impuestos/cfdi:Traslados/cfdi:Traslado", namespaces):
-        impuesto_code = concepto_traslado.get("Impuesto", "").strip()
-        tipo_factor = concepto_traslado.get("TipoFactor", "").strip()
-        tasa_ocuota = concepto_traslado.get("TasaOCuota", "").strip()
-        importe_str = concepto_traslado.get("Importe", "0.00").strip()
-
-        try:
-            importe = float(importe_str)
-        except (ValueError, TypeError):
-            importe = 0.0
-
-        if impuesto_code == "002" and tipo_factor == "Tasa":  # IVA
-            if tasa_ocuota == "0.160000":
-                data["IVA 16%"] += importe
-            elif tasa_ocuota == "0.080000":
-                data["IVA 8%"] += importe
-        elif impuesto_code == "003" and tipo_factor == "Tasa":  # IEPS
-            data["Total IEPS"] += importe
-            if tasa_ocuota == "0.030000":
-                data["IEPS 3%"] += importe
-            elif tasa_ocuota == "0.060000":
-                data["IEPS 6%"] += importe
-            elif tasa_ocuota == "0.070000":
-                data["IEPS 7%"] += importe
-            elif tasa_ocuota == "0.080000":
-                data["IEPS 8%"] += importe
-            elif tasa_ocuota == "0.090000":
-                data["IEPS 9%"] += importe
-            elif tasa_ocuota == "0.265000":
-                data["IEPS 26.5%"] += importe
-            elif tasa_ocuota == "0.300000":
-                data["IEPS 30%"] += importe
-            elif tasa_ocuota == "0.304000":  # Specific IEPS rate
-                data["IEPS 30.4%"] += importe
-            elif tasa_ocuota == "0.530000":
-                data["IEPS 53%"] += importe
-            elif tasa_ocuota == "1.600000":
-                data["IEPS 160%"] += importe
-
-    # --- Process Specific Retenciones (ISR, IVA) from Conceptos ONLY ---
-    for concepto_retencion in root.findall(".//cfdi:Concepto/cfdi:Impuestos/cfdi:Retenciones/cfdi:Retencion", namespaces):
-        impuesto_code = concepto_retencion.get("Impuesto", "").strip()
-        importe_str = concepto_retencion.get("Importe", "0.00").strip()
-
-        try:
-            importe = float(importe_str)
-        except (ValueError, TypeError):
-            importe = 0.0
-
-        if impuesto_code == "001":  # ISR
-            data["Retenido ISR"] += importe
-        elif impuesto_code == "002":  # IVA
-            data["Retenido IVA"] += importe
-            tasa_ocuota_ret = concepto_retencion.get("TasaOCuota", "").strip()
-            if tasa_ocuota_ret == "0.060000":  # Specific IVA Retenido rate
-                data["IVA Ret 6%"] += importe
-
     # --- Process Local Taxes (ISH, Total LocalTrasladado, Total LocalRetenido) ---
     total_local_trasladado_sum = 0.0
     for traslado_local in root.findall(".//implocal:ImpuestosLocales/implocal:TrasladosLocales", namespaces):
@@ -178,13 +145,89 @@ def _extract_tax_details(root, data, namespaces):
     data["Total LocalRetenido"] = total_local_retenido_sum
 
 
-def _extract_iedu_data(root, data, namespaces):
+def _add_concepto_tax(concepto_tax, table, data):
+    """
+    Aggregates one Concepto Traslado/Retencion into data using a bucket table
+    from constants.py (INVOICE_TRASLADO_TAX_BUCKETS / INVOICE_RETENCION_TAX_BUCKETS).
+    Lines with no bucket are added to UNCLASSIFIED_TAX_COLUMN.
+    """
+    importe_str = concepto_tax.get("Importe", "0.00").strip()
+    try:
+        importe = float(importe_str)
+    except (ValueError, TypeError):
+        importe = 0.0
+
+    columns = lookup_tax_buckets(
+        table,
+        concepto_tax.get("Impuesto", "").strip(),
+        concepto_tax.get("TipoFactor", "").strip(),
+        concepto_tax.get("TasaOCuota", "").strip())
+    if columns is None:
+        data[UNCLASSIFIED_TAX_COLUMN] += importe
+        return
+    for col_name in columns:
+        data[col_name] += importe
+
+
+def _visit_conceptos(root, data, namespaces):
+    """
+    Walks every cfdi:Concepto exactly ONCE and collects, in the same pass:
+    descriptions ("Conceptos"), the Importe sum, the per-Concepto Traslados and
+    Retenciones, the first IEDU complement and the fuel (Combustible) flag.
+
+    Fuel-station and retail invoices can carry thousands of Conceptos, so this
+    replaces one `.//` search per feature with a single traversal.
+
+    Returns:
+        tuple: (iedu:instEducativas element or None, combustible_detected bool)
+    """
+    descriptions = []
+    iedu_complement = None
+    combustible_detected = False
+
+    for concepto in root.iterfind(".//cfdi:Concepto", namespaces):
+        description = concepto.get('Descripcion', '').strip()
+        if description:
+            descriptions.append(description)
+
+        importe_str = concepto.get('Importe')
+        if importe_str:
+            try:
+                data["Conceptos_Importe_Sum"] += float(importe_str)
+            except ValueError:
+                pass
+
+        for concepto_traslado in concepto.iterfind("cfdi:Impuestos/cfdi:Traslados/cfdi:Traslado", namespaces):
+            _add_concepto_tax(
+                concepto_traslado, INVOICE_TRASLADO_TAX_BUCKETS, data)
+        for concepto_retencion in concepto.iterfind("cfdi:Impuestos/cfdi:Retenciones/cfdi:Retencion", namespaces):
+            _add_concepto_tax(
+                concepto_retencion, INVOICE_RETENCION_TAX_BUCKETS, data)
+
+        if iedu_complement is None:
+            iedu_complement = concepto.find(
+                "cfdi:ComplementoConcepto/iedu:instEducativas", namespaces)
+
+        # --- Combustible Detection Logic ---
+        if not combustible_detected:
+            clave_prod_serv = concepto.get("ClaveProdServ", "").strip()
+            unidad = concepto.get("ClaveUnidad", "").upper().strip()
+            if clave_prod_serv in FUEL_PROD_SERV_CODES:
+                combustible_detected = True
+            elif unidad in FUEL_UNITS:
+                description_upper = concepto.get("Descripcion", "").upper().strip()
+                if any(keyword in description_upper for keyword in FUEL_KEYWORDS):
+                    combustible_detected = True
+
+    data['Conceptos'] = ' | '.join(descriptions) if descriptions else None
+    return iedu_complement, combustible_detected
+
+
+def _extract_iedu_data(iedu_complement, data):
     """
     Extracts Specific Data from IEDU Complement.
-    This function expects the root of the XML (cfdi:Comprobante) and navigates from there.
+    Receives the iedu:instEducativas element already located by _visit_conceptos.
     """
-    iedu_complement = root.find(
-        ".//cfdi:Concepto/cfdi:ComplementoConcepto/iedu:instEducativas", namespaces)
     if iedu_complement is not None:
         data["CURP Dependiente"] = iedu_complement.get("CURP", "").strip()
         data["Nivel Educativo"] = iedu_complement.get(
@@ -193,13 +236,23 @@ def _extract_iedu_data(root, data, namespaces):
             "nombreAlumno", "").strip()
 
 
-def parse_cfdi_33_invoice(xml_file_path):
+def parse_cfdi_33_invoice(xml_file_path, root=None, skip_fields=frozenset(),
+                          columns=None):
     """
     Parses a single CFDI 3.3 XML invoice file, extracts specified fields (data),
     and determines its type (Invoice or Nomina).
 
     Args:
         xml_file_path (str): Path to the XML file to be parsed.
+        root (Element, optional): Already-parsed cfdi:Comprobante element. When the
+            dispatcher has built the tree, passing it here avoids reading and
+            tokenizing the same file twice. If None, the file is parsed from disk.
+        skip_fields (set, optional): Fields not to extract (see EXTRACTION_PROFILES
+            in constants.py); the returned dict does not carry those keys.
+        columns (frozenset, optional): Column selection. When given, only these
+            keys are returned, and the concepto walk, tax totals, Nomina and
+            IEDU extraction, catalog mapping and date formatting are skipped
+            for columns nobody asked for. None extracts everything.
 
     Returns:
         dict: A dictionary containing the extracted data from the XML file.
@@ -207,8 +260,8 @@ def parse_cfdi_33_invoice(xml_file_path):
         None: If the XML file is not valid or does not match expected structure.
     """
     try:
-        tree = ET.parse(xml_file_path)
-        root = tree.getroot()
+        if root is None:
+            root = ET.parse(xml_file_path).getroot()
 
         tipo_de_comprobante = root.get('TipoDeComprobante')
         cfdi_type_category = "Invoice"
@@ -228,9 +281,11 @@ def parse_cfdi_33_invoice(xml_file_path):
         data["Serie"] = root.get("Serie", '').strip()
         data["Folio"] = root.get("Folio", '').strip()
         data["Fecha Emision"] = root.get("Fecha", "").strip()
-        data["Sello"] = root.get("Sello", "").strip()
+        if "Sello" not in skip_fields:
+            data["Sello"] = root.get("Sello", "").strip()
         data["NoCertificado"] = root.get("NoCertificado", "").strip()
-        data["Certificado"] = root.get("Certificado", "").strip()
+        if "Certificado" not in skip_fields:
+            data["Certificado"] = root.get("Certificado", "").strip()
 
         subtotal_str = root.get("SubTotal", "0.00").strip()
         try:
@@ -258,10 +313,10 @@ def parse_cfdi_33_invoice(xml_file_path):
         except (ValueError, TypeError):
             data["Tipo De Cambio"] = 1.0
 
-        forma_pago_code = root.get("FormaPago", "").strip()
+        forma_pago_code = root.get("FormaPago", "").strip() if wants(columns, "FormaDePago") else ""
         data["FormaDePago"] = f"{forma_pago_code} - {FORMA_PAGO_MAP.get(forma_pago_code, 'Desconocido')}" if forma_pago_code else None
 
-        metodo_pago_code = root.get("MetodoPago", "").strip()
+        metodo_pago_code = root.get("MetodoPago", "").strip() if wants(columns, "Metodo de Pago") else ""
         data["Metodo de Pago"] = f"{metodo_pago_code} - {METODO_PAGO_MAP.get(metodo_pago_code, 'Desconocido')}" if metodo_pago_code else None
 
         data["Tipo"] = TIPO_COMPROBANTE_MAP.get(
@@ -271,19 +326,16 @@ def parse_cfdi_33_invoice(xml_file_path):
         data["NumCtaPago"] = root.get("NumCtaPago", "").strip()
 
         # --- Extract Common CFDI Child Elements (present in 3.3) ---
-        for xpath, attr_name, default_val, col_name in CFDI_COMMON_CHILD_ELEMENTS_TO_EXTRACT:
-            element = root.find(xpath, NAMESPACES_CFDI_33)
-            if element is not None:
-                value = element.get(attr_name, default_val).strip() if attr_name else \
-                    element.text.strip() if element.text is not None else default_val
-            else:
-                value = default_val
+        # (each distinct element is searched once, see extraction_plan.py)
+        for col_name, value in run_extraction_plan(
+                project_extraction_plan(CFDI_COMMON_CHILD_ELEMENTS_PLAN, columns),
+                root, NAMESPACES_CFDI_33):
             data[col_name] = value
 
         # --- UsoCFDI mapping (from Receptor) ---
         receptor_node = root.find("cfdi:Receptor", NAMESPACES_CFDI_33)
         if receptor_node is not None:
-            uso_cfdi_code = receptor_node.get("UsoCFDI", "").strip()
+            uso_cfdi_code = receptor_node.get("UsoCFDI", "").strip() if wants(columns, "UsoCFDI") else ""
             data["UsoCFDI"] = f"{uso_cfdi_code} - {USO_CFDI_MAP.get(uso_cfdi_code, 'Desconocido')}" if uso_cfdi_code else None
         else:
             data["UsoCFDI"] = None
@@ -297,28 +349,23 @@ def parse_cfdi_33_invoice(xml_file_path):
                 "FechaTimbrado", "").strip()
             data["RfcProvCertif"] = timbre_fiscal_digital.get(
                 "RfcProvCertif", "").strip()
-            data["SelloSAT"] = timbre_fiscal_digital.get(
-                "SelloSAT", "").strip()
+            if "SelloSAT" not in skip_fields:
+                data["SelloSAT"] = timbre_fiscal_digital.get(
+                    "SelloSAT", "").strip()
             data["NoCertificadoSAT"] = timbre_fiscal_digital.get(
                 "NoCertificadoSAT", "").strip()
 
-        # Handle merged "Conceptos" from multiple Concepto nodes
-        descriptions = []
-        for concepto in root.findall(".//cfdi:Concepto", NAMESPACES_CFDI_33):
-            description = concepto.get('Descripcion', '').strip()
-            if description:
-                descriptions.append(description)
-
-            importe_str = concepto.get('Importe')
-            if importe_str:
-                try:
-                    data["Conceptos_Importe_Sum"] += float(importe_str)
-                except ValueError:
-                    pass
-        data['Conceptos'] = ' | '.join(descriptions) if descriptions else None
+        # Single pass over cfdi:Concepto: descriptions, Importe sum, per-Concepto
+        # taxes, IEDU node and fuel flag (see _visit_conceptos)
+        if wants(columns, *_CONCEPTO_COLUMNS):
+            iedu_complement, combustible_detected = _visit_conceptos(
+                root, data, NAMESPACES_CFDI_33)
+        else:
+            iedu_complement, combustible_detected = None, False
 
-        # Extract and aggregate tax details
-        _extract_tax_details(root, data, NAMESPACES_CFDI_33)
+        # Extract global and local tax totals
+        if wants(columns, *_TAX_TOTAL_COLUMNS):
+            _extract_tax_details(root, data, NAMESPACES_CFDI_33)
 
         # Nomina 1.2 complement specific parsing
         detected_complements = []
@@ -327,60 +374,56 @@ def parse_cfdi_33_invoice(xml_file_path):
         if nomina_complement is not None:
             data['CFDI_Type'] = 'Nomina'
             detected_complements.append('NOMINA')
-            for xpath, attr_name, default_val, col_name in NOMINA_FIELDS_TO_EXTRACT:
-                element = root.find(xpath, NAMESPACES_CFDI_33)
-                if element is not None:
-                    value = element.get(attr_name, default_val).strip() if attr_name else \
-                        element.text.strip() if element.text is not None else default_val
-                else:
-                    value = default_val
-
-                # Convert specific Nomina numeric fields to float
-                if col_name in ["Total Sueldos", "Total Deducciones", "Total Otros Pagos", "SBC", "SDI", "ImpuestosRetenidos"]:
+            if wants(columns, *_NOMINA_COLUMNS):
+                for col_name, value in run_extraction_plan(
+                        project_extraction_plan(NOMINA_FIELDS_PLAN, columns),
+                        root, NAMESPACES_CFDI_33):
+                    # Convert specific Nomina numeric fields to float
+                    if col_name in ["Total Sueldos", "Total Deducciones", "Total Otros Pagos", "SBC", "SDI", "ImpuestosRetenidos"]:
+                        try:
+                            data[col_name] = float(value)
+                        except (ValueError, TypeError):
+                            data[col_name] = 0.0
+                    else:
+                        data[col_name] = value
+
+                # Calculate TotalGravado and TotalExcento from Percepciones
+                total_gravado_percepciones = 0.0
+                total_exento_percepciones = 0.0
+                for percepcion in root.findall(".//nomina12:Percepcion", NAMESPACES_CFDI_33):
+                    importe_gravado_str = percepcion.get(
+                        "ImporteGravado", "0.00").strip()
+                    importe_exento_str = percepcion.get(
+                        "ImporteExento", "0.00").strip()
+
+                    try:
+                        total_gravado_percepciones += float(importe_gravado_str)
+                    except (ValueError, TypeError):
+                        pass
                     try:
-                        data[col_name] = float(value)
+                        total_exento_percepciones += float(importe_exento_str)
                     except (ValueError, TypeError):
-                        data[col_name] = 0.0
-                else:
-                    data[col_name] = value
-
-            # Calculate TotalGravado and TotalExcento from Percepciones
-            total_gravado_percepciones = 0.0
-            total_exento_percepciones = 0.0
-            for percepcion in root.findall(".//nomina12:Percepcion", NAMESPACES_CFDI_33):
-                importe_gravado_str = percepcion.get(
-                    "ImporteGravado", "0.00").strip()
-                importe_exento_str = percepcion.get(
-                    "ImporteExento", "0.00").strip()
+                        pass
+                data['TotalGravado'] = total_gravado_percepciones
+                data['TotalExcento'] = total_exento_percepciones
+
+                # Calculate TotalDeducciones and TotalOtrosPagos from their direct nodes if available
+                total_otras_deducciones_node = nomina_complement.find(
+                    ".//nomina12:Deducciones", NAMESPACES_CFDI_33)
+                if total_otras_deducciones_node is not None:
+                    total_otras_ded_str = total_otras_deducciones_node.get(
+                        "TotalOtrasDeducciones", "0.00").strip()
+                    try:
+                        data['TotalDeducciones'] = float(total_otras_ded_str)
+                    except (ValueError, TypeError):
+                        data['TotalDeducciones'] = 0.0
 
+                total_otros_pag_str = nomina_complement.get(
+                    "TotalOtrosPagos", "0.00").strip()
                 try:
-                    total_gravado_percepciones += float(importe_gravado_str)
-                except (ValueError, TypeError):
-                    pass
-                try:
-                    total_exento_percepciones += float(importe_exento_str)
+                    data['TotalOtrosPagos'] = float(total_otros_pag_str)
                 except (ValueError, TypeError):
-                    pass
-            data['TotalGravado'] = total_gravado_percepciones
-            data['TotalExcento'] = total_exento_percepciones
-
-            # Calculate TotalDeducciones and TotalOtrosPagos from their direct nodes if available
-            total_otras_deducciones_node = nomina_complement.find(
-                ".//nomina12:Deducciones", NAMESPACES_CFDI_33)
-            if total_otras_deducciones_node is not None:
-                total_otras_ded_str = total_otras_deducciones_node.get(
-                    "TotalOtrasDeducciones", "0.00").strip()
-                try:
-                    data['TotalDeducciones'] = float(total_otras_ded_str)
-                except (ValueError, TypeError):
-                    data['TotalDeducciones'] = 0.0
-
-            total_otros_pag_str = nomina_complement.get(
-                "TotalOtrosPagos", "0.00").strip()
-            try:
-                data['TotalOtrosPagos'] = float(total_otros_pag_str)
-            except (ValueError, TypeError):
-                data['TotalOtrosPagos'] = 0.0
+                    data['TotalOtrosPagos'] = 0.0
 
         else:
             data['CFDI_Type'] = 'Invoice'
@@ -391,34 +434,20 @@ def parse_cfdi_33_invoice(xml_file_path):
             data['TotalDeducciones'] = None
             data['TotalOtrosPagos'] = None
 
-        # Detect IEDU complement
-        iedu_complement = root.find(
-            './/cfdi:Concepto/cfdi:ComplementoConcepto/iedu:instEducativas', NAMESPACES_CFDI_33)
+        # Detect IEDU complement (node located by _visit_conceptos)
         if iedu_complement is not None:
             detected_complements.append('IEDU')
-            _extract_iedu_data(root, data, NAMESPACES_CFDI_33)
+            _extract_iedu_data(iedu_complement, data)
 
         # Detect IMPLOCAL complement
-        if root.find('.//cfdi:Complemento/implocal:ImpuestosLocales', NAMESPACES_CFDI_33) is not None:
+        if wants(columns, "Complemento") and root.find('.//cfdi:Complemento/implocal:ImpuestosLocales', NAMESPACES_CFDI_33) is not None:
             detected_complements.append('IMPLOCAL')
 
         data["Complemento"] = ", ".join(
             detected_complements) if detected_complements else None
         data['Archivo XML'] = os.path.basename(xml_file_path)
 
-        # --- Combustible Detection Logic ---
-        combustible_detected = False
-        for concepto in root.findall(".//cfdi:Concepto", NAMESPACES_CFDI_33):
-            clave_prod_serv = concepto.get("ClaveProdServ", "").strip()
-            unidad = concepto.get("ClaveUnidad", "").upper().strip()
-            description = concepto.get("Descripcion", "").upper().strip()
-
-            if clave_prod_serv in FUEL_PROD_SERV_CODES:
-                combustible_detected = True
-                break
-            if unidad in FUEL_UNITS and any(keyword in description for keyword in FUEL_KEYWORDS):
-                combustible_detected = True
-                break
+        # --- Combustible flag (detected by _visit_conceptos) ---
         data["Combustible"] = "Si   " if combustible_detected else "No"
 
         serie = root.get("Serie", '').strip()
@@ -440,7 +469,7 @@ def parse_cfdi_33_invoice(xml_file_path):
         data["Localidad Receptor"] = ""
 
         # --- Format Dates for consistency with Excel Export ---
-        if data["Fecha Emision"]:
+        if data["Fecha Emision"] and wants(columns, "Fecha Emision"):
             try:
                 dt_obj = datetime.strptime(
                     data["Fecha Emision"], "%Y-%m-%dT%H:%M:%S")
@@ -458,6 +487,8 @@ def parse_cfdi_33_invoice(xml_file_path):
             except ValueError:
                 pass
 
+        if columns is not None:
+            data = {key: value for key, value in data.items() if key in columns}
         return data
 
     except ET.ParseError as e: